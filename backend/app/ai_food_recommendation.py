@@ -1,10 +1,29 @@
-import json
+import asyncio
+import datetime
+import hashlib
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 import google.generativeai as genai
 from supabase import create_client, Client
+from .services.menu_cache import MenuCache
+from .model.menu import MenuItem
+from .services.menu_snapshot import MenuSnapshotStore
+from .services.menu_encoding import MENU_FORMATS
+from .services.prompt_builder import OUTPUT_FORMATS, PromptBuilder
+from .services.recommendation_cache import RecommendationCache, SingleFlight, AsyncSingleFlight, preference_key
+from .services.menu_repository import MenuSync, iter_menu_rows, DEFAULT_PAGE_SIZE, DEFAULT_CURSOR_COLUMN, DEFAULT_FULL_SYNC_INTERVAL
+from .services.llm_limiter import LLMLimiter, LLMOverloadedError
+from .services.plan_stream import MEAL_SECTIONS
+from .services.json_stream import StreamingJSONParser, StreamParseError
+from .services.meal_planner import GENERATION_MODES, MEALS, meal_budgets, merge_meal_plans
+from .services.portion_optimizer import build_shortlists, resolve_picks
+from .services.hydration import hydrate_choice, hydrate_item, hydrate_plan
+from .services.plan_validator import VALIDATION_MODES, validate_plan
+from .services.plan_history import DEFAULT_DIRECTORY as PLAN_HISTORY_DIRECTORY, PlanHistory
 
 class FoodRecommender:
     def __init__(self):
@@ -25,7 +44,8 @@ class FoodRecommender:
 
         try:
             genai.configure(api_key=gemini_key)
-            self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
+            self.model_name = 'gemini-2.5-flash-lite'
+            self.model = genai.GenerativeModel(self.model_name)
             print("Gemini client initialized successfully!")
         except Exception as e:
             raise ValueError(f"Failed to initialize Gemini client: {e}")
@@ -39,298 +59,643 @@ class FoodRecommender:
         
         self.supabase = create_client(supabase_url, supabase_key)
         
-        # Initialize caching
-        self._menu_cache = None
-        self._cache_timestamp = 0
-        self._cache_duration = 3600  # 1 hour cache
+        # Initialize caching (TTL + stale-while-revalidate, see services/menu_cache.py)
+        self._cache_duration = int(os.getenv("MENU_CACHE_TTL", 3600))  # 1 hour cache
+        self.menu_sync = MenuSync(
+            self.supabase,
+            cursor_column=os.getenv("MENU_SYNC_CURSOR", DEFAULT_CURSOR_COLUMN),
+            full_sync_interval=int(os.getenv("MENU_FULL_SYNC_INTERVAL", DEFAULT_FULL_SYNC_INTERVAL)),
+            page_size=int(os.getenv("MENU_PAGE_SIZE", DEFAULT_PAGE_SIZE)),
+        )
+        self.menu_cache = MenuCache(self._fetch_menu_data, ttl=self._cache_duration)
+        # Unprojected rows for the public /menu endpoint; only loaded once /menu is called
+        self.full_menu_cache = MenuCache(self._fetch_full_menu_data, ttl=self._cache_duration)
+        self.menu_snapshots = MenuSnapshotStore()
+
+        # Generated plans keyed by normalized preferences + menu version
+        self.result_cache = RecommendationCache(
+            max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", 1024)),
+            ttl=int(os.getenv("RECOMMENDATION_CACHE_TTL", 1800)),
+        )
+        self.menu_snapshots.add_listener(lambda snapshot: self.result_cache.invalidate_menu(snapshot.version))
+        self._inflight = SingleFlight()  # concurrent identical requests share one Gemini call
+        self._inflight_async = AsyncSingleFlight()
+
+        # Menu section encoding in the prompt: 'json' (indented JSON) or 'table' (compact rows)
+        self.menu_format = os.getenv("MENU_PROMPT_FORMAT", "json").lower()
+        if self.menu_format not in MENU_FORMATS:
+            raise ValueError(f"Invalid MENU_PROMPT_FORMAT '{self.menu_format}', expected one of {MENU_FORMATS}")
+        # Model output: 'full' (every item written out with its nutrition) or 'compact' (ids + portions,
+        # hydrated from the menu here)
+        self.output_format = os.getenv("MEAL_OUTPUT_FORMAT", "full").lower()
+        if self.output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Invalid MEAL_OUTPUT_FORMAT '{self.output_format}', expected one of {OUTPUT_FORMATS}")
+        self.prompt_builder = PromptBuilder(self.menu_format, self.output_format)
+
+        # 'single': one prompt for the whole day; 'per_meal': one smaller prompt per meal, run in parallel;
+        # 'optimized': items and portions solved locally, the model only picks from shortlists and explains
+        self.generation_mode = os.getenv("MEAL_GENERATION_MODE", "single").lower()
+        if self.generation_mode not in GENERATION_MODES:
+            raise ValueError(f"Invalid MEAL_GENERATION_MODE '{self.generation_mode}', expected one of {GENERATION_MODES}")
+
+        # Model-written nutrition is recomputed from the menu: 'correct' fixes it, 'flag' only reports
+        self.validation_mode = os.getenv("PLAN_VALIDATION", "correct").lower()
+        if self.validation_mode not in VALIDATION_MODES:
+            raise ValueError(f"Invalid PLAN_VALIDATION '{self.validation_mode}', expected one of {VALIDATION_MODES}")
+
+        # Optional Gemini context caching of the stable prompt prefix (instructions + menu)
+        self.use_context_cache = os.getenv("GEMINI_CONTEXT_CACHE", "").lower() in ("1", "true", "yes")
+        self._context_cache_ttl = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", 3600))
+        self._cached_models = {}  # prefix hash -> (GenerativeModel bound to the cached prefix or None, renew_at)
+        self._cached_models_lock = threading.Lock()
+        self._cached_model_locks = {}  # prefix hash -> lock held while its provider cache is created
+
+        # Admission control for Gemini calls: bounded concurrency + bounded wait queue, excess is shed (503)
+        self.llm_limiter = LLMLimiter(
+            max_concurrent=int(os.getenv("LLM_MAX_CONCURRENCY", 16)),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", 64)),
+            max_wait=float(os.getenv("LLM_MAX_WAIT", 10)),
+        )
         
+        # Every generated plan is appended to a JSON Lines history by a background writer
+        self.plan_history = PlanHistory(
+            directory=os.getenv("PLAN_HISTORY_DIR", PLAN_HISTORY_DIRECTORY),
+            segment_bytes=int(os.getenv("PLAN_HISTORY_SEGMENT_MB", 64)) * 1024 * 1024,
+            max_queue=int(os.getenv("PLAN_HISTORY_QUEUE", 1000)),
+        )
+
         print("AI Recommender initialized successfully!")
     
     def get_all_menu_data(self):
         """Get ALL available food data from database with caching"""
-        current_time = time.time()
-        
-        # Check if cache is valid (force refresh for now)
-        if (True or self._menu_cache is None or 
-            current_time - self._cache_timestamp > self._cache_duration):
-            
-            try:
-                print("Fetching fresh menu data from database...")
-                result = self.supabase.table('cleaned_data').select('*').execute()
-                self._menu_cache = result.data
-                self._cache_timestamp = current_time
-                print(f"Menu data cached successfully. {len(self._menu_cache)} items loaded.")
-            except Exception as e:
-                print(f"Error fetching menu data: {e}")
-                return self._menu_cache or []
-        else:
-            print("Using cached menu data...")
-        
-        return self._menu_cache or []
+        return self.menu_cache.get()
+
+    def get_full_menu_data(self):
+        """Get the menu rows with every column and `data` field, as served by /menu"""
+        return self.full_menu_cache.get()
+
+    def get_menu_snapshot(self):
+        """Get the versioned menu snapshot (formatted menu computed once per menu version)"""
+        return self.menu_snapshots.get(self.get_all_menu_data())
+
+    def _fetch_menu_data(self):
+        """Sync the menu from the database (used as the MenuCache loader)"""
+        print("Fetching fresh menu data from database...")
+        menu_items = self.menu_sync.load()
+        print(f"Menu data cached successfully. {len(menu_items)} items loaded.")
+        return menu_items
+
+    def _fetch_full_menu_data(self):
+        """Page through the whole table without projection (used as the /menu MenuCache loader)"""
+        menu_items = list(iter_menu_rows(self.supabase, page_size=self.menu_sync.page_size, fields=None))
+        print(f"Full menu data cached successfully. {len(menu_items)} items loaded.")
+        return menu_items
     
     def format_menu_data(self, menu_items):
-        """Format menu data for AI processing with full nutrition info and sanitized ingredients"""
-        formatted_menu = []
-        for item in menu_items:
-            food_data = item.get('data', {})
-            nutrition = food_data.get('nutrition', {}) or {}
-
-            # --- Sanitize ingredients ---
-            ing = nutrition.get('ingredients', 'N/A')
-            if isinstance(ing, str):
-                # Remove any disclaimer text starting with "Disclaimer:"
-                if "Disclaimer:" in ing:
-                    ing = ing.split("Disclaimer:")[0].strip()
-            else:
-                ing = 'N/A'
-            nutrition['ingredients'] = ing
-
-            # --- Build formatted item ---
-            formatted_item = {
-                "name": food_data.get("food_name", "Unknown"),
-                "station": food_data.get("station_name", "Unknown"),
-                "meal_type": food_data.get("meal_type", "Unknown"),
-                "nutrition": nutrition  # keep ALL fields (macros + micros + extras)
-            }
-
-            formatted_menu.append(formatted_item)
-
-        return formatted_menu
+        """Format menu data for AI processing with full nutrition info and sanitized ingredients.
+
+        The input rows are never modified (ingredients are cleaned on a private copy).
+        """
+        return [MenuItem.from_row(item).to_dict() for item in menu_items]
 
     
     def get_daily_meal_schedule(self, user_preferences):
         """Generate a complete daily meal schedule using single API call"""
         
-        # Get ALL menu data (cached)
-        menu_items = self.get_all_menu_data()
-        if not menu_items:
+        # Get ALL menu data (cached, formatted once per menu version)
+        snapshot = self.get_menu_snapshot()
+        if not snapshot.menu_items:
             return {"error": "No menu data available"}
-        
-        # Format data for AI
-        formatted_menu = self.format_menu_data(menu_items)
-        prompt = f"""
-You are an expert nutritionist. Create a complete daily meal plan for a university student using the dining hall menu provided.
-
-## INPUT DATA:
-
-USER PREFERENCES AND GOALS:
-{json.dumps(user_preferences, indent=2)}
-
-COMPLETE DINING HALL MENU (ALL AVAILABLE OPTIONS):
-{json.dumps(formatted_menu, indent=2)}
-
-## PRIMARY OBJECTIVES (IN ORDER OF PRIORITY):
-1. **Follow user comments/requests EXACTLY** - User-specified foods, portions, or goals override everything else
-2. **Meet calorie target** - Must reach or exceed user's calorie goal (never go under)
-3. **Meet protein target** - Must reach or exceed user's protein goal (never go under)
-4. **Honor dietary restrictions** - Strictly avoid all allergens and restrictions listed
-5. **Provide variety** - Select from different dining stations and food types
-
-## CRITICAL NUTRITION BALANCE RULE:
-**AVOID EXCESSIVE PROTEIN OVERSHOOT** - While meeting protein targets is important, do NOT dramatically exceed protein goals when it's unnecessary. If user needs 150g protein, aim for 150-180g, NOT 250g+. Balance protein sources with appropriate carbs and fats for optimal nutrition ratios.
-
-## PORTION CALCULATION RULES:
-- Base nutrition values are per menu serving size
-- Scale ALL nutrients proportionally to your recommended portion
-- Example: Menu shows "1 egg = 70 cal, 6g protein" → You recommend "3 eggs" → Calculate as "210 cal, 18g protein"
-- Scale these fields: calories, protein_g, carbs_g, fat_g, fiber_g, sodium_mg, sugar_g, saturated_fat_g, trans_fat_g, cholesterol_mg, calcium_mg, iron_mg, potassium_mg, vitamin_a_re, vitamin_c_mg, vitamin_d_iu
-- If a nutrient is missing from menu data, use null (don't invent values)
-
-## INSUFFICIENT FOOD HANDLING:
-If the available menu items cannot meet the user's calorie/protein targets even with maximum reasonable portions:
-1. **Increase serving sizes** of existing recommended items proportionally
-2. **Add more food items** from available menu options
-3. **Prioritize calorie-dense and protein-rich foods** to efficiently meet targets
-4. **Example**: If you're 500 calories short, increase portions of rice, pasta, or protein items rather than giving up
-
-## WEEKEND SPECIAL RULE:
-If it's Saturday or Sunday, dining halls serve brunch instead of separate breakfast/lunch. Plan accordingly with larger portions to meet daily targets.
-
-## DATA CLEANING:
-- Remove any "Disclaimer:" text from ingredients
-- Clean up extra whitespace and line breaks
-
-## CRITICAL: JSON STRUCTURE ORDER
-The JSON response MUST maintain this exact order of fields for every food item:
-1. name, 2. station, 3. recommended_portion, 4. serving_size, 5. calories, 6. protein_g, 7. carbs_g, 8. fat_g, 9. fiber_g, 10. sodium_mg, 11. allergens, 12. ingredients, 13. per_menu_serving_nutrition, 14. full_nutrition, 15. portion_math, 16. reason_selected
-
-And this exact meal order: breakfast, lunch, dinner, daily_totals, meal_plan_analysis
-
-## REQUIRED JSON OUTPUT FORMAT:
-
-{{
-  "breakfast": [
-    {{
-      "name": "Exact menu item name",
-      "station": "Exact station name from menu",
-      "recommended_portion": "Clear portion description (e.g. '2 eggs', '1.5 cups')",
-      "serving_size": "Menu base vs recommended (e.g. 'Menu: 1 egg, Recommended: 2 eggs')",
-      "calories": calculated_total_calories,
-      "protein_g": calculated_total_protein,
-      "carbs_g": calculated_total_carbs,
-      "fat_g": calculated_total_fat,
-      "fiber_g": calculated_total_fiber,
-      "sodium_mg": calculated_total_sodium,
-      "allergens": ["list", "from", "menu"],
-      "ingredients": "cleaned ingredients without disclaimers",
-      "per_menu_serving_nutrition": {{
-        "serving_size": "base serving from menu",
-        "calories": base_calories,
-        "protein_g": base_protein,
-        "carbs_g": base_carbs,
-        "fat_g": base_fat,
-        "fiber_g": base_fiber,
-        "sodium_mg": base_sodium,
-        "sugar_g": base_sugar_or_null,
-        "saturated_fat_g": base_sat_fat_or_null,
-        "trans_fat_g": base_trans_fat_or_null,
-        "cholesterol_mg": base_cholesterol_or_null,
-        "calcium_mg": base_calcium_or_null,
-        "iron_mg": base_iron_or_null,
-        "potassium_mg": base_potassium_or_null,
-        "vitamin_a_re": base_vit_a_or_null,
-        "vitamin_c_mg": base_vit_c_or_null,
-        "vitamin_d_iu": base_vit_d_or_null
-      }},
-      "full_nutrition": {{
-        "calories": scaled_calories,
-        "protein_g": scaled_protein,
-        "carbs_g": scaled_carbs,
-        "fat_g": scaled_fat,
-        "fiber_g": scaled_fiber,
-        "sodium_mg": scaled_sodium,
-        "sugar_g": scaled_sugar_or_null,
-        "saturated_fat_g": scaled_sat_fat_or_null,
-        "trans_fat_g": scaled_trans_fat_or_null,
-        "cholesterol_mg": scaled_cholesterol_or_null,
-        "calcium_mg": scaled_calcium_or_null,
-        "iron_mg": scaled_iron_or_null,
-        "potassium_mg": scaled_potassium_or_null,
-        "vitamin_a_re": scaled_vit_a_or_null,
-        "vitamin_c_mg": scaled_vit_c_or_null,
-        "vitamin_d_iu": scaled_vit_d_or_null
-      }},
-      "portion_math": "Show calculation: 3 servings x 70 cal = 210 cal, 3 x 6g protein = 18g",
-      "reason_selected": "Explain: 1) Why chosen 2) How portion was calculated 3) How it helps meet targets"
-    }}
-  ],
-  "lunch": [
-    // Same structure as breakfast items
-  ],
-  "dinner": [
-    // Same structure as breakfast items
-  ],
-  "daily_totals": {{
-    "total_calories": sum_all_meal_calories,
-    "total_protein_g": sum_all_meal_protein,
-    "total_carbs_g": sum_all_meal_carbs,
-    "total_fat_g": sum_all_meal_fat,
-    "total_fiber_g": sum_all_meal_fiber,
-    "total_sodium_mg": sum_all_meal_sodium,
-    "calorie_target": user_target_calories,
-    "protein_target": user_target_protein,
-    "calorie_difference": actual_minus_target,
-    "protein_difference": actual_minus_target
-  }},
-  "meal_plan_analysis": {{
-    "calorie_goal_status": "Met: [actual] vs target [target] (+/- difference)",
-    "protein_goal_status": "Met: [actual]g vs target [target]g (+/- difference)",
-    "target_achievement": "SUCCESS - All targets met" or "FAILED - Missing: [what was missed]",
-    "dietary_compliance": "All restrictions followed" or "Issues: [specific issues]",
-    "user_comment_compliance": "Followed: [list user requests]" or "No specific requests",
-    "nutrition_balance_check": "Balanced nutrition ratios achieved" or "Warning: Excessive protein overshoot",
-    "suggestions": ["tip 1", "tip 2", "tip 3"]
-  }}
-}}
-
-## TOP 3 ACTIONABLE RECOMMENDATIONS:
-In meal_plan_analysis.suggestions, provide exactly 3 specific, actionable tips (max 15 words each):
-- Focus on nutrition optimization, meal timing, or food combinations
-- Make them specific to this user's goals and selected foods
-- Examples: "Add Greek yogurt for extra protein", "Drink water 30min before meals", "Have largest meal post-workout"
-
-## OUTPUT VALIDATION:
-Before responding, verify:
-- JSON is valid and parseable
-- All required fields present for each food item
-- Field order matches specification exactly
-- Calculations are mathematically correct
-- No placeholder text like [actual] remains in output
-- Protein levels are balanced (not excessively high)
-- If targets aren't met, portions have been increased appropriately
-
-## CRITICAL SUCCESS CRITERIA:
-✓ Total daily calories ≥ user's calorie target (increase portions if needed)
-✓ Total daily protein ≥ user's protein target (but avoid 50%+ overshoot)
-✓ All allergens and dietary restrictions avoided
-✓ User's specific comments/requests followed exactly
-✓ 3-5 food items per meal for balanced nutrition
-✓ All nutrition calculations based on recommended portions (not menu base)
-✓ Portion math clearly shown
-✓ Balanced macronutrient ratios maintained
-
-## BEFORE RESPONDING:
-1. Check: Does total calories meet/exceed target?
-2. Check: Does total protein meet/exceed target without excessive overshoot?
-3. Check: Are user's specific requests addressed?
-4. Check: Are all dietary restrictions followed?
-5. Check: Is nutrition calculated for recommended portions?
-6. Check: If targets aren't met, have you increased portions appropriately?
-
-Respond with ONLY the JSON - no additional text or explanations outside the JSON structure.
-"""
-        
+
+        # Identical (normalized) preferences on the same menu get the same plan from memory
+        cache_key = self._schedule_cache_key(snapshot, user_preferences)
+        cached_schedule = self.result_cache.get(cache_key)
+        if cached_schedule is not None:
+            print("Using cached meal plan...")
+            return cached_schedule
+
+        # Concurrent requests with the same key wait for a single generation
+        return self._inflight.do(
+            cache_key, lambda: self._generate_meal_schedule(snapshot, user_preferences, cache_key)
+        )
+
+    async def get_daily_meal_schedule_async(self, user_preferences):
+        """Async version of get_daily_meal_schedule (non-blocking Gemini call, for the API)"""
+        # A cold or changed menu means database I/O / formatting: keep it off the event loop
+        snapshot = await asyncio.to_thread(self.get_menu_snapshot)
+        if not snapshot.menu_items:
+            return {"error": "No menu data available"}
+
+        cache_key = self._schedule_cache_key(snapshot, user_preferences)
+        cached_schedule = self.result_cache.get(cache_key)
+        if cached_schedule is not None:
+            print("Using cached meal plan...")
+            return cached_schedule
+
+        return await self._inflight_async.do(
+            cache_key, lambda: self._generate_meal_schedule_async(snapshot, user_preferences, cache_key)
+        )
+
+    async def stream_daily_meal_schedule(self, user_preferences):
+        """Start a streamed meal plan generation.
+
+        Returns an async iterator of (event, data) pairs: one "section" event per completed
+        top-level section (breakfast, lunch, dinner, daily_totals, meal_plan_analysis), then
+        "done" or "error". In the default mode the LLM slot is taken here, before anything
+        is streamed, so overload raises LLMOverloadedError (a 503). In per_meal and
+        optimized modes the calls start once streaming has begun, so overload arrives as
+        an "error" event inside the 200 stream.
+        """
+        snapshot = await asyncio.to_thread(self.get_menu_snapshot)
+        if not snapshot.menu_items:
+            return self._stream_error({"error": "No menu data available"})
+
+        cache_key = self._schedule_cache_key(snapshot, user_preferences)
+        cached_schedule = self.result_cache.get(cache_key)
+        if cached_schedule is not None:
+            print("Using cached meal plan...")
+            return self._stream_cached(cached_schedule)
+
+        if self.generation_mode == 'per_meal':
+            prompts = self._build_meal_prompts(snapshot, user_preferences)
+            if not prompts:
+                return self._stream_error({"error": "No menu items match your dietary preferences"})
+            return self._stream_per_meal(prompts, snapshot, user_preferences, cache_key)
+        if self.generation_mode == 'optimized':
+            # The model output is tiny here; stream the finished plan section by section
+            return self._stream_generated(snapshot, user_preferences, cache_key)
+
+        prompt = self._build_prompt(snapshot, user_preferences)
+        if prompt is None:
+            return self._stream_error({"error": "No menu items match your dietary preferences"})
+
+        events = self._stream_sections(prompt, snapshot, user_preferences, cache_key)
+        # Runs the generator up to admission: overload raises here, before the response starts
+        await events.__anext__()
+        return events
+
+    async def _stream_sections(self, prompt, snapshot, user_preferences, cache_key):
+        """Take an LLM slot, relay Gemini chunks as item/section events while parsing, then cache and save the plan.
+
+        The first value yielded (None) only marks admission. The slot is taken and released
+        inside this generator, so the finally below frees it on every path: errors,
+        cancellation while Gemini is awaited, and a generator that is closed or garbage
+        collected without ever being iterated further.
+        """
+        await self.llm_limiter.acquire_async()
+        started = time.monotonic()
+        parser = StreamingJSONParser()
+        compact = self.output_format == 'compact'
+        allowed = set(snapshot.menu_index.filter(user_preferences)) if compact else None
         try:
-            print("Generating meal plan with single API call...")
-            # Gemini API call
-            response = self.model.generate_content(prompt)
-            ai_response = response.text.strip()
+            yield None
+            print("Streaming meal plan generation...")
+            response = await self._generate_async(prompt, stream=True)
+            async for chunk in response:
+                for event in parser.feed(chunk.text):
+                    if event.key not in MEAL_SECTIONS or (compact and event.key not in MEALS):
+                        continue
+                    if event.kind == 'item':
+                        data = hydrate_choice(snapshot, event.value, allowed) if compact else event.value
+                        if data is not None:
+                            yield "item", {"section": event.key, "index": event.index, "data": data}
+                    elif compact:
+                        items = [hydrate_choice(snapshot, choice, allowed) for choice in event.value or []]
+                        yield "section", {"name": event.key, "data": [item for item in items if item is not None]}
+                    else:
+                        yield "section", {"name": event.key, "data": event.value}
+                if parser.error is not None or parser.done:
+                    break  # nothing useful can follow; stop paying for tokens
+        except Exception as e:
+            yield "error", {"error": f"AI service error: {str(e)}"}
+            return
+        finally:
+            # Also runs when the client disconnects mid-stream
+            self.llm_limiter.release(time.monotonic() - started)
+
+        try:
+            meal_schedule = parser.finish()
+        except StreamParseError as e:
+            yield "error", self._parse_error(parser, e)
+            return
+
+        if compact:
+            # Totals and analysis are computed here, not by the model
+            meal_schedule = hydrate_plan(meal_schedule, snapshot, user_preferences, allowed)
+            for name in ('daily_totals', 'meal_plan_analysis'):
+                yield "section", {"name": name, "data": meal_schedule[name]}
+        report = self._validate(meal_schedule, snapshot, user_preferences)
+        for event in self._revised_sections(meal_schedule, report):
+            yield event
+        self.result_cache.put(cache_key, meal_schedule, snapshot.version)
+        self.record_plan(meal_schedule, user_preferences, snapshot)
+        print("Meal plan generated successfully!")
+        yield "done", {}
+
+    async def _stream_per_meal(self, prompts, snapshot, user_preferences, cache_key):
+        """Per-meal mode: each meal is sent as soon as its own call finishes, totals at the end"""
+        tasks = {asyncio.ensure_future(self._call_and_parse_async(prompt, allow_context_cache=False)): meal
+                 for meal, prompt in prompts.items()}
+        pending = set(tasks)
+        results = {}
+        allowed = set(snapshot.menu_index.filter(user_preferences)) if self.output_format == 'compact' else None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    meal, result = tasks[task], task.result()
+                    if "error" in result:
+                        yield "error", dict(result, meal=meal)
+                        return
+                    if self.output_format == 'compact':
+                        result = self._hydrate_meal(meal, result, snapshot, allowed)
+                    results[meal] = result
+                    yield "section", {"name": meal, "data": result.get(meal) or []}
+        except LLMOverloadedError as e:
+            yield "error", {"error": "Service is busy, please retry shortly", "retry_after": e.retry_after}
+            return
+        finally:
+            for task in pending:
+                task.cancel()
+
+        meal_schedule = self._merge_meals(results, user_preferences)
+        report = self._validate(meal_schedule, snapshot, user_preferences)
+        if report is not None and report['corrected']:
+            for meal in sorted({mismatch['meal'] for mismatch in report['item_mismatches']}, key=MEALS.index):
+                yield "section", {"name": meal, "data": meal_schedule[meal]}
+        for name in ('daily_totals', 'meal_plan_analysis'):
+            yield "section", {"name": name, "data": meal_schedule[name]}
+        if report is not None:
+            yield "validation", report
+
+        self.result_cache.put(cache_key, meal_schedule, snapshot.version)
+        self.record_plan(meal_schedule, user_preferences, snapshot)
+        print("Meal plan generated successfully!")
+        yield "done", {}
+
+    async def _stream_generated(self, snapshot, user_preferences, cache_key):
+        try:
+            meal_schedule = await self._generate_meal_schedule_async(snapshot, user_preferences, cache_key)
+        except LLMOverloadedError as e:
+            yield "error", {"error": "Service is busy, please retry shortly", "retry_after": e.retry_after}
+            return
+        if "error" in meal_schedule:
+            yield "error", meal_schedule
+            return
+        async for event in self._stream_cached(meal_schedule):
+            yield event
+
+    async def _stream_cached(self, meal_schedule):
+        for name in MEAL_SECTIONS:
+            if name in meal_schedule:
+                yield "section", {"name": name, "data": meal_schedule[name]}
+        if "validation" in meal_schedule:
+            yield "validation", meal_schedule["validation"]
+        yield "done", {}
+
+    async def _stream_error(self, error):
+        yield "error", error
+
+    def metrics(self):
+        """Runtime counters for the LLM limiter and the plan cache"""
+        return {
+            "llm": self.llm_limiter.metrics(),
+            "plan_history": self.plan_history.metrics(),
+            "recommendation_cache": {
+                "entries": len(self.result_cache),
+                "hits": self.result_cache.hits,
+                "misses": self.result_cache.misses,
+            },
+        }
+
+    def _schedule_cache_key(self, snapshot, user_preferences):
+        return preference_key(
+            user_preferences, f"{snapshot.version}:{self.menu_format}:{self.output_format}:{self.generation_mode}"
+        )
 
+    def _build_prompt(self, snapshot, user_preferences):
+        """Prompt for this user, or None when no menu item fits their preferences"""
+        # Drop items that conflict with allergens, dislikes and diet before building the prompt
+        allowed_items = snapshot.menu_index.filter(user_preferences)
+        if not allowed_items:
+            return None
 
-            # Clean up response
-            if ai_response.startswith('```json'):
-                ai_response = ai_response.replace('```json', '').replace('```', '').strip()
-            
-            # Extract JSON
-            start_idx = ai_response.find('{')
-            end_idx = ai_response.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = ai_response[start_idx:end_idx]
-                meal_schedule = json.loads(json_str)
-                
-                # Save to file
-                self.save_response_to_file(meal_schedule, user_preferences)
-                print("Meal plan generated successfully!")
-                
-                return meal_schedule
-            else:
-                return {"error": "Failed to parse AI response", "raw_response": ai_response}
-                
-        except json.JSONDecodeError as e:
-            return {"error": "Failed to parse AI response as JSON", "json_error": str(e), "raw_response": ai_response}
+        # Static instructions + menu first (stable per menu version), user data last
+        return self.prompt_builder.build(snapshot, allowed_items, user_preferences,
+                                         use_stable_prefix=self.use_context_cache)
+
+    def _meal_candidates(self, snapshot, user_preferences):
+        """meal -> allowed item indices served at that meal (meals with no items are left out)"""
+        allowed = set(snapshot.menu_index.filter(user_preferences))
+        meal_items = {}
+        for meal in MEALS:
+            items = [i for i in snapshot.meal_partition[meal] if i in allowed]
+            if items:
+                meal_items[meal] = items
+        return meal_items
+
+    def _build_meal_prompts(self, snapshot, user_preferences):
+        """meal -> prompt carrying only that meal's allowed items and its share of the targets"""
+        meal_items = self._meal_candidates(snapshot, user_preferences)
+        # A meal with nothing to offer (e.g. no breakfast on weekends) hands its budget to the others
+        budgets = meal_budgets(user_preferences, tuple(meal_items))
+        return {
+            meal: self.prompt_builder.build_meal(snapshot, items, meal, budgets[meal], user_preferences)
+            for meal, items in meal_items.items()
+        }
+
+    def _build_shortlists(self, snapshot, user_preferences):
+        """Optimized mode: meal -> MealShortlist chosen locally from the allowed items"""
+        meal_items = self._meal_candidates(snapshot, user_preferences)
+        budgets = meal_budgets(user_preferences, tuple(meal_items))
+        return build_shortlists(snapshot.portion_optimizer, meal_items, budgets)
+
+    def _plan_from_choices(self, snapshot, shortlists, choices, user_preferences):
+        """Optimized mode: exact portions for the model's picks, hydrated into the full response shape"""
+        budgets = meal_budgets(user_preferences, tuple(shortlists))
+        meal_plans = {}
+        for meal, shortlist in shortlists.items():
+            picked, reasons = [], {}
+            for choice in choices.get(meal) or []:
+                if not isinstance(choice, dict):
+                    continue
+                index = snapshot.item_codes.get(str(choice.get("id", "")).strip().lstrip("*"))
+                if index is not None:
+                    picked.append(index)
+                    reasons.setdefault(index, str(choice.get("reason") or ""))
+            indices = resolve_picks(shortlist, picked)
+            portions, _ = snapshot.portion_optimizer.solve_portions(indices, budgets[meal])
+            meal_plans[meal] = [hydrate_item(snapshot.items[i], float(portion), reasons.get(i, ""))
+                                for i, portion in zip(indices, portions)]
+        suggestions = [str(tip) for tip in choices.get("suggestions") or [] if tip]
+        return merge_meal_plans(meal_plans, user_preferences, suggestions)
+
+    def _hydrate(self, result, snapshot, user_preferences):
+        """Compact output mode: rebuild the full plan from item ids and portions"""
+        if self.output_format != 'compact' or "error" in result:
+            return result
+        allowed = set(snapshot.menu_index.filter(user_preferences))
+        return hydrate_plan(result, snapshot, user_preferences, allowed)
+
+    def _hydrate_meals(self, results, snapshot, user_preferences):
+        """Compact output mode: per-meal results with their items hydrated"""
+        if self.output_format != 'compact':
+            return results
+        allowed = set(snapshot.menu_index.filter(user_preferences))
+        return {meal: self._hydrate_meal(meal, result, snapshot, allowed) for meal, result in results.items()}
+
+    def _hydrate_meal(self, meal, result, snapshot, allowed):
+        if "error" in result:
+            return result
+        items = [hydrate_choice(snapshot, choice, allowed) for choice in result.get(meal) or []]
+        return dict(result, **{meal: [item for item in items if item is not None]})
+
+    def _merge_meals(self, results, user_preferences):
+        """Combine per-meal outputs into the full plan (first per-meal error wins)"""
+        meal_plans = {}
+        tips = []
+        for meal in MEALS:
+            if meal not in results:
+                continue
+            result = results[meal]
+            if "error" in result:
+                return dict(result, meal=meal)
+            meal_plans[meal] = result.get(meal) or []
+            if result.get("tip"):
+                tips.append(result["tip"])
+        return merge_meal_plans(meal_plans, user_preferences, tips)
+
+    def _generate_meal_schedule(self, snapshot, user_preferences, cache_key):
+        """Generate the plan (one Gemini call, or one per meal in parallel); cached on success"""
+        if self.generation_mode == 'per_meal':
+            meal_schedule = self._generate_per_meal(snapshot, user_preferences)
+        elif self.generation_mode == 'optimized':
+            meal_schedule = self._generate_optimized(snapshot, user_preferences)
+        else:
+            meal_schedule = self._generate_single(snapshot, user_preferences)
+
+        if "error" not in meal_schedule:
+            self._validate(meal_schedule, snapshot, user_preferences)
+            self.result_cache.put(cache_key, meal_schedule, snapshot.version)
+            self.record_plan(meal_schedule, user_preferences, snapshot)
+            print("Meal plan generated successfully!")
+        return meal_schedule
+
+    async def _generate_meal_schedule_async(self, snapshot, user_preferences, cache_key):
+        """Async counterpart of _generate_meal_schedule"""
+        if self.generation_mode == 'per_meal':
+            meal_schedule = await self._generate_per_meal_async(snapshot, user_preferences)
+        elif self.generation_mode == 'optimized':
+            meal_schedule = await self._generate_optimized_async(snapshot, user_preferences)
+        else:
+            meal_schedule = await self._generate_single_async(snapshot, user_preferences)
+
+        if "error" not in meal_schedule:
+            self._validate(meal_schedule, snapshot, user_preferences)
+            self.result_cache.put(cache_key, meal_schedule, snapshot.version)
+            self.record_plan(meal_schedule, user_preferences, snapshot)
+            print("Meal plan generated successfully!")
+        return meal_schedule
+
+    def _validate(self, meal_schedule, snapshot, user_preferences):
+        """Recompute model-written nutrition against the menu (optimized and hydrated plans are exact already)"""
+        if self.generation_mode == 'optimized' or self.output_format == 'compact':
+            return None
+        validate_plan(meal_schedule, snapshot, user_preferences, self.validation_mode)
+        report = meal_schedule['validation']
+        if report['item_mismatches'] or report['total_mismatches'] or report['unmatched_items']:
+            print(f"Plan validation ({self.validation_mode}): {len(report['item_mismatches'])} item and "
+                  f"{len(report['total_mismatches'])} total mismatches, {len(report['unmatched_items'])} unmatched items")
+        return report
+
+    def _revised_sections(self, meal_schedule, report):
+        """Sections already streamed that validation changed, followed by the report itself"""
+        if report is None:
+            return
+        if report['corrected']:
+            meals = {mismatch['meal'] for mismatch in report['item_mismatches']}
+            for name in MEAL_SECTIONS:
+                if name in meals or name in ('daily_totals', 'meal_plan_analysis'):
+                    yield "section", {"name": name, "data": meal_schedule[name]}
+        yield "validation", report
+
+    def _generate_single(self, snapshot, user_preferences):
+        """Filter the menu, call Gemini once and parse the plan"""
+        prompt = self._build_prompt(snapshot, user_preferences)
+        if prompt is None:
+            return {"error": "No menu items match your dietary preferences"}
+        print("Generating meal plan with single API call...")
+        return self._hydrate(self._call_and_parse(prompt), snapshot, user_preferences)
+
+    async def _generate_single_async(self, snapshot, user_preferences):
+        prompt = self._build_prompt(snapshot, user_preferences)
+        if prompt is None:
+            return {"error": "No menu items match your dietary preferences"}
+        print("Generating meal plan with single API call...")
+        return self._hydrate(await self._call_and_parse_async(prompt), snapshot, user_preferences)
+
+    def _generate_per_meal(self, snapshot, user_preferences):
+        """One smaller Gemini call per meal, run concurrently, merged with recomputed totals"""
+        prompts = self._build_meal_prompts(snapshot, user_preferences)
+        if not prompts:
+            return {"error": "No menu items match your dietary preferences"}
+
+        print(f"Generating meal plan with {len(prompts)} parallel per-meal calls...")
+        with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+            outputs = pool.map(lambda prompt: self._call_and_parse(prompt, allow_context_cache=False), prompts.values())
+            results = dict(zip(prompts, outputs))
+        return self._merge_meals(self._hydrate_meals(results, snapshot, user_preferences), user_preferences)
+
+    async def _generate_per_meal_async(self, snapshot, user_preferences):
+        prompts = self._build_meal_prompts(snapshot, user_preferences)
+        if not prompts:
+            return {"error": "No menu items match your dietary preferences"}
+
+        print(f"Generating meal plan with {len(prompts)} parallel per-meal calls...")
+        tasks = [asyncio.ensure_future(self._call_and_parse_async(prompt, allow_context_cache=False))
+                 for prompt in prompts.values()]
+        try:
+            outputs = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        results = self._hydrate_meals(dict(zip(prompts, outputs)), snapshot, user_preferences)
+        return self._merge_meals(results, user_preferences)
+
+    def _generate_optimized(self, snapshot, user_preferences):
+        """Local optimizer picks candidates and portions; one short Gemini call chooses and explains"""
+        shortlists = self._build_shortlists(snapshot, user_preferences)
+        if not shortlists:
+            return {"error": "No menu items match your dietary preferences"}
+
+        print("Generating meal plan from optimizer shortlist...")
+        prompt = self.prompt_builder.build_shortlist(snapshot, shortlists, user_preferences)
+        choices = self._call_and_parse(prompt, allow_context_cache=False)
+        if "error" in choices:
+            return choices
+        return self._plan_from_choices(snapshot, shortlists, choices, user_preferences)
+
+    async def _generate_optimized_async(self, snapshot, user_preferences):
+        shortlists = self._build_shortlists(snapshot, user_preferences)
+        if not shortlists:
+            return {"error": "No menu items match your dietary preferences"}
+
+        print("Generating meal plan from optimizer shortlist...")
+        prompt = self.prompt_builder.build_shortlist(snapshot, shortlists, user_preferences)
+        choices = await self._call_and_parse_async(prompt, allow_context_cache=False)
+        if "error" in choices:
+            return choices
+        return self._plan_from_choices(snapshot, shortlists, choices, user_preferences)
+
+    def _call_and_parse(self, prompt, allow_context_cache=True):
+        """One Gemini call (waits for a free slot, raises LLMOverloadedError when overloaded), parsed"""
+        try:
+            with self.llm_limiter.slot():
+                response = self._generate(prompt, allow_context_cache)
+            ai_response = response.text.strip()
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             return {"error": f"AI service error: {str(e)}"}
-    
-    def save_response_to_file(self, meal_schedule, user_preferences):
-        """Save AI response to backend/app/data/ai_response folder"""
+        return self.parse_meal_schedule(ai_response)
+
+    async def _call_and_parse_async(self, prompt, allow_context_cache=True):
         try:
-            # Create directory if it doesn't exist
-            os.makedirs('backend/app/data/ai_response', exist_ok=True)
-            
-            # Create response with metadata
-            response_data = {
-                "user_preferences": user_preferences,
-                "meal_schedule": meal_schedule,
-                "timestamp": json.dumps({"generated_at": time.time()})
-            }
-            
-            # Save to file
-            file_path = 'backend/app/data/ai_response/daily_meal_schedule.json'
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(response_data, f, indent=2, ensure_ascii=False)
-            
-            print(f"AI response saved to: {file_path}")
-            
+            async with self.llm_limiter.slot_async():
+                response = await self._generate_async(prompt, allow_context_cache=allow_context_cache)
+            ai_response = response.text.strip()
+        except LLMOverloadedError:
+            raise
         except Exception as e:
-            print(f"Error saving response to file: {e}")
+            return {"error": f"AI service error: {str(e)}"}
+        return self.parse_meal_schedule(ai_response)
+
+    def parse_meal_schedule(self, ai_response):
+        """Extract the meal plan JSON from the model output (error dict on failure)"""
+        # Code fences and prose around the JSON object are skipped by the parser
+        parser = StreamingJSONParser()
+        parser.feed(ai_response)
+        try:
+            return parser.finish()
+        except StreamParseError as e:
+            return self._parse_error(parser, e)
+
+    def _parse_error(self, parser, error):
+        """Error dict for unparseable model output, with the failure position and any complete sections"""
+        if not parser.started:
+            return {"error": "Failed to parse AI response", "raw_response": parser.text}
+        result = {
+            "error": "Failed to parse AI response as JSON",
+            "json_error": str(error),
+            "error_position": {"char": error.pos, "line": error.lineno, "column": error.colno},
+            "raw_response": parser.text,
+        }
+        if parser.sections:
+            result["partial_plan"] = parser.sections
+        return result
+    
+    def _generate(self, prompt, allow_context_cache=True):
+        """Call Gemini; with context caching on, only the per-request suffix is sent"""
+        if self.use_context_cache and allow_context_cache:
+            cached_model = self._cached_model(prompt.prefix)
+            if cached_model is not None:
+                return cached_model.generate_content(prompt.suffix)
+        return self.model.generate_content(prompt.text)
+
+    async def _generate_async(self, prompt, stream=False, allow_context_cache=True):
+        """Non-blocking Gemini call (generate_content_async); stream=True returns an async chunk iterator"""
+        if self.use_context_cache and allow_context_cache:
+            cached_model = await asyncio.to_thread(self._cached_model, prompt.prefix)
+            if cached_model is not None:
+                return await cached_model.generate_content_async(prompt.suffix, stream=stream)
+        return await self.model.generate_content_async(prompt.text, stream=stream)
+
+    def _cached_model(self, prefix):
+        """GenerativeModel bound to a provider-side cache of `prefix` (created once per prefix).
+
+        Creation is single-flight per prefix: concurrent requests on a new menu version
+        wait for the one provider cache being created instead of each creating (and
+        paying for) their own.
+        """
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        entry = self._cached_models.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+
+        with self._cached_models_lock:
+            lock = self._cached_model_locks.setdefault(key, threading.Lock())
+        with lock:
+            entry = self._cached_models.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                return entry[0]  # created by the request we waited for
+
+            try:
+                cached_content = genai.caching.CachedContent.create(
+                    model=self.model_name,
+                    display_name=f"nutrigrove-menu-{key[:12]}",
+                    contents=[prefix],
+                    ttl=datetime.timedelta(seconds=self._context_cache_ttl),
+                )
+                model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+                print(f"Gemini context cache created for prompt prefix {key[:12]}")
+            except Exception as e:
+                # e.g. prefix below the provider's minimum cacheable size: fall back to full prompts
+                print(f"Gemini context caching unavailable: {e}")
+                model = None
+
+            # Renew a little before the provider expires it (never after, even for short TTLs)
+            now = time.monotonic()
+            renew_at = now + self._context_cache_ttl - min(60, self._context_cache_ttl / 2)
+            with self._cached_models_lock:
+                # Drop entries for old prefixes (menu versions) along with their locks
+                for old_key in [k for k, (_, until) in self._cached_models.items() if until <= now and k != key]:
+                    del self._cached_models[old_key]
+                    self._cached_model_locks.pop(old_key, None)
+                self._cached_models[key] = (model, renew_at)
+        return model
+
+    def record_plan(self, meal_schedule, user_preferences, snapshot=None):
+        """Queue the plan for the history log (never waits on disk); returns its request ID"""
+        menu_version = snapshot.version if snapshot is not None else None
+        return self.plan_history.record(meal_schedule, user_preferences, menu_version)
@@ -1,19 +1,37 @@
 # Using fastapi for getting response and sending resopnses to the user
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from .model.schema import UserInput
 from .ai_food_recommendation import FoodRecommender
+from .services.llm_limiter import LLMOverloadedError
+from .services.plan_stream import sse_event
 
 recommender = FoodRecommender()
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Write out plans still queued for the history log
+    recommender.plan_history.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# Too many Gemini calls in flight / queued: fail fast and tell the client when to retry
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded(request: Request, exc: LLMOverloadedError):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Service is busy, please retry shortly", "detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 @app.get('/')
 def hello():
     return {'message':'Hello, This is API system for NutriGrove'}
 
-@app.post('/recommendations')
-def recommendations(data: UserInput):
-    user_preferences = {
+def build_user_preferences(data: UserInput):
+    return {
         'age': data.age,
         'gender': data.gender,
         'weight': data.weight,
@@ -29,14 +47,38 @@ def recommendations(data: UserInput):
         'dislikes': data.dislikes
     }
 
-    schedule = recommender.get_daily_meal_schedule(user_preferences)
+@app.post('/recommendations')
+async def recommendations(data: UserInput):
+    user_preferences = build_user_preferences(data)
+
+    # Async path: the Gemini call does not hold a threadpool worker while it runs
+    schedule = await recommender.get_daily_meal_schedule_async(user_preferences)
 
     return JSONResponse(status_code=200, content=schedule)
 
+# Same plan as /recommendations, pushed section by section (breakfast first) as Server-Sent Events
+@app.post('/recommendations/stream')
+async def recommendations_stream(data: UserInput):
+    events = await recommender.stream_daily_meal_schedule(build_user_preferences(data))
+
+    async def event_stream():
+        async for event, payload in events:
+            yield sse_event(event, payload)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Adding a new api endpoint for getting the entire menu data. Used the function from class FoodRecommender. : EDIT - will need to figure it out later on.
 @app.get('/menu')
 def todays_menu():
-    return recommender.get_all_menu_data()
+    return recommender.get_full_menu_data()
+
+@app.get('/metrics')
+def metrics():
+    return recommender.metrics()
 
 #   Essential Parameters (definitely add these):
 # age
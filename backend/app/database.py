@@ -1,38 +1,94 @@
-import json
 import os
+import sys
 from dotenv import load_dotenv
+from postgrest import ReturnMethod
 from supabase import create_client, Client
 
+# Works both as part of the backend.app package and when run directly as a script
+try:
+    from .services.bulk_upload import BulkUploader, DEFAULT_BATCH_SIZE, DEFAULT_MAX_RETRIES, DEFAULT_WORKERS, format_report
+    from .services.json_items import iter_json_items
+    from .services.menu_delta import KEY_COLUMN, MenuDelta, fetch_item_hashes, format_delta
+    from .services.menu_repository import MENU_TABLE
+    from .services.nutrition import normalize_item
+except ImportError:
+    from services.bulk_upload import BulkUploader, DEFAULT_BATCH_SIZE, DEFAULT_MAX_RETRIES, DEFAULT_WORKERS, format_report
+    from services.json_items import iter_json_items
+    from services.menu_delta import KEY_COLUMN, MenuDelta, fetch_item_hashes, format_delta
+    from services.menu_repository import MENU_TABLE
+    from services.nutrition import normalize_item
+
 class SupabaseUploader:
     def __init__(self):
         load_dotenv()
-        
+
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_ANON_KEY")
-        
+
         if not url or not key:
             print("Error: Missing Supabase credentials in .env file")
             exit()
-        
+
         self.supabase = create_client(url, key)
-    
-    def upload_json_file(self, file_path):
-        # Load your cleaned JSON data
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-
-        # If your data is a list of objects, insert each one
-        if isinstance(data, list):
-            for item in data:
-                result = self.supabase.table('cleaned_data').insert({"data": item}).execute()
-                print(f"Inserted record with ID: {result.data[0]['id']}")
-
-        # If your data is a single object, insert it
-        else:
-            result = self.supabase.table('cleaned_data').insert({"data": data}).execute()
-            print(f"Inserted record with ID: {result.data[0]['id']}")
-
-# Usage
+
+        # Bulk insert tuning: rows per request, parallel requests, retries per failed batch
+        self.batch_size = int(os.getenv("UPLOAD_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        self.workers = int(os.getenv("UPLOAD_WORKERS", DEFAULT_WORKERS))
+        self.max_retries = int(os.getenv("UPLOAD_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+
+    def upload_json_file(self, file_path, batch_size=None, workers=None, prune=False):
+        """Bring the menu table in line with a cleaned JSON file; returns an IngestReport.
+
+        The file (a JSON array, JSON Lines or a single object) is read item by item while
+        earlier batches upload, so only a few batches of items are held at a time; the
+        delta check still keeps one short key per item (see MenuDelta). Only new and
+        changed items (by content hash) are upserted on item_key, so re-running on the
+        same file sends nothing. Updated rows get a new updated_at from the table's
+        trigger, so menu delta syncs pick them up. With `prune`, rows whose item is no
+        longer in the file are deleted afterwards.
+
+        Needs the migrations in backend/migrations (MissingColumnsError otherwise).
+
+        Each item's nutrition is parsed into canonical numeric units on the way in and
+        stored next to the raw values (data.nutrition_normalized).
+        """
+        existing, unkeyed = fetch_item_hashes(self.supabase, MENU_TABLE)
+        delta = MenuDelta(existing, unkeyed)
+
+        uploader = self._bulk_uploader(self._upsert_batch, batch_size, workers)
+        items = (normalize_item(item) for item in iter_json_items(file_path))
+        report = uploader.upload(delta.rows(items))
+        print(format_report(report))
+
+        deleted = 0
+        if prune:
+            if report.failed_batches:
+                print("Skipping prune: some batches failed to upload")
+            else:
+                deleted = self._bulk_uploader(self._delete_batch, batch_size, workers).upload(delta.stale_ids()).uploaded
+
+        ingest = delta.report(report, deleted)
+        print(f"Menu delta: {format_delta(ingest)}")
+        return ingest
+
+    def _bulk_uploader(self, send_batch, batch_size=None, workers=None):
+        return BulkUploader(
+            send_batch,
+            batch_size=batch_size or self.batch_size,
+            workers=workers or self.workers,
+            max_retries=self.max_retries,
+        )
+
+    def _upsert_batch(self, rows):
+        # One request per batch; the written rows are not sent back
+        self.supabase.table(MENU_TABLE).upsert(rows, on_conflict=KEY_COLUMN, returning=ReturnMethod.minimal).execute()
+
+    def _delete_batch(self, ids):
+        self.supabase.table(MENU_TABLE).delete(returning=ReturnMethod.minimal).in_('id', ids).execute()
+
+# Usage: python database.py [file.json | file.jsonl] [--prune]
 if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--prune"]
     uploader = SupabaseUploader()
-    uploader.upload_json_file('backend/app/data/cleaned_data/all_food_items_cleaned.json')
\ No newline at end of file
+    uploader.upload_json_file(args[0] if args else 'backend/app/data/cleaned_data/all_food_items_cleaned.json',
+                              prune="--prune" in sys.argv[1:])
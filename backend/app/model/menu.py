@@ -0,0 +1,78 @@
+import sys
+from dataclasses import dataclass
+from types import MappingProxyType
+from ..services.nutrition import NORMALIZED_FIELD, TEXT_FIELDS
+
+
+def freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(val) for key, val in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(val) for val in value)
+    return value
+
+
+def thaw(value):
+    """Inverse of freeze(): plain dicts/lists, safe to hand out or serialize"""
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(val) for key, val in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(val) for val in value]
+    return value
+
+
+def clean_ingredients(ingredients):
+    """Strip the trailing "Disclaimer:" text; non-string ingredients become 'N/A'"""
+    if not isinstance(ingredients, str):
+        return 'N/A'
+    if "Disclaimer:" in ingredients:
+        ingredients = ingredients.split("Disclaimer:")[0].strip()
+    return ingredients
+
+
+def _intern(value):
+    # Station and meal type names repeat across thousands of items
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass(frozen=True, slots=True)
+class MenuItem:
+    """Immutable menu record, built once per menu version and shared by every request"""
+    id: object
+    name: str
+    station: str
+    meal_type: str
+    nutrition: MappingProxyType  # read-only, ingredients already sanitized
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a record from a cleaned_data row without touching the row itself"""
+        food_data = row.get('data', {}) or {}
+        nutrition = dict(food_data.get('nutrition', {}) or {})
+        # Amounts parsed at ingest replace the raw strings, so nothing downstream re-parses them
+        normalized = food_data.get(NORMALIZED_FIELD) or {}
+        nutrition.update((key, normalized[key]) for key in list(nutrition)
+                         if key in normalized and key not in TEXT_FIELDS)
+        nutrition['ingredients'] = clean_ingredients(nutrition.get('ingredients', 'N/A'))
+
+        return cls(
+            id=row.get('id'),
+            name=food_data.get("food_name", "Unknown"),
+            station=_intern(food_data.get("station_name", "Unknown")),
+            meal_type=_intern(food_data.get("meal_type", "Unknown")),
+            nutrition=freeze(nutrition),
+        )
+
+    @property
+    def ingredients(self):
+        return self.nutrition.get('ingredients', 'N/A')
+
+    def to_dict(self):
+        """Formatted item as sent to the AI (same shape format_menu_data always produced)"""
+        return {
+            "name": self.name,
+            "station": self.station,
+            "meal_type": self.meal_type,
+            "nutrition": thaw(self.nutrition),  # keep ALL fields (macros + micros + extras)
+        }
@@ -0,0 +1,95 @@
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # seconds before the first retry, doubled on every further one
+
+# failed_batches: numbers (0-based, in input order) of the batches that still failed after all retries
+UploadReport = namedtuple("UploadReport", ["items", "batches", "uploaded", "failed_items", "failed_batches",
+                                           "retries", "seconds"])
+
+
+def chunked(rows, size):
+    """Lists of up to `size` consecutive rows from any iterable"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BulkUploader:
+    """Sends rows in batches from a small thread pool, retrying failed batches with backoff.
+
+    `send_batch(rows)` does one request for a whole batch and raises on failure. At most
+    `workers * 2` batches are queued or in flight at any time, so rows can come from a
+    generator and only a few batches are ever held in memory.
+    """
+
+    def __init__(self, send_batch, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF, sleep=None):
+        self.send_batch = send_batch
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._sleep = sleep or time.sleep
+
+    def upload(self, rows):
+        started = time.monotonic()
+        totals = {"items": 0, "batches": 0, "uploaded": 0, "failed_items": 0, "failed_batches": [], "retries": 0}
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-upload") as pool:
+            pending = set()
+            for number, batch in enumerate(chunked(rows, self.batch_size)):
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done, totals)
+                pending.add(pool.submit(self._send, number, batch))
+            self._collect(wait(pending).done, totals)
+
+        totals["failed_batches"].sort()
+        return UploadReport(seconds=time.monotonic() - started, **totals)
+
+    def _send(self, number, batch):
+        """(batch number, size, succeeded, retries used) for one batch"""
+        attempt = 0
+        while True:
+            try:
+                self.send_batch(batch)
+                return number, len(batch), True, attempt
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    print(f"Batch {number} ({len(batch)} items) failed after {attempt + 1} attempts: {e}")
+                    return number, len(batch), False, attempt
+                # Exponential backoff with jitter so parallel workers don't retry in lockstep
+                self._sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.0))
+                attempt += 1
+
+    def _collect(self, futures, totals):
+        for future in futures:
+            number, size, succeeded, retries = future.result()
+            totals["items"] += size
+            totals["batches"] += 1
+            totals["retries"] += retries
+            if succeeded:
+                totals["uploaded"] += size
+            else:
+                totals["failed_items"] += size
+                totals["failed_batches"].append(number)
+
+
+def format_report(report):
+    """One-line summary of an UploadReport"""
+    line = (f"Uploaded {report.uploaded}/{report.items} items in {report.batches} batches "
+            f"({report.seconds:.1f}s, {report.retries} retries)")
+    if report.failed_batches:
+        line += f"; {report.failed_items} items in {len(report.failed_batches)} batches failed: {report.failed_batches}"
+    return line
@@ -0,0 +1,96 @@
+from .menu_encoding import NUTRIENT_COLUMNS
+from .meal_planner import MEALS, merge_meal_plans
+from .nutrition import round_amount, to_number
+
+# Nutrients repeated at the top level of each plan item, in the order the response uses
+ITEM_NUTRIENTS = ('calories', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g', 'sodium_mg')
+
+# Accepted range for a model-chosen portion multiplier; anything else falls back to one serving
+MAX_PORTION = 10
+
+
+def _allergen_list(allergens):
+    if not allergens:
+        return []
+    if isinstance(allergens, str):
+        return [part.strip() for part in allergens.split(',') if part.strip()]
+    return [str(a) for a in allergens]
+
+
+def describe_portion(portion, serving_size):
+    """'2 x 1/2 cup' style text for a multiplier of the menu serving"""
+    if serving_size:
+        return f"{portion:g} x {serving_size}"
+    return f"{portion:g} serving" + ("" if portion == 1 else "s")
+
+
+def hydrate_item(item, portion, reason=""):
+    """Full plan item (same shape and field order the model is asked for) from a menu record and a portion"""
+    nutrition = item.nutrition
+    serving_size = nutrition.get('serving_size')
+    base = {field: to_number(nutrition.get(field)) for field in NUTRIENT_COLUMNS}
+    scaled = {field: None if value is None else round_amount(value * portion) for field, value in base.items()}
+    recommended = describe_portion(portion, serving_size)
+
+    math = [f"{portion:g} servings x {base['calories']} cal = {scaled['calories']} cal"]
+    if base['protein_g'] is not None:
+        math.append(f"{portion:g} x {base['protein_g']}g protein = {scaled['protein_g']}g")
+
+    hydrated = {
+        "name": item.name,
+        "station": item.station,
+        "recommended_portion": recommended,
+        "serving_size": f"Menu: {serving_size or '1 serving'}, Recommended: {recommended}",
+    }
+    hydrated.update((field, scaled[field]) for field in ITEM_NUTRIENTS)
+    hydrated.update({
+        "allergens": _allergen_list(nutrition.get('allergens')),
+        "ingredients": item.ingredients,
+        "per_menu_serving_nutrition": {"serving_size": serving_size, **base},
+        "full_nutrition": scaled,
+        "portion_math": ", ".join(math),
+        "reason_selected": reason,
+    })
+    return hydrated
+
+
+def choice_portion(choice):
+    """Portion multiplier of a compact {"id", "portion", "reason"} entry"""
+    portion = to_number(choice.get('portion'))
+    if portion is None or not 0 < portion <= MAX_PORTION:
+        return 1.0
+    return float(portion)
+
+
+def hydrate_choice(snapshot, choice, allowed=None):
+    """Full plan item for one compact entry, or None when its id is unknown (or not allowed for this user)"""
+    if not isinstance(choice, dict):
+        return None
+    index = snapshot.item_codes.get(str(choice.get('id', '')).strip())
+    if index is None or (allowed is not None and index not in allowed):
+        return None
+    return hydrate_item(snapshot.items[index], choice_portion(choice), str(choice.get('reason') or ''))
+
+
+def hydrate_plan(compact_plan, snapshot, user_preferences, allowed=None):
+    """Full response shape from a compact (id / portion / reason) plan; totals computed from the menu"""
+    meal_plans = {}
+    dropped = []
+    for meal in MEALS:
+        meal_plans[meal] = []
+        for choice in compact_plan.get(meal) or []:
+            item = hydrate_choice(snapshot, choice, allowed)
+            if item is None:
+                dropped.append({"meal": meal, "id": choice.get('id') if isinstance(choice, dict) else choice})
+            else:
+                meal_plans[meal].append(item)
+    if dropped:
+        print(f"Dropped {len(dropped)} unknown or excluded item ids from compact plan")
+
+    suggestions = [str(tip) for tip in compact_plan.get('suggestions') or [] if tip]
+    plan = merge_meal_plans(meal_plans, user_preferences, suggestions)
+    if compact_plan.get('user_comment_compliance'):
+        plan['meal_plan_analysis']['user_comment_compliance'] = compact_plan['user_comment_compliance']
+    if dropped:
+        plan['meal_plan_analysis']['dropped_items'] = dropped
+    return plan
@@ -0,0 +1,105 @@
+import json
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\r\n'
+_decoder = json.JSONDecoder()
+
+
+class JSONItemsError(ValueError):
+    """Input is neither a JSON array, a single JSON value nor JSON Lines; pos is the character offset in the file"""
+
+    def __init__(self, msg, pos):
+        super().__init__(f"{msg}: char {pos}")
+        self.msg = msg
+        self.pos = pos
+
+
+class _Buffer:
+    """Sliding window over a text file: only the unread part is kept, read chunk_size at a time"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.dropped = 0  # characters discarded before text[0], for error offsets
+        self.eof = False
+
+    def read_more(self, size=None):
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos:
+            self.dropped += self.pos
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        self.text += chunk
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of the file"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read_more():
+                return ''
+
+    def value(self):
+        """Decode the JSON value at the current position, reading more text until it is complete"""
+        while True:
+            # An item larger than a chunk doubles the read size, so it is re-decoded O(log n) times
+            more = max(self.chunk_size, len(self.text) - self.pos)
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as e:
+                if self.read_more(more):
+                    continue
+                raise JSONItemsError(e.msg, self.dropped + e.pos) from None
+            # A number touching the end of the window may continue in the next chunk
+            if end == len(self.text) and not self.eof and self.read_more(more):
+                continue
+            self.pos = end
+            return value
+
+    def error(self, msg):
+        return JSONItemsError(msg, self.dropped + self.pos)
+
+
+def iter_json_items(f, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Items of a JSON file one at a time, without loading the whole file.
+
+    `f` is a path or an open text file. A top-level array yields its elements, JSON
+    Lines (or any whitespace-separated values) yield one item per value, and a single
+    object is yielded as one item. Only the current item and one read chunk are held
+    in memory.
+    """
+    if isinstance(f, str):
+        with open(f, 'r', encoding='utf-8') as handle:
+            yield from iter_json_items(handle, chunk_size)
+        return
+
+    buffer = _Buffer(f, chunk_size)
+    if buffer.peek() != '[':
+        while buffer.peek():
+            yield buffer.value()
+        return
+
+    buffer.pos += 1
+    if buffer.peek() == ']':
+        buffer.pos += 1
+    else:
+        while True:
+            buffer.peek()
+            yield buffer.value()
+            separator = buffer.peek()
+            if separator not in (',', ']'):
+                raise buffer.error("Expecting ',' delimiter")
+            buffer.pos += 1
+            if separator == ']':
+                break
+    if buffer.peek():
+        raise buffer.error("Extra data")
@@ -0,0 +1,204 @@
+import json
+import re
+from collections import namedtuple
+
+# kind is 'item' (one element of a top-level array closed) or 'section' (a top-level value closed)
+ParseEvent = namedtuple("ParseEvent", ["kind", "key", "index", "value"])
+
+_WHITESPACE = ' \t\r\n'
+_TOKEN_RE = re.compile(r'["{}\[\],:]')
+_STRING_END_RE = re.compile(r'["\\]')
+
+# Error messages per top-level grammar state (same wording as the json module)
+_EXPECTED = {
+    'key': "Expecting property name enclosed in double quotes",
+    'colon': "Expecting ':' delimiter",
+    'value': "Expecting value",
+    'comma': "Expecting ',' delimiter",
+}
+
+
+class StreamParseError(json.JSONDecodeError):
+    """Model output is not valid JSON; pos / lineno / colno point into the whole output text"""
+
+
+class StreamingJSONParser:
+    """Incremental parser for a JSON object that arrives in chunks (LLM output).
+
+    feed() scans only the new text and returns ParseEvents for every element of a
+    top-level array and every top-level value that closed in it, so callers can act on
+    breakfast before dinner has been generated. Text before the first '{' (code fences,
+    prose) and after the matching '}' is ignored.
+
+    Only structural characters are scanned; each completed value is decoded once from
+    its own slice with json.loads, so errors carry the exact position in the output.
+    After an error the parser stops; finish() raises it and `sections` keeps everything
+    that was complete before the failure.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.sections = {}    # top-level key -> decoded value, in document order
+        self.items = {}       # top-level key -> elements of that array decoded so far
+        self.started = False  # the top-level '{' has been seen
+        self.done = False     # ... and its matching '}'
+        self.error = None
+
+        self._pos = 0          # next position to scan
+        self._mark = 0         # end of the last top-level token (start of the current gap)
+        self._expect = 'key'   # top-level grammar state: key, colon, value, comma
+        self._in_string = False
+        self._string_start = None
+        self._stack = []       # (opener, position) of containers open inside the current value
+        self._key = None
+        self._item_start = None
+
+    def feed(self, chunk):
+        """Consume the next piece of model output; returns the ParseEvents it completed"""
+        self.text += chunk
+        events = []
+        if self.error is None and not self.done:
+            try:
+                self._scan(events)
+            except StreamParseError as e:
+                self.error = e
+        return events
+
+    def finish(self):
+        """The complete top-level object, or StreamParseError describing where it went wrong"""
+        if self.error is not None:
+            raise self.error
+        if not self.started:
+            raise StreamParseError("No JSON object found in model output", self.text, 0)
+        if not self.done:
+            raise StreamParseError("Unexpected end of model output", self.text, len(self.text))
+        return dict(self.sections)
+
+    def _scan(self, events):
+        text = self.text
+        if not self.started:
+            start = text.find('{', self._pos)
+            if start == -1:
+                self._pos = len(text)
+                return
+            self.started = True
+            self._pos = self._mark = start + 1
+
+        pos = self._pos
+        while not self.done:
+            if self._in_string:
+                match = _STRING_END_RE.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(text):
+                        pos = match.start()  # escape split across chunks: rescan it next time
+                        break
+                    pos = match.end() + 1
+                    continue
+                pos = match.end()
+                self._in_string = False
+                if not self._stack:
+                    self._top_level_string(pos, events)
+                continue
+
+            match = _TOKEN_RE.search(text, pos)
+            if match is None:
+                pos = len(text)
+                break
+            token, at = match.group(), match.start()
+            pos = match.end()
+            if self._stack:
+                self._nested_token(token, at, events)
+            else:
+                self._top_level_token(token, at, events)
+        self._pos = pos
+
+    def _nested_token(self, token, at, events):
+        """Structure inside a top-level value; commas/colons are checked when the value is decoded"""
+        if token == '"':
+            self._in_string = True
+        elif token in '{[':
+            if len(self._stack) == 1 and self._stack[0][0] == '[':
+                self._item_start = at
+            self._stack.append((token, at))
+        elif token in '}]':
+            opener, start = self._stack.pop()
+            if (opener == '{') != (token == '}'):
+                self._fail(f"Mismatched '{token}' for '{opener}' opened at char {start}", at)
+            if not self._stack:
+                self._value_done(self._decode(start, at + 1), at + 1, events)
+            elif len(self._stack) == 1 and self._stack[0][0] == '[' and self._item_start is not None:
+                self._item_done(self._decode(self._item_start, at + 1), events)
+                self._item_start = None
+
+    def _top_level_token(self, token, at, events):
+        gap = self.text[self._mark:at]
+        scalar = gap.strip(_WHITESPACE)
+        if scalar:
+            start = self._mark + len(gap) - len(gap.lstrip(_WHITESPACE))
+            if self._expect != 'value':
+                self._fail(_EXPECTED[self._expect], start)
+            # Number / true / false / null value: it runs up to the next delimiter
+            self._value_done(self._decode(start, start + len(scalar)), at, events)
+            if token not in ',}':
+                self._fail(_EXPECTED['comma'], at)
+
+        if self._expect == 'key':
+            if token == '"':
+                self._in_string, self._string_start = True, at
+            elif token == '}' and not self.sections:
+                self.done = True
+            else:
+                self._fail(_EXPECTED['key'], at)
+        elif self._expect == 'colon':
+            if token != ':':
+                self._fail(_EXPECTED['colon'], at)
+            self._expect = 'value'
+        elif self._expect == 'value':
+            if token == '"':
+                self._in_string, self._string_start = True, at
+            elif token in '{[':
+                self._stack.append((token, at))
+                if token == '[':
+                    self.items[self._key] = []
+            else:
+                self._fail(_EXPECTED['value'], at)
+        elif token == ',':
+            self._expect = 'key'
+        elif token == '}':
+            self.done = True
+        else:
+            self._fail(_EXPECTED['comma'], at)
+        self._mark = at + 1
+
+    def _top_level_string(self, end, events):
+        value = self._decode(self._string_start, end)
+        if self._expect == 'key':
+            self._key = value
+            self._expect = 'colon'
+        else:
+            self._value_done(value, end, events)
+        self._mark = end
+
+    def _item_done(self, value, events):
+        items = self.items[self._key]
+        items.append(value)
+        events.append(ParseEvent('item', self._key, len(items) - 1, value))
+
+    def _value_done(self, value, end, events):
+        self.sections[self._key] = value
+        self.items.pop(self._key, None)
+        events.append(ParseEvent('section', self._key, None, value))
+        self._expect = 'comma'
+        self._mark = end
+
+    def _decode(self, start, end):
+        try:
+            return json.loads(self.text[start:end])
+        except json.JSONDecodeError as e:
+            self._fail(e.msg, start + e.pos)
+
+    def _fail(self, message, pos):
+        raise StreamParseError(message, self.text, pos)
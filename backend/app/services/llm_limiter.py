@@ -0,0 +1,210 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+
+class LLMOverloadedError(Exception):
+    """Raised when a request cannot get an LLM slot in time (maps to HTTP 503)"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _ThreadWaiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+    def grant(self, limiter):
+        self.granted = True
+        self.event.set()
+
+
+class _AsyncWaiter:
+    __slots__ = ("loop", "future", "granted")
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+    def grant(self, limiter):
+        self.granted = True
+
+        def deliver():
+            if self.future.done():
+                # The waiter timed out / was cancelled after the slot was handed over
+                limiter.release()
+            else:
+                self.future.set_result(True)
+
+        self.loop.call_soon_threadsafe(deliver)
+
+
+class LLMLimiter:
+    """Concurrency limiter with a bounded FIFO wait queue for LLM calls.
+
+    At most `max_concurrent` calls run at once (sync and async callers share the same
+    slots). Up to `max_queue` callers may wait, each for at most `max_wait` seconds.
+    A caller is rejected immediately with LLMOverloadedError when the queue is full, or
+    when the expected wait (average call time x queue position / max_concurrent) is
+    already longer than `max_wait`, so the API answers 503 + Retry-After right away
+    instead of after a wait that was bound to time out.
+    """
+
+    def __init__(self, max_concurrent=16, max_queue=64, max_wait=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queue = deque()
+
+        # metrics
+        self._admitted = 0
+        self._shed = 0
+        self._max_queue_depth = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=256)
+        self._avg_call_seconds = None  # EMA of slot hold time, used for Retry-After
+
+    # --- sync API ---
+
+    @contextmanager
+    def slot(self):
+        """Hold one LLM slot for the duration of the block (blocking wait)"""
+        started = time.monotonic()
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def acquire(self):
+        start = time.monotonic()
+        with self._lock:
+            if self._try_admit_now():
+                return
+            waiter = _ThreadWaiter()
+            self._enqueue(waiter)
+
+        waiter.event.wait(self.max_wait)
+        with self._lock:
+            if waiter.granted:
+                self._record_wait(time.monotonic() - start)
+                return
+            self._queue.remove(waiter)
+            self._shed += 1
+        raise self._overloaded("Timed out waiting for an LLM slot")
+
+    # --- async API ---
+
+    @asynccontextmanager
+    async def slot_async(self):
+        """Hold one LLM slot for the duration of the block (non-blocking wait)"""
+        started = time.monotonic()
+        await self.acquire_async()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    async def acquire_async(self):
+        start = time.monotonic()
+        with self._lock:
+            if self._try_admit_now():
+                return
+            waiter = _AsyncWaiter(asyncio.get_running_loop())
+            self._enqueue(waiter)
+
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                # If the slot was granted meanwhile, deliver() sees the cancelled future and releases it
+                if not waiter.granted:
+                    self._queue.remove(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self._shed += 1
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._overloaded("Timed out waiting for an LLM slot") from None
+        with self._lock:
+            self._record_wait(time.monotonic() - start)
+
+    # --- shared ---
+
+    def release(self, held_seconds=None):
+        with self._lock:
+            if held_seconds is not None:
+                if self._avg_call_seconds is None:
+                    self._avg_call_seconds = held_seconds
+                else:
+                    self._avg_call_seconds = 0.8 * self._avg_call_seconds + 0.2 * held_seconds
+            if self._queue:
+                # Hand the slot straight to the next waiter (in_flight stays the same)
+                self._queue.popleft().grant(self)
+                return
+            self._in_flight -= 1
+
+    def metrics(self):
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+            return {
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_queue_depth,
+                "admitted": self._admitted,
+                "shed": self._shed,
+                "avg_wait_seconds": round(self._wait_total / self._admitted, 4) if self._admitted else 0.0,
+                "p95_wait_seconds": round(p95, 4),
+                "max_wait_seconds": round(self._wait_max, 4),
+            }
+
+    def _try_admit_now(self):
+        """Take a free slot if there is one and nobody is queued (lock held)"""
+        if self._in_flight < self.max_concurrent and not self._queue:
+            self._in_flight += 1
+            self._record_wait(0.0)
+            return True
+        if len(self._queue) >= self.max_queue:
+            self._shed += 1
+            raise self._overloaded("LLM wait queue is full")
+        estimate = self._estimated_wait()
+        if estimate is not None and estimate > self.max_wait:
+            self._shed += 1
+            raise self._overloaded(f"Expected wait for an LLM slot ({estimate:.1f}s) exceeds {self.max_wait:g}s")
+        return False
+
+    def _enqueue(self, waiter):
+        self._queue.append(waiter)
+        self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+
+    def _record_wait(self, seconds):
+        self._admitted += 1
+        self._wait_total += seconds
+        self._wait_max = max(self._wait_max, seconds)
+        self._recent_waits.append(seconds)
+
+    def _estimated_wait(self):
+        """Rough wait for a caller joining the end of the queue; None until a call has completed"""
+        if self._avg_call_seconds is None:
+            return None
+        return self._avg_call_seconds * (len(self._queue) + 1) / max(self.max_concurrent, 1)
+
+    def _overloaded(self, message):
+        # Rough time until a slot frees up for the whole current queue
+        estimate = self._estimated_wait()
+        if estimate is None:
+            estimate = self.max_wait * (len(self._queue) + 1) / max(self.max_concurrent, 1)
+        return LLMOverloadedError(message, retry_after=max(1, math.ceil(estimate)))
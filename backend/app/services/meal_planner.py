@@ -0,0 +1,111 @@
+from .nutrition import round_amount, to_number
+
+GENERATION_MODES = ('single', 'per_meal', 'optimized')
+
+MEALS = ('breakfast', 'lunch', 'dinner')
+
+# Share of the daily calorie / protein targets planned into each meal
+MEAL_SHARES = {'breakfast': 0.25, 'lunch': 0.35, 'dinner': 0.40}
+
+# Menu meal_type values that are served at more than one meal
+MEAL_TYPE_ALIASES = {'brunch': ('breakfast', 'lunch')}
+
+# Item fields summed into daily_totals as total_<field>
+TOTAL_FIELDS = ('calories', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g', 'sodium_mg')
+
+
+def meals_for(meal_type):
+    """Meals an item with this meal_type can be planned into (unknown / all-day: every meal)"""
+    meal_type = (meal_type or '').strip().lower()
+    if meal_type in MEALS:
+        return (meal_type,)
+    return MEAL_TYPE_ALIASES.get(meal_type, MEALS)
+
+
+def partition_by_meal(items):
+    """meal -> indices of the items that can be served at that meal"""
+    partition = {meal: [] for meal in MEALS}
+    for i, item in enumerate(items):
+        for meal in meals_for(item.meal_type):
+            partition[meal].append(i)
+    return {meal: tuple(indices) for meal, indices in partition.items()}
+
+
+def meal_budgets(user_preferences, meals=MEALS):
+    """Per-meal calorie / protein targets; shares of skipped meals go to the remaining ones"""
+    calories = to_number(user_preferences.get('calories'))
+    protein = to_number(user_preferences.get('protein'))
+    total_share = sum(MEAL_SHARES[meal] for meal in meals) or 1
+    budgets = {}
+    for meal in meals:
+        share = MEAL_SHARES[meal] / total_share
+        budgets[meal] = {
+            'calories': round(calories * share) if calories else None,
+            'protein_g': round(protein * share) if protein else None,
+        }
+    return budgets
+
+
+def daily_totals(meal_plan, user_preferences):
+    """daily_totals recomputed from the items of every meal"""
+    sums = dict.fromkeys(TOTAL_FIELDS, 0)
+    for meal in MEALS:
+        for item in meal_plan.get(meal) or []:
+            for field in TOTAL_FIELDS:
+                value = to_number(item.get(field))
+                if value is not None:
+                    sums[field] += value
+    return totals_from_sums(sums, user_preferences)
+
+
+def totals_from_sums(sums, user_preferences):
+    """daily_totals from per-field sums of the plan's items"""
+    totals = {f"total_{field}": round_amount(float(sums[field])) for field in TOTAL_FIELDS}
+    calorie_target = to_number(user_preferences.get('calories'))
+    protein_target = to_number(user_preferences.get('protein'))
+    totals['calorie_target'] = calorie_target
+    totals['protein_target'] = protein_target
+    totals['calorie_difference'] = (
+        round_amount(totals['total_calories'] - calorie_target) if calorie_target is not None else None
+    )
+    totals['protein_difference'] = (
+        round_amount(totals['total_protein_g'] - protein_target) if protein_target is not None else None
+    )
+    return totals
+
+
+def _goal_status(total, target, difference, unit=""):
+    if target is None:
+        return f"{total}{unit} (no target set)"
+    status = "Met" if difference >= 0 else "Missed"
+    return f"{status}: {total}{unit} vs target {target}{unit} ({difference:+}{unit})"
+
+
+def plan_analysis(totals, suggestions=()):
+    """meal_plan_analysis derived from the recomputed totals"""
+    missing = []
+    if totals['calorie_difference'] is not None and totals['calorie_difference'] < 0:
+        missing.append("calories")
+    if totals['protein_difference'] is not None and totals['protein_difference'] < 0:
+        missing.append("protein")
+
+    protein_target = totals['protein_target']
+    overshoot = bool(protein_target) and totals['total_protein_g'] > protein_target * 1.5
+    return {
+        "calorie_goal_status": _goal_status(totals['total_calories'], totals['calorie_target'], totals['calorie_difference']),
+        "protein_goal_status": _goal_status(totals['total_protein_g'], protein_target, totals['protein_difference'], "g"),
+        "target_achievement": f"FAILED - Missing: {', '.join(missing)}" if missing else "SUCCESS - All targets met",
+        "dietary_compliance": "Menu pre-filtered for allergens, dislikes and diet",
+        "nutrition_balance_check": (
+            "Warning: Excessive protein overshoot" if overshoot else "Balanced nutrition ratios achieved"
+        ),
+        "suggestions": list(suggestions)[:3],
+    }
+
+
+def merge_meal_plans(meal_plans, user_preferences, suggestions=()):
+    """Full response shape from separately generated meals, with totals recomputed locally"""
+    plan = {meal: list(meal_plans.get(meal) or []) for meal in MEALS}
+    plan['daily_totals'] = daily_totals(plan, user_preferences)
+    plan['meal_plan_analysis'] = plan_analysis(plan['daily_totals'], suggestions)
+    return plan
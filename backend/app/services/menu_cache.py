@@ -0,0 +1,127 @@
+import threading
+import time
+
+
+class MenuCache:
+    """TTL cache for the dining hall menu with stale-while-revalidate refresh.
+
+    - Fresh snapshot: returned straight from memory.
+    - Expired snapshot: returned immediately while ONE background thread reloads it.
+    - No snapshot yet: the caller waits for the load (concurrent callers share it,
+      including its failure).
+    - Loader errors: the last good snapshot keeps being served; with no snapshot,
+      callers get [] without hitting the database again until `retry_interval` passes.
+    """
+
+    def __init__(self, loader, ttl=3600, retry_interval=30):
+        self._loader = loader
+        self.ttl = ttl
+        self.retry_interval = retry_interval  # back-off after a failed refresh
+
+        self._data = None
+        self._loaded_at = None  # time.monotonic() of the last successful load
+        self._retry_at = 0
+        self._attempts = 0      # loader runs so far, so waiters can tell a load finished
+        self.last_error = None
+
+        self._refresh_lock = threading.Lock()  # held for the whole duration of a refresh
+        self._refresh_thread = None
+
+    @property
+    def data(self):
+        return self._data
+
+    @property
+    def loaded_at(self):
+        return self._loaded_at
+
+    def is_stale(self):
+        """True when there is no snapshot or the snapshot is older than the TTL"""
+        if self._loaded_at is None:
+            return True
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def get(self):
+        """Return the current menu snapshot (never raises)"""
+        data = self._data
+        if data is None:
+            return self._load_blocking()
+
+        if self.is_stale() and time.monotonic() >= self._retry_at:
+            self._start_background_refresh()
+        return data
+
+    def invalidate(self):
+        """Mark the snapshot as expired; it is still served until the next refresh lands"""
+        if self._loaded_at is not None:
+            self._loaded_at = time.monotonic() - self.ttl - 1
+        self._retry_at = 0
+
+    def clear(self):
+        """Drop the snapshot entirely so the next get() reloads synchronously"""
+        self._data = None
+        self._loaded_at = None
+        self._retry_at = 0
+
+    def refresh(self):
+        """Reload synchronously, waiting for an in-flight refresh if there is one"""
+        with self._refresh_lock:
+            self._run_loader()
+        return self._data or []
+
+    def wait_for_refresh(self, timeout=None):
+        """Block until the current background refresh (if any) has finished"""
+        thread = self._refresh_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    # --- internals ---
+
+    def _load_blocking(self):
+        if time.monotonic() < self._retry_at:
+            return self._data or []  # the last attempt failed recently; don't hammer the database
+        attempt = self._attempts
+        with self._refresh_lock:
+            # Another caller ran the load while we waited: share its outcome, even a failure
+            if self._data is None and self._attempts == attempt:
+                self._run_loader()
+        return self._data or []
+
+    def _start_background_refresh(self):
+        # Non-blocking acquire: if a refresh is already running, just serve stale data
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            thread = threading.Thread(target=self._background_refresh, name="menu-cache-refresh", daemon=True)
+            self._refresh_thread = thread
+            thread.start()
+        except Exception:
+            self._refresh_lock.release()
+            raise
+
+    def _background_refresh(self):
+        try:
+            self._run_loader()
+        finally:
+            self._refresh_lock.release()
+
+    def _run_loader(self):
+        """Call the loader; must be called with _refresh_lock held"""
+        try:
+            data = self._loader()
+        except Exception as e:
+            self._attempts += 1
+            self.last_error = e
+            self._retry_at = time.monotonic() + self.retry_interval
+            if self._data is not None:
+                print(f"Menu refresh failed, serving last good snapshot: {e}")
+            else:
+                print(f"Error fetching menu data: {e}")
+            return False
+
+        self._data = data if data is not None else []
+        self._attempts += 1
+        self._loaded_at = time.monotonic()
+        self._retry_at = 0
+        self.last_error = None
+        return True
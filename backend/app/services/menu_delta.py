@@ -0,0 +1,128 @@
+import hashlib
+import json
+from collections import namedtuple
+from .menu_repository import is_missing_column
+from .nutrition import NORMALIZED_FIELD
+
+# One menu item per (name, station, meal, date); a changed nutrition label is an update of the same item
+KEY_FIELDS = ('food_name', 'station_name', 'meal_type', 'date')
+# The normalized values are included so rows are re-written when the normalization changes
+CONTENT_FIELDS = KEY_FIELDS + ('nutrition', NORMALIZED_FIELD)
+
+KEY_COLUMN = 'item_key'
+HASH_COLUMN = 'content_hash'
+
+DEFAULT_PAGE_SIZE = 1000
+
+# Columns the delta upload needs: item_key / content_hash from backend/migrations/002_cleaned_data_item_hashes.sql,
+# and updated_at (bumped by a trigger on every upsert) from 001_cleaned_data_updated_at.sql so delta syncs see updates
+REQUIRED_COLUMNS = (KEY_COLUMN, HASH_COLUMN, 'updated_at')
+
+class MissingColumnsError(RuntimeError):
+    """The menu table has not been migrated for delta uploads"""
+
+
+IngestReport = namedtuple("IngestReport", ["new", "changed", "unchanged", "duplicates", "deleted", "upload"])
+
+
+def _digest(item, fields):
+    payload = json.dumps([item.get(field) for field in fields], sort_keys=True,
+                         separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def item_key(item):
+    """Stable identity of a cleaned menu item: hash of name, station, meal type and date"""
+    return _digest(item, KEY_FIELDS)
+
+
+def content_hash(item):
+    """Hash of everything that is served from the item; equal hashes mean nothing to upload"""
+    return _digest(item, CONTENT_FIELDS)
+
+
+def fetch_item_hashes(client, table, page_size=DEFAULT_PAGE_SIZE):
+    """{item_key: (id, content_hash)} for every keyed row, plus the ids of rows without a key.
+
+    Pages through the table on id like iter_menu_rows, selecting only a few small
+    columns, so it stays cheap for the whole table. Raises MissingColumnsError when the
+    migrations have not been run.
+    """
+    hashes = {}
+    unkeyed = []
+    last_id = None
+    columns = ", ".join(("id",) + REQUIRED_COLUMNS)
+    while True:
+        query = client.table(table).select(columns).order('id').limit(page_size)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        try:
+            rows = query.execute().data or []
+        except Exception as e:
+            if is_missing_column(e):
+                raise MissingColumnsError(
+                    f"{table} is missing columns needed for delta uploads ({', '.join(REQUIRED_COLUMNS)}); "
+                    f"run the SQL files in backend/migrations first: {e}") from e
+            raise
+        for row in rows:
+            if row.get(KEY_COLUMN):
+                hashes[row[KEY_COLUMN]] = (row["id"], row.get(HASH_COLUMN))
+            else:
+                unkeyed.append(row["id"])
+        if len(rows) < page_size:
+            return hashes, unkeyed
+        last_id = rows[-1]["id"]
+
+
+class MenuDelta:
+    """Compares incoming items against the hashes already stored.
+
+    rows() passes on only new and changed items, as upsert rows keyed by item_key;
+    unchanged items and repeats of a key already seen in this run are skipped.
+    stale_ids() then lists rows whose item was not in the input (and legacy rows
+    without a key), for an optional prune.
+
+    Memory is not flat in the input size: the keys of the stored rows and of every
+    item seen so far are kept (about 100 bytes per item) for duplicate detection and
+    pruning. The items themselves are not kept.
+    """
+
+    def __init__(self, existing, unkeyed=()):
+        self.existing = existing
+        self.unkeyed = list(unkeyed)
+        self.seen = set()
+        self.new = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.duplicates = 0
+
+    def rows(self, items):
+        for item in items:
+            key = item_key(item)
+            if key in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(key)
+
+            digest = content_hash(item)
+            stored = self.existing.get(key)
+            if stored is None:
+                self.new += 1
+            elif stored[1] != digest:
+                self.changed += 1
+            else:
+                self.unchanged += 1
+                continue
+            yield {KEY_COLUMN: key, HASH_COLUMN: digest, "data": item}
+
+    def stale_ids(self):
+        return [row_id for key, (row_id, _) in self.existing.items() if key not in self.seen] + self.unkeyed
+
+    def report(self, upload, deleted=0):
+        return IngestReport(self.new, self.changed, self.unchanged, self.duplicates, deleted, upload)
+
+
+def format_delta(report):
+    """One-line summary of an IngestReport's item counts"""
+    return (f"{report.new} new, {report.changed} changed, {report.unchanged} unchanged, "
+            f"{report.duplicates} duplicates skipped, {report.deleted} deleted")
@@ -0,0 +1,90 @@
+MENU_FORMATS = ('json', 'table')
+
+TABLE_DELIMITER = '|'
+
+# Column order for the nutrients the prompt cares about; any other numeric fields follow, sorted
+NUTRIENT_COLUMNS = (
+    'calories', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g', 'sodium_mg', 'sugar_g',
+    'saturated_fat_g', 'trans_fat_g', 'cholesterol_mg', 'calcium_mg', 'iron_mg',
+    'potassium_mg', 'vitamin_a_re', 'vitamin_c_mg', 'vitamin_d_iu',
+)
+
+# Text fields are kept at the end of each row so the numbers line up under the header
+TEXT_COLUMNS = ('allergens', 'ingredients')
+
+ITEM_COLUMNS = ('id', 'name', 'station', 'meal_type', 'serving_size')
+
+_ID_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def item_code(item_id):
+    """Short stable item ID: the database id in base 36 (e.g. 1234 -> 'ya')"""
+    if not isinstance(item_id, int) or item_id < 0:
+        return str(item_id)
+    if item_id == 0:
+        return "0"
+    digits = []
+    while item_id:
+        item_id, rem = divmod(item_id, 36)
+        digits.append(_ID_ALPHABET[rem])
+    return "".join(reversed(digits))
+
+
+def format_cell(value):
+    """Compact text for one table cell; None/'N/A' become an empty cell"""
+    if value is None or value == 'N/A':
+        return ""
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, float):
+        return f"{value:g}"
+    if isinstance(value, (list, tuple)):
+        return ",".join(format_cell(v) for v in value if v is not None)
+    text = " ".join(str(value).split())  # collapse whitespace and line breaks
+    return text.replace(TABLE_DELIMITER, "/")
+
+
+def nutrient_columns(items):
+    """Nutrient columns present on at least one item, in a stable order"""
+    present = set()
+    for item in items:
+        for key, value in item.nutrition.items():
+            if value is not None and value != 'N/A':
+                present.add(key)
+    present -= set(TEXT_COLUMNS) | {'serving_size'}
+
+    ordered = [column for column in NUTRIENT_COLUMNS if column in present]
+    return ordered + sorted(present - set(NUTRIENT_COLUMNS))
+
+
+def table_header(columns):
+    return TABLE_DELIMITER.join(ITEM_COLUMNS + tuple(columns) + TEXT_COLUMNS)
+
+
+def table_row(item, columns):
+    nutrition = item.nutrition
+    cells = [
+        item_code(item.id),
+        item.name,
+        item.station,
+        item.meal_type,
+        nutrition.get('serving_size'),
+    ]
+    cells.extend(nutrition.get(column) for column in columns)
+    cells.extend(nutrition.get(column) for column in TEXT_COLUMNS)
+    return TABLE_DELIMITER.join(format_cell(cell) for cell in cells)
+
+
+def table_legend():
+    return (
+        f'One menu item per line, fields separated by "{TABLE_DELIMITER}" in the order of the header row. '
+        "Nutrition values are per menu serving; an empty field means the value is not available."
+    )
+
+
+def encode_menu_table(items):
+    """Compact tabular menu: legend, header row, then one delimited row per item"""
+    columns = nutrient_columns(items)
+    lines = [table_legend(), table_header(columns)]
+    lines.extend(table_row(item, columns) for item in items)
+    return "\n".join(lines)
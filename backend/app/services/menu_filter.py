@@ -0,0 +1,306 @@
+import re
+
+# Ingredient keywords that reveal each allergen when the menu has no explicit allergen tag
+ALLERGEN_KEYWORDS = {
+    'milk': ('milk', 'dairy', 'cheese', 'butter', 'cream', 'yogurt', 'whey', 'casein', 'lactose', 'ghee',
+             'buttered', 'buttery', 'buttermilk', 'creamy', 'cheesy', 'cheeseburger', 'cheesesteak', 'alfredo'),
+    'egg': ('egg', 'mayonnaise', 'albumen'),
+    'peanut': ('peanut',),
+    'tree nut': ('tree nut', 'almond', 'cashew', 'walnut', 'pecan', 'pistachio', 'hazelnut', 'macadamia'),
+    'fish': ('fish', 'salmon', 'tuna', 'cod', 'tilapia', 'pollock', 'anchovy', 'swai'),
+    'shellfish': ('shellfish', 'shrimp', 'crab', 'lobster', 'clam', 'mussel', 'oyster', 'scallop', 'crawfish'),
+    'soy': ('soy', 'soybean', 'tofu', 'edamame', 'miso'),
+    'wheat': ('wheat', 'flour', 'semolina', 'couscous'),
+    'gluten': ('gluten', 'wheat', 'barley', 'rye', 'flour', 'semolina', 'couscous'),
+    'sesame': ('sesame', 'tahini'),
+}
+
+ALLERGEN_ALIASES = {
+    'dairy': 'milk',
+    'lactose': 'milk',
+    'nut': 'tree nut',
+    'treenut': 'tree nut',
+    'shell fish': 'shellfish',
+    'soya': 'soy',
+}
+
+MEAT_KEYWORDS = (
+    'meat', 'chicken', 'beef', 'pork', 'turkey', 'bacon', 'ham', 'sausage', 'lamb', 'veal', 'duck',
+    'pepperoni', 'salami', 'chorizo', 'prosciutto', 'gelatin', 'steak', 'sirloin', 'ribeye', 'brisket',
+    'burger', 'hamburger', 'cheeseburger', 'cheesesteak', 'meatball', 'meatloaf', 'hot dog', 'hotdog',
+    'bratwurst', 'kielbasa', 'andouille', 'frankfurter', 'pastrami', 'corned', 'jerky', 'wing', 'rib',
+    'drumstick', 'carnitas', 'barbacoa', 'carne', 'al pastor', 'gyro', 'pancetta', 'mortadella', 'capicola',
+    'venison', 'bison', 'oxtail', 'lard', 'bolognese', 'carbonara', 'sloppy joe', 'poultry',
+)
+
+# Words before a meat word that make it a meat substitute ('Black Bean Burger', 'Impossible Burger')
+MEAT_ALTERNATIVE_MODIFIERS = frozenset((
+    'veggie', 'vegan', 'vegetarian', 'impossible', 'beyond', 'plant', 'based', 'meatless', 'bean',
+    'tofu', 'seitan', 'tempeh', 'jackfruit', 'lentil', 'cauliflower', 'faux', 'mock',
+))
+
+# Two-word names whose second word does not mean what it usually does ('peanut butter' is not dairy)
+COMPOUND_TERMS = (
+    'peanut butter', 'almond butter', 'cashew butter', 'sunflower butter', 'nut butter', 'seed butter',
+    'cocoa butter', 'apple butter', 'soy butter', 'vegan butter', 'vegan cheese', 'vegan mayonnaise',
+    'vegan mayo', 'coconut milk', 'almond milk', 'oat milk', 'soy milk', 'rice milk', 'cashew milk',
+    'coconut cream', 'rice flour', 'corn flour', 'almond flour', 'coconut flour', 'potato flour',
+    'chickpea flour', 'garbanzo flour', 'tapioca flour', 'cassava flour', 'buckwheat flour',
+)
+
+# "no X", "without X", "non-X" and "X-free" say the item does not contain X; only that word X is dropped
+NEGATION_PREFIXES = frozenset(('no', 'without', 'non'))
+NEGATION_SUFFIX = 'free'
+
+# Diet -> allergen groups and extra keywords it excludes; unknown diets (keto, paleo, ...) are left to the AI
+DIET_EXCLUSIONS = {
+    'vegan': (('milk', 'egg', 'fish', 'shellfish'), MEAT_KEYWORDS + ('honey',)),
+    'vegetarian': (('fish', 'shellfish'), MEAT_KEYWORDS),
+    'pescatarian': ((), MEAT_KEYWORDS),
+}
+
+# Free-text dietary restrictions we can act on locally
+RESTRICTION_ALLERGENS = {
+    'gluten free': 'gluten',
+    'dairy free': 'milk',
+    'lactose free': 'milk',
+    'nut free': 'tree nut',
+    'peanut free': 'peanut',
+    'egg free': 'egg',
+    'soy free': 'soy',
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def singularize(word):
+    if len(word) <= 3:
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'sses', 'xes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us')):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Lowercase, split on non-alphanumerics and singularize"""
+    if not isinstance(text, str):
+        return []
+    return [singularize(word) for word in _WORD_RE.findall(text.lower())]
+
+
+def normalize_term(text):
+    """Canonical form of a user-entered term or keyword phrase ('Tree Nuts' -> 'tree nut')"""
+    return " ".join(_join_compounds(tokenize(text)))
+
+
+_COMPOUNDS = frozenset(tuple(tokenize(term)) for term in COMPOUND_TERMS)
+_MEAT_WORDS = frozenset(tokenize(term)[0] for term in MEAT_KEYWORDS)
+
+
+def canonical_allergen(term):
+    term = normalize_term(term)
+    return ALLERGEN_ALIASES.get(term, term)
+
+
+def item_allergen_tags(item):
+    """Normalized allergen tags the menu lists for an item"""
+    allergens = item.nutrition.get('allergens') or ()
+    if isinstance(allergens, str):
+        allergens = allergens.split(',')
+    return {canonical_allergen(tag) for tag in allergens if isinstance(tag, str) and tag.strip()}
+
+
+def _strip_negations(words):
+    """Words with each negated word and its negation removed.
+
+    Only the negated word goes: 'Lactose-Free Milk' still contains 'milk', and
+    'Pasta, Cheese, Dairy-Free Sauce' still contains 'cheese'.
+    """
+    kept = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if word in NEGATION_PREFIXES and i + 1 < len(words):
+            i += 2
+            continue
+        if i + 1 < len(words) and words[i + 1] == NEGATION_SUFFIX:
+            i += 2
+            continue
+        kept.append(word)
+        i += 1
+    return kept
+
+
+def _join_compounds(words):
+    """Fuse the second word of a compound or meat-substitute name into one token.
+
+    'peanut butter' becomes 'peanut peanutbutter': 'peanut' still matches, 'butter' no
+    longer does. User-entered terms go through the same step so they still match.
+    """
+    words = list(words)
+    for i in range(1, len(words)):
+        pair = (words[i - 1], words[i])
+        if pair in _COMPOUNDS or (words[i] in _MEAT_WORDS and words[i - 1] in MEAT_ALTERNATIVE_MODIFIERS):
+            words[i] = words[i - 1] + words[i]
+    return words
+
+
+def item_text(item):
+    """Space-padded token string of name + ingredients, for whole-word phrase matching"""
+    words = []
+    for text in (item.name, item.ingredients):
+        words.extend(_join_compounds(_strip_negations(tokenize(text))))
+    return " " + " ".join(words) + " "
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part for part in value.split(',') if part.strip()]
+    return list(value)
+
+
+class PreferenceFilter:
+    """Exclusion rules derived from one user's allergens, dislikes, diet and restrictions"""
+
+    def __init__(self, allergen_tags=(), keywords=()):
+        self.allergen_tags = frozenset(allergen_tags)  # matched against the item's allergen list
+        self.keywords = frozenset(keywords)            # matched as whole words in name/ingredients
+
+    @classmethod
+    def from_preferences(cls, user_preferences):
+        allergen_tags = set()
+        keywords = set()
+
+        def exclude_allergen(allergen):
+            allergen_tags.add(allergen)
+            keywords.update(normalize_term(k) for k in ALLERGEN_KEYWORDS.get(allergen, (allergen,)))
+
+        for allergen in _as_list(user_preferences.get('allergens')):
+            exclude_allergen(canonical_allergen(allergen))
+
+        for dislike in _as_list(user_preferences.get('dislikes')):
+            term = normalize_term(dislike)
+            if term:
+                keywords.add(term)
+
+        restrictions = [normalize_term(r) for r in _as_list(user_preferences.get('dietary_restrictions'))]
+        diets = {normalize_term(user_preferences.get('diet') or '')} | set(restrictions)
+        for diet in diets:
+            if diet in DIET_EXCLUSIONS:
+                allergens, diet_keywords = DIET_EXCLUSIONS[diet]
+                for allergen in allergens:
+                    exclude_allergen(allergen)
+                keywords.update(normalize_term(k) for k in diet_keywords)
+
+        for restriction in restrictions:
+            if restriction in RESTRICTION_ALLERGENS:
+                exclude_allergen(RESTRICTION_ALLERGENS[restriction])
+
+        allergen_tags.discard('')
+        keywords.discard('')
+        return cls(allergen_tags, keywords)
+
+    def is_empty(self):
+        return not self.allergen_tags and not self.keywords
+
+    def excludes(self, item):
+        if self.allergen_tags & item_allergen_tags(item):
+            return True
+        text = item_text(item)
+        return any(f" {keyword} " in text for keyword in self.keywords)
+
+
+def filter_menu(items, user_preferences):
+    """Indices of the menu items that do not conflict with the user's preferences"""
+    rules = PreferenceFilter.from_preferences(user_preferences)
+    if rules.is_empty():
+        return list(range(len(items)))
+    return [i for i, item in enumerate(items) if not rules.excludes(item)]
+
+
+def to_bitset(indices, size):
+    """Pack item indices into an int bitset in one pass (no big-int ORs per item)"""
+    buffer = bytearray((size + 7) // 8)
+    for i in indices:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_bits(mask):
+    """Indices of the set bits of an int bitset, in ascending order"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class MenuIndex:
+    """Inverted index from allergen tags / ingredient tokens to item bitsets.
+
+    Built once per menu version. Bit i of a bitset stands for snapshot.items[i], so a
+    user's whole exclusion set resolves to a handful of ORs instead of a string scan
+    per item per request.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.all_items = (1 << len(items)) - 1
+
+        allergen_postings = {}
+        token_postings = {}
+        for i, item in enumerate(items):
+            for tag in item_allergen_tags(item):
+                allergen_postings.setdefault(tag, []).append(i)
+
+            words = item_text(item).split()
+            terms = set(words)
+            terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+            for term in terms:
+                token_postings.setdefault(term, []).append(i)
+
+        size = len(items)
+        # canonical allergen tag -> bitset, unigram / bigram of name + ingredients -> bitset
+        self.allergens = {tag: to_bitset(ids, size) for tag, ids in allergen_postings.items()}
+        self.tokens = {term: to_bitset(ids, size) for term, ids in token_postings.items()}
+
+    def keyword_mask(self, keyword):
+        """Bitset of items whose name/ingredients contain the keyword as whole words"""
+        if keyword in self.tokens:
+            return self.tokens[keyword]
+        words = keyword.split()
+        if len(words) <= 2:
+            return 0
+
+        # Longer phrases: intersect the bigrams, then confirm on the few candidates left
+        mask = self.all_items
+        for a, b in zip(words, words[1:]):
+            mask &= self.tokens.get(f"{a} {b}", 0)
+            if not mask:
+                return 0
+        padded = f" {keyword} "
+        confirmed = 0
+        for i in iter_bits(mask):
+            if padded in item_text(self.items[i]):
+                confirmed |= 1 << i
+        return confirmed
+
+    def excluded_mask(self, rules):
+        mask = 0
+        for tag in rules.allergen_tags:
+            mask |= self.allergens.get(tag, 0)
+        for keyword in rules.keywords:
+            mask |= self.keyword_mask(keyword)
+        return mask
+
+    def filter(self, user_preferences):
+        """Indices of the items that do not conflict with the user's preferences"""
+        rules = PreferenceFilter.from_preferences(user_preferences)
+        if rules.is_empty():
+            return list(range(len(self.items)))
+        return list(iter_bits(self.all_items & ~self.excluded_mask(rules)))
@@ -0,0 +1,163 @@
+import time
+from .nutrition import NORMALIZED_FIELD
+
+MENU_TABLE = 'cleaned_data'
+
+# The only `data` fields format_menu_data reads; everything else stays in the database
+MENU_FIELDS = ('food_name', 'station_name', 'meal_type', 'nutrition', NORMALIZED_FIELD)
+
+# Only present on rows written since ingest-time normalization; left out of `data` when missing
+OPTIONAL_FIELDS = (NORMALIZED_FIELD,)
+
+DEFAULT_PAGE_SIZE = 1000
+
+# Needs the updated_at column and trigger from backend/migrations/001_cleaned_data_updated_at.sql;
+# MenuSync falls back to 'id' (new rows only) when the column does not exist
+DEFAULT_CURSOR_COLUMN = 'updated_at'
+DEFAULT_FULL_SYNC_INTERVAL = 6 * 3600  # full reconcile (catches deletes) every 6 hours
+
+
+def menu_select_clause(fields=MENU_FIELDS, cursor_column=None):
+    """Build a PostgREST select clause that projects JSON fields out of `data` (fields=None: every column)"""
+    if fields is None:
+        return "*"
+    columns = ["id"]
+    if cursor_column and cursor_column != "id":
+        columns.append(cursor_column)
+    return ", ".join(columns + [f"{field}:data->{field}" for field in fields])
+
+
+def to_menu_row(row, fields=MENU_FIELDS, cursor_column=None):
+    """Rebuild the {'id', 'data': {...}} row shape from a projected row"""
+    menu_row = {"id": row.get("id")}
+    if cursor_column and cursor_column != "id":
+        menu_row[cursor_column] = row.get(cursor_column)
+    menu_row["data"] = {field: row.get(field) for field in fields
+                        if field not in OPTIONAL_FIELDS or row.get(field) is not None}
+    return menu_row
+
+
+def iter_menu_rows(client, page_size=DEFAULT_PAGE_SIZE, fields=MENU_FIELDS, table=MENU_TABLE,
+                   cursor_column=None, since=None):
+    """Yield menu rows one at a time, paging through the table with keyset pagination on id.
+
+    Each page is `WHERE id > last_id ORDER BY id LIMIT page_size`, so only one page of
+    the response is held in memory at a time and every request stays well below the
+    PostgREST response size limits.
+
+    With `cursor_column` and `since`, only rows whose cursor is >= `since` are returned
+    (used for delta sync; >= so rows sharing the high-water mark are never missed).
+    With `fields=None` the rows are returned unprojected, exactly as stored.
+    """
+    select_clause = menu_select_clause(fields, cursor_column)
+    last_id = None
+
+    while True:
+        query = client.table(table).select(select_clause).order('id').limit(page_size)
+        if cursor_column and since is not None:
+            query = query.gte(cursor_column, since)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+
+        rows = query.execute().data or []
+        for row in rows:
+            yield row if fields is None else to_menu_row(row, fields, cursor_column)
+
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+class MenuSync:
+    """In-memory copy of cleaned_data kept up to date with delta fetches.
+
+    The first load (and one every `full_sync_interval` seconds) pulls the whole table;
+    every other load only fetches rows whose `cursor_column` (updated_at by default,
+    or `id` for insert-only tables) is at or past the high-water mark, and merges them
+    by id. Deletes are picked up by the periodic full reconcile.
+    """
+
+    def __init__(self, client, cursor_column=DEFAULT_CURSOR_COLUMN,
+                 full_sync_interval=DEFAULT_FULL_SYNC_INTERVAL, page_size=DEFAULT_PAGE_SIZE):
+        self.client = client
+        self.cursor_column = cursor_column or "id"
+        self.full_sync_interval = full_sync_interval
+        self.page_size = page_size
+
+        self.high_water_mark = None
+        self._rows = {}        # id -> menu row
+        self._snapshot = None  # list view of _rows, rebuilt only when something changed
+        self._last_full_sync = None
+
+    def load(self):
+        """Return the current menu rows, running a full or delta sync as needed"""
+        if self.needs_full_sync():
+            return self.full_sync()
+        return self.delta_sync()
+
+    def needs_full_sync(self):
+        if self._last_full_sync is None or self.high_water_mark is None:
+            return True
+        return time.monotonic() - self._last_full_sync > self.full_sync_interval
+
+    def full_sync(self):
+        """Reload the whole table and replace the in-memory index"""
+        try:
+            return self._full_sync()
+        except Exception as e:
+            if self.cursor_column == "id" or not is_missing_column(e, self.cursor_column):
+                raise
+            print(f"Menu sync: column '{self.cursor_column}' does not exist, using 'id' as the delta cursor "
+                  f"(only new rows are picked up between full syncs; see backend/migrations)")
+            self.cursor_column = "id"
+            return self._full_sync()
+
+    def _full_sync(self):
+        rows = {}
+        high_water_mark = None
+        for row in self._iter_rows():
+            rows[row["id"]] = row
+            high_water_mark = self._advance(high_water_mark, row)
+
+        self._rows = rows
+        self._snapshot = list(rows.values())
+        self.high_water_mark = high_water_mark
+        self._last_full_sync = time.monotonic()
+        print(f"Menu full sync: {len(self._snapshot)} items")
+        return self._snapshot
+
+    def delta_sync(self):
+        """Fetch rows changed since the high-water mark and merge them into the index"""
+        # Collected first so a page that fails mid-way leaves the index and snapshot untouched
+        delta = {}
+        high_water_mark = self.high_water_mark
+        for row in self._iter_rows(since=self.high_water_mark):
+            if self._rows.get(row["id"]) != row:
+                delta[row["id"]] = row
+            high_water_mark = self._advance(high_water_mark, row)
+
+        changed = len(delta)
+        self._rows.update(delta)
+        self.high_water_mark = high_water_mark
+        if changed or self._snapshot is None:
+            self._snapshot = list(self._rows.values())
+            print(f"Menu delta sync: {changed} items changed")
+        return self._snapshot
+
+    def _iter_rows(self, since=None):
+        return iter_menu_rows(self.client, page_size=self.page_size,
+                              cursor_column=self.cursor_column, since=since)
+
+    def _advance(self, high_water_mark, row):
+        value = row.get(self.cursor_column)
+        if value is None:
+            return high_water_mark
+        if high_water_mark is None or value > high_water_mark:
+            return value
+        return high_water_mark
+
+
+def is_missing_column(error, column=""):
+    """True when a query failed because a column does not exist"""
+    # PostgREST reports Postgres' undefined_column error as code 42703
+    return getattr(error, "code", None) == "42703" or (column in str(error) and "does not exist" in str(error))
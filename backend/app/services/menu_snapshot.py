@@ -0,0 +1,168 @@
+import hashlib
+import json
+import textwrap
+import threading
+from functools import cached_property
+from ..model.menu import MenuItem
+from .menu_filter import MenuIndex
+from . import menu_encoding
+from .meal_planner import partition_by_meal
+from .portion_optimizer import PortionOptimizer, nutrient_matrix
+from .name_matcher import NameMatcher
+
+
+def menu_version(menu_items):
+    """Content hash of the menu rows; identical menus always get the same version"""
+    payload = json.dumps(menu_items, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class MenuSnapshot:
+    """One version of the menu plus everything derived from it.
+
+    The rows are turned into immutable MenuItem records once, when the snapshot is
+    built. Derived values (formatted menu, serialized prompt fragment, ...) are computed
+    the first time they are needed and then shared by every request on the same version.
+    Nothing here ever mutates the cached rows.
+    """
+
+    def __init__(self, menu_items, version=None):
+        self.menu_items = menu_items
+        self.version = version or menu_version(menu_items)
+        self.items = tuple(MenuItem.from_row(row) for row in menu_items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def formatted_menu(self):
+        """Fresh list of formatted item dicts (callers may modify it freely)"""
+        return [item.to_dict() for item in self.items]
+
+    @cached_property
+    def menu_index(self):
+        """Allergen / ingredient bitset index used for per-request filtering"""
+        return MenuIndex(self.items)
+
+    @cached_property
+    def meal_partition(self):
+        """meal -> indices of the items served at that meal (per-meal generation)"""
+        return partition_by_meal(self.items)
+
+    @cached_property
+    def nutrient_matrix(self):
+        """items x nutrients NumPy matrix for the portion optimizer (NaN where unknown)"""
+        return nutrient_matrix(self.items)
+
+    @cached_property
+    def full_nutrient_matrix(self):
+        """items x NUTRIENT_COLUMNS matrix used to recompute scaled nutrition (NaN where unknown)"""
+        return nutrient_matrix(self.items, menu_encoding.NUTRIENT_COLUMNS)
+
+    @cached_property
+    def name_matcher(self):
+        """Indexed fuzzy lookup from the names the model writes to item indices"""
+        return NameMatcher(self.items)
+
+    @cached_property
+    def portion_optimizer(self):
+        """Item selection / portion solver over this version's nutrient matrix"""
+        return PortionOptimizer(self.nutrient_matrix, [item.station for item in self.items])
+
+    @cached_property
+    def item_codes(self):
+        """Short item ID (as shown in prompts) -> item index"""
+        return {menu_encoding.item_code(item.id): i for i, item in enumerate(self.items)}
+
+    @cached_property
+    def item_json(self):
+        """Per-item JSON fragments, indented as they appear inside the menu array"""
+        return tuple(textwrap.indent(json.dumps(item.to_dict(), indent=2), "  ") for item in self.items)
+
+    @cached_property
+    def item_json_with_ids(self):
+        """Per-item JSON fragments led by the short item id (compact output mode refers to items by id)"""
+        return tuple(textwrap.indent(json.dumps({"id": menu_encoding.item_code(item.id), **item.to_dict()}, indent=2), "  ")
+                     for item in self.items)
+
+    @cached_property
+    def menu_json(self):
+        """Serialized menu block as embedded in the prompt"""
+        return self.menu_json_for(range(len(self.items)))
+
+    def menu_json_for(self, indices, with_ids=False):
+        """Serialized menu block for a subset of items (same text as json.dumps(subset, indent=2))"""
+        item_json = self.item_json_with_ids if with_ids else self.item_json
+        fragments = [item_json[i] for i in indices]
+        if not fragments:
+            return "[]"
+        return "[\n" + ",\n".join(fragments) + "\n]"
+
+    @cached_property
+    def table_columns(self):
+        return menu_encoding.nutrient_columns(self.items)
+
+    @cached_property
+    def table_rows(self):
+        """Per-item rows of the compact tabular encoding"""
+        return tuple(menu_encoding.table_row(item, self.table_columns) for item in self.items)
+
+    def menu_table_for(self, indices):
+        """Compact tabular menu block for a subset of items"""
+        lines = [menu_encoding.table_legend(), menu_encoding.table_header(self.table_columns)]
+        lines.extend(self.table_rows[i] for i in indices)
+        return "\n".join(lines)
+
+    def menu_block_for(self, indices, menu_format='json', with_ids=False):
+        """Menu section of the prompt in the requested format ('json' or 'table'; table rows always carry ids)"""
+        if menu_format == 'table':
+            return self.menu_table_for(indices)
+        return self.menu_json_for(indices, with_ids)
+
+
+class MenuSnapshotStore:
+    """Hands out the MenuSnapshot for the current menu, rebuilding it only on a new version"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Register callback(snapshot), called whenever a new menu version is built"""
+        self._listeners.append(callback)
+
+    @property
+    def current(self):
+        return self._snapshot
+
+    def get(self, menu_items):
+        snapshot = self._snapshot
+        # Fast path: the cache hands back the same list object until the menu is reloaded
+        if snapshot is not None and snapshot.menu_items is menu_items:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.menu_items is menu_items:
+                return snapshot
+
+            version = menu_version(menu_items)
+            if snapshot is not None and snapshot.version == version:
+                # Reloaded but unchanged: keep the already formatted snapshot
+                snapshot.menu_items = menu_items
+                return snapshot
+
+            snapshot = MenuSnapshot(menu_items, version)
+            # Format and index once, under the lock, before anyone else sees it
+            snapshot.menu_json
+            snapshot.menu_index
+            snapshot.name_matcher
+            self._snapshot = snapshot
+            print(f"Menu snapshot built: version {version}, {len(menu_items)} items")
+
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Menu snapshot listener failed: {e}")
+        return snapshot
@@ -0,0 +1,91 @@
+import re
+import unicodedata
+from collections import namedtuple
+import numpy as np
+
+# Best match for an output item: menu index and a 0..1 confidence
+NameMatch = namedtuple("NameMatch", ["index", "score"])
+
+MIN_SCORE = 0.6       # weaker matches are treated as "not on the menu"
+STATION_BONUS = 0.1   # same station as the model said breaks ties between similar names
+TOKEN_SET_SCORE = 0.95
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(text):
+    """Lowercase, accents and punctuation stripped, single spaces ('Jalapeño Mac & Cheese' -> 'jalapeno mac cheese')"""
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii')
+    return " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+
+
+def trigrams(text):
+    """Character trigrams of a normalized name, padded so short words still get some"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameMatcher:
+    """Maps the names the model writes back to menu items, built once per menu version.
+
+    Lookups try, in order: exact normalized name, same words in any order, then
+    trigram similarity (Dice coefficient): shared trigram counts come from one
+    bincount over the query's posting lists, so only an index lookup per trigram is
+    done in Python. Among equally good names the one at the station the model named wins.
+    """
+
+    def __init__(self, items):
+        self.stations = [normalize_name(item.station) for item in items]
+        self.exact = {}
+        self.token_sets = {}
+        postings = {}
+        gram_counts = []
+        for i, item in enumerate(items):
+            name = normalize_name(item.name)
+            self.exact.setdefault(name, []).append(i)
+            self.token_sets.setdefault(frozenset(name.split()), []).append(i)
+            grams = trigrams(name)
+            gram_counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: np.array(indices, dtype=np.int32) for gram, indices in postings.items()}
+        self.gram_counts = np.array(gram_counts, dtype=float)
+        station_ids = {}
+        self.station_ids = np.array([station_ids.setdefault(s, len(station_ids)) for s in self.stations])
+        self._station_lookup = station_ids
+
+    def match(self, name, station=None):
+        """NameMatch for the best menu item, or None when nothing reaches MIN_SCORE"""
+        name = normalize_name(name)
+        if not name:
+            return None
+        station = normalize_name(station)
+
+        candidates = self.exact.get(name)
+        if candidates:
+            return NameMatch(self._prefer_station(candidates, station), 1.0)
+        candidates = self.token_sets.get(frozenset(name.split()))
+        if candidates:
+            return NameMatch(self._prefer_station(candidates, station), TOKEN_SET_SCORE)
+
+        grams = trigrams(name)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return None
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.gram_counts))
+        scores = 2 * shared / (len(grams) + self.gram_counts)
+        rank = scores
+        station_id = self._station_lookup.get(station)
+        if station_id is not None:
+            rank = scores + STATION_BONUS * (self.station_ids == station_id)
+        rank = np.where(scores >= MIN_SCORE, rank, -1)  # the bonus never lifts a weak name over a good one
+        best = int(np.argmax(rank))  # first (lowest index) of equal ranks
+        if rank[best] < 0:
+            return None
+        return NameMatch(best, round(float(scores[best]), 3))
+
+    def _prefer_station(self, candidates, station):
+        for i in candidates:
+            if self.stations[i] == station:
+                return i
+        return candidates[0]
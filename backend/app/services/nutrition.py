@@ -0,0 +1,129 @@
+import re
+
+_NUMBER_RE = re.compile(r"[-+]?\d*\.?\d+")
+
+
+def to_number(value):
+    """Numeric value of a nutrient field (12, 12.5, '12g', '1,200 mg', '<1 g'), or None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        match = _NUMBER_RE.search(value.replace(",", ""))
+        if match:
+            number = float(match.group())
+            return int(number) if number.is_integer() else number
+    return None
+
+
+def round_amount(value):
+    """Whole numbers stay ints, everything else keeps one decimal"""
+    value = round(value, 1)
+    return int(value) if float(value).is_integer() else value
+
+
+# --- ingest-time normalization ---
+
+NORMALIZED_FIELD = 'nutrition_normalized'
+
+# Raw nutrition fields that are text, not amounts
+TEXT_FIELDS = ('serving_size', 'allergens', 'ingredients')
+
+# Grams per unit for mass amounts; a nutrient's canonical unit is the suffix of its key (protein_g, sodium_mg)
+_MASS_UNITS = {'g': 1.0, 'gram': 1.0, 'grams': 1.0, 'mg': 1e-3, 'mcg': 1e-6, 'ug': 1e-6, 'µg': 1e-6,
+               'oz': 28.3495, 'ounce': 28.3495, 'ounces': 28.3495, 'lb': 453.592}
+_ENERGY_UNITS = {'kcal': 1.0, 'cal': 1.0, 'calories': 1.0, 'kj': 1 / 4.184}
+_FIELD_UNITS = ('g', 'mg', 'mcg', 'iu', 're', 'kcal')
+
+# Serving units as they appear on menus -> canonical spelling
+_SERVING_UNITS = {
+    'ounce': 'oz', 'ounces': 'oz', 'fl oz': 'fl_oz', 'fluid ounce': 'fl_oz', 'fluid ounces': 'fl_oz',
+    'cups': 'cup', 'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'gram': 'g', 'grams': 'g', 'ea': 'each', 'pc': 'piece', 'pcs': 'piece', 'pieces': 'piece',
+    'slices': 'slice', 'serving': 'each', 'servings': 'each',
+}
+
+# "12.5g", "<1 mg", "1,200 kJ", "1 1/2 cup", "1/2 cup"
+_AMOUNT_RE = re.compile(r"^\s*[<>~]?\s*(?:(\d+)\s+(\d+)/(\d+)|(\d+)/(\d+)|(\d*\.?\d+))\s*(.*?)\s*\.?$")
+
+
+def parse_amount(value):
+    """(number, unit text) from a raw amount ('1 1/2 cup' -> (1.5, 'cup')); (None, None) if there is no number"""
+    if isinstance(value, bool) or value is None:
+        return None, None
+    if isinstance(value, (int, float)):
+        return value, ''
+    if not isinstance(value, str):
+        return None, None
+    match = _AMOUNT_RE.match(value.replace(",", ""))
+    if not match:
+        return None, None
+    whole, num, den, frac_num, frac_den, number, unit = match.groups()
+    if whole:
+        amount = int(whole) + int(num) / int(den) if int(den) else None
+    elif frac_num:
+        amount = int(frac_num) / int(frac_den) if int(frac_den) else None
+    else:
+        amount = float(number)
+    return amount, unit.lower()
+
+
+def canonical_amount(field, value):
+    """Nutrient value as a number in the unit its field name implies ('500 mg' for protein_g -> 0.5), or None"""
+    amount, unit = parse_amount(value)
+    if amount is None:
+        return None
+    if unit:
+        target = field.rsplit('_', 1)[-1]
+        if field == 'calories' or field.endswith('_kcal'):
+            factor = _ENERGY_UNITS.get(unit)
+        elif target in _MASS_UNITS and unit in _MASS_UNITS:
+            factor = _MASS_UNITS[unit] / _MASS_UNITS[target]
+        elif target in _FIELD_UNITS:
+            # Same unit as the field (IU, RE, ...) or a unit we cannot convert
+            factor = 1.0 if unit == target else None
+        else:
+            factor = 1.0  # no unit in the field name: keep the number as written
+        if factor is None:
+            return None
+        amount *= factor
+    return _tidy(amount)
+
+
+def parse_serving_size(value):
+    """{'serving_quantity', 'serving_unit'[, 'serving_grams']} from menu text like '1/2 cup' or '4 oz'"""
+    amount, unit = parse_amount(value)
+    if amount is None:
+        return {}
+    unit = _SERVING_UNITS.get(unit, unit) or 'each'
+    serving = {"serving_quantity": _tidy(amount), "serving_unit": unit}
+    if unit in _MASS_UNITS:
+        serving["serving_grams"] = _tidy(amount * _MASS_UNITS[unit])
+    return serving
+
+
+def normalize_nutrition(nutrition):
+    """Numeric nutrients in canonical units plus the parsed serving size; unparseable values are left out"""
+    nutrition = nutrition or {}
+    normalized = {}
+    for field, value in nutrition.items():
+        if field in TEXT_FIELDS:
+            continue
+        amount = canonical_amount(field, value)
+        if amount is not None:
+            normalized[field] = amount
+    normalized.update(parse_serving_size(nutrition.get('serving_size')))
+    return normalized
+
+
+def normalize_item(item):
+    """Cleaned menu item with its normalized nutrition stored next to the raw values"""
+    if not isinstance(item, dict):
+        return item
+    return dict(item, **{NORMALIZED_FIELD: normalize_nutrition(item.get('nutrition'))})
+
+
+def _tidy(amount):
+    amount = round(amount, 3)
+    return int(amount) if float(amount).is_integer() else amount
@@ -0,0 +1,195 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+DEFAULT_DIRECTORY = 'backend/app/data/ai_response'
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_QUEUE = 1000
+DEFAULT_FSYNC_INTERVAL = 1.0
+BATCH_SIZE = 100
+
+SEGMENT_PREFIX = 'plans-'
+SEGMENT_SUFFIX = '.jsonl'
+
+
+class PlanHistory:
+    """Append-only log of every generated meal plan, written off the request path.
+
+    record() only puts the plan on a bounded queue and returns; a background thread
+    serializes records as compact JSON Lines, appends them to the current segment file
+    and rotates to a new segment once it reaches `segment_bytes`. Writes are flushed
+    per batch and fsynced at most every `fsync_interval` seconds (and on close). When
+    the queue is full the record is dropped and counted rather than making the
+    request wait for the disk.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 max_queue=DEFAULT_MAX_QUEUE, fsync_interval=DEFAULT_FSYNC_INTERVAL):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._file = None
+        self._segment_size = 0
+        self._segment_seq = 0
+        self._last_fsync = 0.0
+        self._dirty = False
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def record(self, meal_schedule, user_preferences, menu_version=None, request_id=None):
+        """Queue one plan for writing; returns its request ID, or None if it was dropped"""
+        request_id = request_id or uuid.uuid4().hex
+        entry = {
+            "request_id": request_id,
+            "menu_version": menu_version,
+            "generated_at": time.time(),
+            "user_preferences": user_preferences,
+            "meal_schedule": meal_schedule,
+        }
+        if self._closed:
+            self.dropped += 1
+            return None
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            return None
+        return request_id
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is written (tests / shutdown); False on timeout"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Write what is queued, fsync and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def metrics(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="plan-history-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval)]
+            except queue.Empty:
+                self._sync()  # idle: make the last batch durable
+                continue
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [entry for entry in batch if isinstance(entry, dict)]
+            if records:
+                self._write(records)
+            stop = any(entry is None for entry in batch)
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._sync()
+            for entry in batch:
+                if isinstance(entry, threading.Event):
+                    entry.set()
+            if stop:
+                self._close_segment()
+                return
+
+    def _write(self, records):
+        try:
+            lines = []
+            for entry in records:
+                try:
+                    lines.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str) + "\n")
+                except (TypeError, ValueError) as e:
+                    self.errors += 1
+                    print(f"Plan history: could not serialize plan {entry.get('request_id')}: {e}")
+            for line in lines:
+                data = line.encode("utf-8")
+                if self._file is None or (self._segment_size and self._segment_size + len(data) > self.segment_bytes):
+                    self._rotate()
+                self._file.write(data)
+                self._segment_size += len(data)
+            if self._file is not None:
+                self._file.flush()
+            self.written += len(lines)
+            self._dirty = True
+        except OSError as e:
+            self.errors += len(records)
+            print(f"Error saving plan history: {e}")
+            self._close_segment()
+
+    def _rotate(self):
+        self._close_segment()
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment_seq += 1
+        name = f"{SEGMENT_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._segment_seq:04d}{SEGMENT_SUFFIX}"
+        self._file = open(os.path.join(self.directory, name), "ab")
+        self._segment_size = self._file.tell()
+        print(f"Plan history segment: {name}")
+
+    def _sync(self):
+        if self._file is not None and self._dirty:
+            try:
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                print(f"Error syncing plan history: {e}")
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def _close_segment(self):
+        if self._file is not None:
+            try:
+                self._sync()
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+            self._segment_size = 0
+
+
+def read_history(directory=DEFAULT_DIRECTORY):
+    """Every recorded plan, oldest first (segments sort by creation time)"""
+    if not os.path.isdir(directory):
+        return []
+    records = []
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
@@ -0,0 +1,9 @@
+import json
+
+# Top-level sections of a meal plan, in the order the prompt asks the model to write them
+MEAL_SECTIONS = ('breakfast', 'lunch', 'dinner', 'daily_totals', 'meal_plan_analysis')
+
+
+def sse_event(event, data):
+    """One Server-Sent Events frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,145 @@
+import re
+import numpy as np
+from .menu_encoding import NUTRIENT_COLUMNS
+from .meal_planner import MEALS, TOTAL_FIELDS, plan_analysis, totals_from_sums
+from .nutrition import round_amount, to_number
+
+VALIDATION_MODES = ('correct', 'flag')
+
+# Reported values within max(ABS_TOLERANCE, REL_TOLERANCE * actual) of the recomputed value are accepted
+ABS_TOLERANCE = 1.0
+REL_TOLERANCE = 0.02
+
+# "3 servings x 70 cal", "1.5 x 3 oz", "2x", "1/2 serving"
+_PORTION_RE = re.compile(r"(\d+/\d+|\d*\.?\d+)\s*(?:x\b|×|servings?\b)", re.IGNORECASE)
+
+_TOTAL_KEYS = tuple(f"total_{field}" for field in TOTAL_FIELDS) + ('calorie_difference', 'protein_difference')
+
+# meal_plan_analysis fields that only restate the totals
+_ANALYSIS_KEYS = ('calorie_goal_status', 'protein_goal_status', 'target_achievement', 'nutrition_balance_check')
+
+
+def _number(text):
+    if "/" in text:
+        numerator, denominator = text.split("/")
+        return float(numerator) / float(denominator) if float(denominator) else None
+    return float(text)
+
+
+def parse_portion(item):
+    """Portion multiplier stated in portion_math or recommended_portion, or None"""
+    for field in ('portion_math', 'recommended_portion'):
+        text = item.get(field)
+        if isinstance(text, str):
+            match = _PORTION_RE.search(text)
+            if match:
+                portion = _number(match.group(1))
+                if portion:
+                    return portion
+    return None
+
+
+def match_item(snapshot, item):
+    """NameMatch for the menu record an output item refers to, or None"""
+    return snapshot.name_matcher.match(item.get('name'), item.get('station'))
+
+
+def _cell(value):
+    return None if np.isnan(value) else round_amount(float(value))
+
+
+def _mismatched(reported, actual):
+    """Element-wise: a reported value that is off by more than the tolerance, or not on the menu at all.
+
+    Values the model left out are not mismatches; correcting fills them in.
+    """
+    tolerance = np.maximum(ABS_TOLERANCE, REL_TOLERANCE * np.abs(np.nan_to_num(actual)))
+    diff = np.abs(np.nan_to_num(reported) - np.nan_to_num(actual))
+    return ~np.isnan(reported) & (np.isnan(actual) | (diff > tolerance))
+
+
+def validate_plan(plan, snapshot, user_preferences, mode='correct'):
+    """Recompute item nutrition and daily totals from the menu; fix ('correct') or only report ('flag').
+
+    Each item is matched back to its menu record (tolerating small changes to the name)
+    and its portion taken from the model's
+    own portion text (falling back to its calorie ratio), then all scaled nutrients are
+    recomputed in one matrix multiply. Unmatched items keep their reported values. The
+    report is stored under plan["validation"]. Returns the plan (modified in place).
+    """
+    entries = [(meal, item) for meal in MEALS for item in plan.get(meal) or [] if isinstance(item, dict)]
+    reported = np.array([[to_number(item.get(field)) for field in TOTAL_FIELDS] for _, item in entries],
+                        dtype=float).reshape(len(entries), len(TOTAL_FIELDS))
+
+    rows, indices, portions, unmatched, fuzzy = [], [], [], [], []
+    for row, (meal, item) in enumerate(entries):
+        match = match_item(snapshot, item)
+        if match is None:
+            unmatched.append({"meal": meal, "name": item.get('name')})
+            continue
+        index = match.index
+        if match.score < 1:
+            fuzzy.append({"meal": meal, "name": item.get('name'),
+                          "matched_name": snapshot.items[index].name, "confidence": match.score})
+        portion = parse_portion(item)
+        base_calories = snapshot.full_nutrient_matrix[index, 0]
+        if portion is None and reported[row, 0] > 0 and base_calories > 0:
+            portion = reported[row, 0] / base_calories
+        rows.append(row)
+        indices.append(index)
+        portions.append(portion or 1.0)
+
+    base = snapshot.full_nutrient_matrix[indices]
+    actual = base * np.asarray(portions, dtype=float)[:, None]
+    top = actual[:, :len(TOTAL_FIELDS)]  # NUTRIENT_COLUMNS starts with TOTAL_FIELDS
+    mismatched = _mismatched(reported[rows], top)
+
+    item_mismatches = []
+    for r, c in zip(*np.nonzero(mismatched)):
+        meal, item = entries[rows[r]]
+        item_mismatches.append({
+            "meal": meal, "name": item.get('name'), "field": TOTAL_FIELDS[c],
+            "reported": item.get(TOTAL_FIELDS[c]), "actual": _cell(top[r, c]),
+        })
+
+    values = reported.copy()
+    if mode == 'correct':
+        values[rows] = top
+        for r, row in enumerate(rows):
+            item = entries[row][1]
+            record = snapshot.items[indices[r]]
+            item['name'], item['station'] = record.name, record.station
+            scaled = {field: _cell(value) for field, value in zip(NUTRIENT_COLUMNS, actual[r])}
+            item.update((field, scaled[field]) for field in TOTAL_FIELDS)
+            item['full_nutrition'] = scaled
+            item['per_menu_serving_nutrition'] = dict(
+                item.get('per_menu_serving_nutrition') or {},
+                **{field: _cell(value) for field, value in zip(NUTRIENT_COLUMNS, base[r])},
+            )
+
+    totals = totals_from_sums(dict(zip(TOTAL_FIELDS, np.nansum(values, axis=0))), user_preferences)
+    reported_totals = plan.get('daily_totals') if isinstance(plan.get('daily_totals'), dict) else {}
+    total_mismatches = []
+    for key in _TOTAL_KEYS:
+        claimed, computed = to_number(reported_totals.get(key)), totals[key]
+        if computed is None:
+            continue
+        if claimed is None or abs(claimed - computed) > max(ABS_TOLERANCE, REL_TOLERANCE * abs(computed)):
+            total_mismatches.append({"field": key, "reported": reported_totals.get(key), "actual": computed})
+
+    if mode == 'correct':
+        plan['daily_totals'] = dict(reported_totals, **totals)
+        analysis = plan.get('meal_plan_analysis') if isinstance(plan.get('meal_plan_analysis'), dict) else {}
+        recomputed = plan_analysis(totals, analysis.get('suggestions') or [])
+        plan['meal_plan_analysis'] = dict(analysis, **{key: recomputed[key] for key in _ANALYSIS_KEYS})
+
+    plan['validation'] = {
+        "mode": mode,
+        "items_checked": len(rows),
+        "unmatched_items": unmatched,
+        "fuzzy_matches": fuzzy,
+        "item_mismatches": item_mismatches,
+        "total_mismatches": total_mismatches,
+        "corrected": mode == 'correct' and bool(item_mismatches or total_mismatches),
+    }
+    return plan
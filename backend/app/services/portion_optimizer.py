@@ -0,0 +1,160 @@
+from collections import namedtuple
+import numpy as np
+from .meal_planner import MEALS, TOTAL_FIELDS
+from .nutrition import to_number
+
+# Portion multipliers of the menu serving the optimizer may choose from
+PORTION_STEPS = np.arange(0.5, 3.01, 0.5)
+
+MIN_ITEMS = 3
+MAX_ITEMS = 5
+SHORTLIST_SIZE = 10
+
+# Protein may exceed the target by at most 20% (e.g. 150g -> 180g), as the prompt asks
+PROTEIN_OVERSHOOT_CAP = 1.2
+
+UNDER_TARGET_WEIGHT = 3.0  # falling short of a target is worse than going slightly over
+CAP_PENALTY = 10.0
+STATION_PENALTY = 0.05     # prefer variety across stations
+PORTION_PENALTY = 0.01     # among equal plans, prefer portions close to one serving
+
+_CALORIES = TOTAL_FIELDS.index('calories')
+_PROTEIN = TOTAL_FIELDS.index('protein_g')
+
+MealShortlist = namedtuple("MealShortlist", ["meal", "items", "suggested"])
+
+_portion_grids = {}
+
+
+def nutrient_matrix(items, fields=TOTAL_FIELDS):
+    """items x fields float matrix of per-serving nutrient values (NaN where unknown)"""
+    matrix = np.full((len(items), len(fields)), np.nan)
+    for i, item in enumerate(items):
+        for j, field in enumerate(fields):
+            value = to_number(item.nutrition.get(field))
+            if value is not None:
+                matrix[i, j] = value
+    return matrix
+
+
+def portion_grid(count):
+    """Every combination of PORTION_STEPS for `count` items, one row per combination"""
+    grid = _portion_grids.get(count)
+    if grid is None:
+        axes = np.meshgrid(*[PORTION_STEPS] * count, indexing='ij')
+        grid = np.stack([axis.ravel() for axis in axes], axis=1)
+        _portion_grids[count] = grid
+    return grid
+
+
+def plan_cost(calories, protein, budget):
+    """Distance of (arrays of) meal totals from the budget; lower is better"""
+    cost = np.zeros(np.broadcast(calories, protein).shape)
+    target_calories, target_protein = budget.get('calories'), budget.get('protein_g')
+    if target_calories:
+        cost += UNDER_TARGET_WEIGHT * np.maximum(target_calories - calories, 0) / target_calories
+        cost += np.maximum(calories - target_calories, 0) / target_calories
+    if target_protein:
+        cost += UNDER_TARGET_WEIGHT * np.maximum(target_protein - protein, 0) / target_protein
+        cost += 0.5 * np.maximum(protein - target_protein, 0) / target_protein
+        cost += np.where(protein > target_protein * PROTEIN_OVERSHOOT_CAP, CAP_PENALTY, 0)
+    return cost
+
+
+class PortionOptimizer:
+    """Chooses menu items and portion sizes that hit a meal's calorie and protein budget.
+
+    Works on the snapshot's nutrient matrix: candidate evaluation is one vectorized pass
+    over all candidates x portion steps, and the portions of a fixed selection (at most
+    MAX_ITEMS items) are solved exactly by enumerating the portion grid. Deterministic:
+    ties go to the lower menu index.
+    """
+
+    def __init__(self, matrix, stations=None):
+        self.calories = np.nan_to_num(matrix[:, _CALORIES])
+        self.protein = np.nan_to_num(matrix[:, _PROTEIN])
+        self.known = ~np.isnan(matrix[:, _CALORIES])
+        self.stations = list(stations) if stations is not None else [None] * len(matrix)
+
+    def solve_portions(self, indices, budget):
+        """Best portion for each of `indices` (exhaustive over the grid) and its cost"""
+        if not indices:
+            return np.empty(0), float('inf')
+        grid = portion_grid(len(indices))
+        calories = grid @ self.calories[indices]
+        protein = grid @ self.protein[indices]
+        cost = plan_cost(calories, protein, budget) + PORTION_PENALTY * np.abs(grid - 1).sum(axis=1)
+        best = int(np.argmin(cost))
+        return grid[best], float(cost[best])
+
+    def totals(self, indices, portions):
+        return float(portions @ self.calories[indices]), float(portions @ self.protein[indices])
+
+    def select(self, candidates, budget, exclude=()):
+        """Greedy selection of MIN_ITEMS..MAX_ITEMS items, re-solving portions after each pick"""
+        excluded = set(exclude)
+        remaining = [i for i in candidates if i not in excluded and self.known[i] and self.calories[i] > 0]
+        chosen, portions, current = [], np.empty(0), float('inf')
+
+        while remaining and len(chosen) < MAX_ITEMS:
+            cost = self._addition_costs(remaining, chosen, portions, budget)
+            row = int(np.unravel_index(np.argmin(cost), cost.shape)[0])
+            if len(chosen) >= MIN_ITEMS and cost.min() >= current:
+                break  # targets cannot get any closer
+            chosen.append(remaining.pop(row))
+            portions, current = self.solve_portions(chosen, budget)
+        return chosen, portions
+
+    def shortlist(self, meal, candidates, budget, exclude=(), size=SHORTLIST_SIZE):
+        """The suggested selection plus the next best alternatives, for the model to choose from"""
+        suggested, portions = self.select(candidates, budget, exclude)
+        excluded = set(exclude) | set(suggested)
+        others = [i for i in candidates if i not in excluded and self.known[i] and self.calories[i] > 0]
+        room = size - len(suggested)
+        if others and room > 0:
+            cost = self._addition_costs(others, suggested, portions, budget).min(axis=1)
+            others = [others[i] for i in np.argsort(cost, kind='stable')[:room]]
+        else:
+            others = []
+        return MealShortlist(meal, tuple(suggested) + tuple(others), tuple(suggested))
+
+    def _addition_costs(self, candidates, chosen, portions, budget):
+        """candidates x PORTION_STEPS cost of adding each candidate to the current selection"""
+        base_calories, base_protein = self.totals(chosen, portions) if chosen else (0.0, 0.0)
+        candidates = np.asarray(candidates)
+        calories = base_calories + np.outer(self.calories[candidates], PORTION_STEPS)
+        protein = base_protein + np.outer(self.protein[candidates], PORTION_STEPS)
+        cost = plan_cost(calories, protein, budget)
+
+        used_stations = {self.stations[i] for i in chosen}
+        repeated = np.array([self.stations[i] in used_stations for i in candidates], dtype=float)
+        return cost + STATION_PENALTY * repeated[:, None]
+
+
+def build_shortlists(optimizer, meal_candidates, budgets):
+    """meal -> MealShortlist; items suggested for an earlier meal are not suggested again"""
+    shortlists = {}
+    used = set()
+    for meal in MEALS:
+        if meal not in meal_candidates:
+            continue
+        shortlist = optimizer.shortlist(meal, meal_candidates[meal], budgets[meal], exclude=used)
+        if shortlist.items:
+            shortlists[meal] = shortlist
+            used.update(shortlist.suggested)
+    return shortlists
+
+
+def resolve_picks(shortlist, picked):
+    """Valid picks for a meal: shortlist members only, no repeats, topped up to MIN_ITEMS from the suggestion"""
+    allowed = set(shortlist.items)
+    picks = []
+    for index in picked:
+        if index in allowed and index not in picks:
+            picks.append(index)
+    for index in shortlist.suggested + shortlist.items:
+        if len(picks) >= MIN_ITEMS:
+            break
+        if index not in picks:
+            picks.append(index)
+    return picks[:MAX_ITEMS]
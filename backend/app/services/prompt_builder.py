@@ -0,0 +1,386 @@
+import json
+import threading
+from collections import namedtuple
+from functools import lru_cache
+from . import menu_encoding
+
+# Output format of one food item; shared by the full-day and the per-meal prompts
+ITEM_TEMPLATE = """    {
+      "name": "Exact menu item name",
+      "station": "Exact station name from menu",
+      "recommended_portion": "Clear portion description (e.g. '2 eggs', '1.5 cups')",
+      "serving_size": "Menu base vs recommended (e.g. 'Menu: 1 egg, Recommended: 2 eggs')",
+      "calories": calculated_total_calories,
+      "protein_g": calculated_total_protein,
+      "carbs_g": calculated_total_carbs,
+      "fat_g": calculated_total_fat,
+      "fiber_g": calculated_total_fiber,
+      "sodium_mg": calculated_total_sodium,
+      "allergens": ["list", "from", "menu"],
+      "ingredients": "cleaned ingredients without disclaimers",
+      "per_menu_serving_nutrition": {
+        "serving_size": "base serving from menu",
+        "calories": base_calories,
+        "protein_g": base_protein,
+        "carbs_g": base_carbs,
+        "fat_g": base_fat,
+        "fiber_g": base_fiber,
+        "sodium_mg": base_sodium,
+        "sugar_g": base_sugar_or_null,
+        "saturated_fat_g": base_sat_fat_or_null,
+        "trans_fat_g": base_trans_fat_or_null,
+        "cholesterol_mg": base_cholesterol_or_null,
+        "calcium_mg": base_calcium_or_null,
+        "iron_mg": base_iron_or_null,
+        "potassium_mg": base_potassium_or_null,
+        "vitamin_a_re": base_vit_a_or_null,
+        "vitamin_c_mg": base_vit_c_or_null,
+        "vitamin_d_iu": base_vit_d_or_null
+      },
+      "full_nutrition": {
+        "calories": scaled_calories,
+        "protein_g": scaled_protein,
+        "carbs_g": scaled_carbs,
+        "fat_g": scaled_fat,
+        "fiber_g": scaled_fiber,
+        "sodium_mg": scaled_sodium,
+        "sugar_g": scaled_sugar_or_null,
+        "saturated_fat_g": scaled_sat_fat_or_null,
+        "trans_fat_g": scaled_trans_fat_or_null,
+        "cholesterol_mg": scaled_cholesterol_or_null,
+        "calcium_mg": scaled_calcium_or_null,
+        "iron_mg": scaled_iron_or_null,
+        "potassium_mg": scaled_potassium_or_null,
+        "vitamin_a_re": scaled_vit_a_or_null,
+        "vitamin_c_mg": scaled_vit_c_or_null,
+        "vitamin_d_iu": scaled_vit_d_or_null
+      },
+      "portion_math": "Show calculation: 3 servings x 70 cal = 210 cal, 3 x 6g protein = 18g",
+      "reason_selected": "Explain: 1) Why chosen 2) How portion was calculated 3) How it helps meet targets"
+    }"""
+
+# --- Static instructions (identical for every request) ---
+# Kept first so that instructions + menu form a prefix that is byte-for-byte stable for a
+# given menu version; only the user section at the end changes between requests.
+_OBJECTIVES = """You are an expert nutritionist. Create a complete daily meal plan for a university student using the dining hall menu provided.
+
+## PRIMARY OBJECTIVES (IN ORDER OF PRIORITY):
+1. **Follow user comments/requests EXACTLY** - User-specified foods, portions, or goals override everything else
+2. **Meet calorie target** - Must reach or exceed user's calorie goal (never go under)
+3. **Meet protein target** - Must reach or exceed user's protein goal (never go under)
+4. **Honor dietary restrictions** - Strictly avoid all allergens and restrictions listed
+5. **Provide variety** - Select from different dining stations and food types
+
+## CRITICAL NUTRITION BALANCE RULE:
+**AVOID EXCESSIVE PROTEIN OVERSHOOT** - While meeting protein targets is important, do NOT dramatically exceed protein goals when it's unnecessary. If user needs 150g protein, aim for 150-180g, NOT 250g+. Balance protein sources with appropriate carbs and fats for optimal nutrition ratios.
+
+"""
+
+_PORTION_RULES = """## PORTION CALCULATION RULES:
+- Base nutrition values are per menu serving size
+- Scale ALL nutrients proportionally to your recommended portion
+- Example: Menu shows "1 egg = 70 cal, 6g protein" → You recommend "3 eggs" → Calculate as "210 cal, 18g protein"
+- Scale these fields: calories, protein_g, carbs_g, fat_g, fiber_g, sodium_mg, sugar_g, saturated_fat_g, trans_fat_g, cholesterol_mg, calcium_mg, iron_mg, potassium_mg, vitamin_a_re, vitamin_c_mg, vitamin_d_iu
+- If a nutrient is missing from menu data, use null (don't invent values)
+
+"""
+
+_PLANNING_RULES = """## INSUFFICIENT FOOD HANDLING:
+If the available menu items cannot meet the user's calorie/protein targets even with maximum reasonable portions:
+1. **Increase serving sizes** of existing recommended items proportionally
+2. **Add more food items** from available menu options
+3. **Prioritize calorie-dense and protein-rich foods** to efficiently meet targets
+4. **Example**: If you're 500 calories short, increase portions of rice, pasta, or protein items rather than giving up
+
+## WEEKEND SPECIAL RULE:
+If it's Saturday or Sunday, dining halls serve brunch instead of separate breakfast/lunch. Plan accordingly with larger portions to meet daily targets.
+
+"""
+
+_FULL_OUTPUT = """## DATA CLEANING:
+- Remove any "Disclaimer:" text from ingredients
+- Clean up extra whitespace and line breaks
+
+## CRITICAL: JSON STRUCTURE ORDER
+The JSON response MUST maintain this exact order of fields for every food item:
+1. name, 2. station, 3. recommended_portion, 4. serving_size, 5. calories, 6. protein_g, 7. carbs_g, 8. fat_g, 9. fiber_g, 10. sodium_mg, 11. allergens, 12. ingredients, 13. per_menu_serving_nutrition, 14. full_nutrition, 15. portion_math, 16. reason_selected
+
+And this exact meal order: breakfast, lunch, dinner, daily_totals, meal_plan_analysis
+
+## REQUIRED JSON OUTPUT FORMAT:
+
+{
+  "breakfast": [
+""" + ITEM_TEMPLATE + """
+  ],
+  "lunch": [
+    // Same structure as breakfast items
+  ],
+  "dinner": [
+    // Same structure as breakfast items
+  ],
+  "daily_totals": {
+    "total_calories": sum_all_meal_calories,
+    "total_protein_g": sum_all_meal_protein,
+    "total_carbs_g": sum_all_meal_carbs,
+    "total_fat_g": sum_all_meal_fat,
+    "total_fiber_g": sum_all_meal_fiber,
+    "total_sodium_mg": sum_all_meal_sodium,
+    "calorie_target": user_target_calories,
+    "protein_target": user_target_protein,
+    "calorie_difference": actual_minus_target,
+    "protein_difference": actual_minus_target
+  },
+  "meal_plan_analysis": {
+    "calorie_goal_status": "Met: [actual] vs target [target] (+/- difference)",
+    "protein_goal_status": "Met: [actual]g vs target [target]g (+/- difference)",
+    "target_achievement": "SUCCESS - All targets met" or "FAILED - Missing: [what was missed]",
+    "dietary_compliance": "All restrictions followed" or "Issues: [specific issues]",
+    "user_comment_compliance": "Followed: [list user requests]" or "No specific requests",
+    "nutrition_balance_check": "Balanced nutrition ratios achieved" or "Warning: Excessive protein overshoot",
+    "suggestions": ["tip 1", "tip 2", "tip 3"]
+  }
+}
+
+"""
+
+_TIPS = """## TOP 3 ACTIONABLE RECOMMENDATIONS:
+In meal_plan_analysis.suggestions, provide exactly 3 specific, actionable tips (max 15 words each):
+- Focus on nutrition optimization, meal timing, or food combinations
+- Make them specific to this user's goals and selected foods
+- Examples: "Add Greek yogurt for extra protein", "Drink water 30min before meals", "Have largest meal post-workout"
+
+"""
+
+_CRITERIA = """## CRITICAL SUCCESS CRITERIA:
+✓ Total daily calories ≥ user's calorie target (increase portions if needed)
+✓ Total daily protein ≥ user's protein target (but avoid 50%+ overshoot)
+✓ All allergens and dietary restrictions avoided
+✓ User's specific comments/requests followed exactly
+✓ 3-5 food items per meal for balanced nutrition
+✓ All nutrition calculations based on recommended portions (not menu base)
+✓ Portion math clearly shown
+✓ Balanced macronutrient ratios maintained
+"""
+
+INSTRUCTIONS = _OBJECTIVES + _PORTION_RULES + _PLANNING_RULES + _FULL_OUTPUT + _TIPS + _CRITERIA
+
+OUTPUT_FORMATS = ('full', 'compact')
+
+# --- Compact output: items by id + portion, everything else is filled in from the menu ---
+COMPACT_ITEM_TEMPLATE = (
+    '    {"id": "menu item id", "portion": servings_of_the_menu_serving_size, '
+    '"reason": "why chosen and how it helps meet targets (max 25 words)"}'
+)
+
+_COMPACT_OUTPUT = """## OUTPUT RULES:
+- Refer to menu items ONLY by their id from the menu; never invent ids
+- "portion" is a multiplier of the menu serving size (e.g. 1, 1.5, 2); increase it to reach the targets
+- Do NOT write any nutrition values, totals or calculations: they are computed from the menu data for you
+
+## REQUIRED JSON OUTPUT FORMAT:
+
+{
+  "breakfast": [
+""" + COMPACT_ITEM_TEMPLATE + """
+  ],
+  "lunch": [
+    // Same structure as breakfast items
+  ],
+  "dinner": [
+    // Same structure as breakfast items
+  ],
+  "user_comment_compliance": "Followed: [list user requests]" or "No specific requests",
+  "suggestions": ["tip 1", "tip 2", "tip 3"]
+}
+
+"""
+
+_COMPACT_CRITERIA = """## CRITICAL SUCCESS CRITERIA:
+✓ Total daily calories ≥ user's calorie target (increase portions if needed)
+✓ Total daily protein ≥ user's protein target (but avoid 50%+ overshoot)
+✓ All allergens and dietary restrictions avoided
+✓ User's specific comments/requests followed exactly
+✓ 3-5 food items per meal for balanced nutrition
+"""
+
+COMPACT_INSTRUCTIONS = (
+    _OBJECTIVES + _PLANNING_RULES + _COMPACT_OUTPUT + _TIPS.replace("In meal_plan_analysis.suggestions", "In suggestions")
+    + _COMPACT_CRITERIA
+)
+
+MENU_HEADER = "## INPUT DATA:\n\nCOMPLETE DINING HALL MENU (ALL AVAILABLE OPTIONS):\n"
+
+CLOSING = "Respond with ONLY the JSON - no additional text or explanations outside the JSON structure.\n"
+
+
+@lru_cache(maxsize=None)
+def meal_instructions(meal, output_format='full'):
+    """Static instructions for planning a single meal (per-meal generation mode)"""
+    if output_format == 'compact':
+        scale_rule = "6. **Choose portions** as multipliers of the menu serving; do NOT write any nutrition values\n\n"
+        item_template = COMPACT_ITEM_TEMPLATE
+    else:
+        scale_rule = ("6. **Scale ALL nutrients** to the recommended portion (menu values are per menu serving); "
+                      "use null for missing nutrients, don't invent values\n\n")
+        item_template = ITEM_TEMPLATE
+    return "".join([
+        f"You are an expert nutritionist. Plan the {meal.upper()} of a university student's day using the "
+        "dining hall menu provided. The other meals of the day are planned separately.\n\n",
+        "## RULES (IN ORDER OF PRIORITY):\n",
+        "1. **Follow user comments/requests EXACTLY** where they concern this meal\n",
+        "2. **Meet this meal's calorie and protein targets** - reach or slightly exceed them, never go far under\n",
+        "3. **AVOID EXCESSIVE PROTEIN OVERSHOOT** - stay within about 20% above the meal's protein target\n",
+        "4. **Honor dietary restrictions** - strictly avoid all allergens and restrictions listed\n",
+        "5. **Use 3-5 food items** from different stations, ONLY from the menu below\n",
+        scale_rule,
+        "## REQUIRED JSON OUTPUT FORMAT:\n\n",
+        "{\n",
+        f'  "{meal}": [\n',
+        item_template,
+        "\n  ],\n",
+        '  "tip": "One specific, actionable tip for this meal (max 15 words)"\n',
+        "}\n",
+    ])
+
+
+def meal_segment(user_preferences, budget):
+    """Per-request tail of a per-meal prompt: this meal's targets, then the user section"""
+    targets = ["\nTARGETS FOR THIS MEAL (the daily goals below are split across breakfast, lunch and dinner):\n"]
+    if budget.get('calories') is not None:
+        targets.append(f"- calories: about {budget['calories']}\n")
+    if budget.get('protein_g') is not None:
+        targets.append(f"- protein: about {budget['protein_g']}g\n")
+    if len(targets) == 1:
+        targets.append("- no numeric targets set: plan a balanced, filling meal\n")
+    return "".join(targets) + user_segment(user_preferences)
+
+
+# Optimized mode: portions and totals are computed locally, the model only chooses and explains
+SHORTLIST_INSTRUCTIONS = """You are an expert nutritionist helping a university student choose dining hall food.
+
+For each meal below you get a SHORTLIST of menu items that fit the student's allergens, diet and calorie/protein budget. Items marked "*" are a suggested combination that already meets the targets; portions are calculated for you afterwards, so do not do any nutrition math.
+
+## RULES:
+1. Choose 3-5 items per meal, ONLY by id from that meal's shortlist
+2. Keep the suggested (*) items unless the user's comments, goal or variety give a clear reason to swap
+3. Write one short reason_selected per chosen item (max 25 words): why it fits this user
+4. Give exactly 3 specific, actionable suggestions for the day (max 15 words each)
+
+## REQUIRED JSON OUTPUT FORMAT:
+
+{
+  "breakfast": [{"id": "item id", "reason": "why this item"}],
+  "lunch": [{"id": "item id", "reason": "why this item"}],
+  "dinner": [{"id": "item id", "reason": "why this item"}],
+  "suggestions": ["tip 1", "tip 2", "tip 3"]
+}
+"""
+
+
+def shortlist_segment(snapshot, shortlists):
+    """One compact block per meal: id|name|station|serving|calories|protein_g|allergens, suggested items starred"""
+    parts = []
+    for meal, shortlist in shortlists.items():
+        suggested = set(shortlist.suggested)
+        parts.append(f"\n{meal.upper()} SHORTLIST (id|name|station|serving|calories|protein_g|allergens):\n")
+        for i in shortlist.items:
+            item = snapshot.items[i]
+            nutrition = item.nutrition
+            cells = [
+                ("*" if i in suggested else "") + menu_encoding.item_code(item.id),
+                item.name,
+                item.station,
+                nutrition.get('serving_size'),
+                nutrition.get('calories'),
+                nutrition.get('protein_g'),
+                nutrition.get('allergens'),
+            ]
+            parts.append(menu_encoding.TABLE_DELIMITER.join(menu_encoding.format_cell(cell) for cell in cells) + "\n")
+    return "".join(parts)
+
+
+class Prompt(namedtuple("Prompt", ["prefix", "suffix"])):
+    """A prompt split into a cacheable prefix and the per-request suffix"""
+
+    @property
+    def text(self):
+        return self.prefix + self.suffix
+
+
+def user_segment(user_preferences, excluded_items=()):
+    """Per-request tail of the prompt: user preferences (and, optionally, items to skip)"""
+    parts = ["\nUSER PREFERENCES AND GOALS:\n", json.dumps(user_preferences, indent=2), "\n"]
+    if excluded_items:
+        parts.append("\nDO NOT USE THESE MENU ITEMS (they conflict with this user's allergens, dislikes or diet):\n")
+        parts.append("\n".join(f"- {item.name} ({item.station})" for item in excluded_items))
+        parts.append("\n")
+    parts.append("\n")
+    parts.append(CLOSING)
+    return "".join(parts)
+
+
+class PromptBuilder:
+    """Assembles the meal plan prompt from prebuilt segments.
+
+    Layout: static instructions -> menu block -> user preferences. The first two are
+    built once per (menu version, menu format) and reused as the same string object.
+    With output_format='compact' the model answers with item ids and portions only and
+    the menu block carries the ids it needs.
+    """
+
+    def __init__(self, menu_format='json', output_format='full'):
+        self.menu_format = menu_format
+        self.output_format = output_format
+        self._with_ids = output_format == 'compact'
+        self._prefixes = {}  # (menu version, format) -> instructions + full menu
+        self._lock = threading.Lock()
+
+    def stable_prefix(self, snapshot):
+        """Instructions + full menu for this menu version (suitable for provider-side context caching)"""
+        key = (snapshot.version, self.menu_format)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            with self._lock:
+                prefix = self._prefixes.get(key)
+                if prefix is None:
+                    prefix = self._menu_prefix(self._menu_block(snapshot, range(len(snapshot.items))))
+                    # Only the current menu version is worth keeping
+                    self._prefixes = {key: prefix}
+        return prefix
+
+    def build(self, snapshot, allowed_items, user_preferences, use_stable_prefix=False):
+        """Build the prompt for one request.
+
+        By default only `allowed_items` are embedded (smallest prompt). With
+        `use_stable_prefix` the full menu prefix is reused and the filtered-out items
+        are listed in the user section instead, so the prefix can be served from a cache.
+        """
+        allowed_items = list(allowed_items)
+        if len(allowed_items) == len(snapshot.items):
+            return Prompt(self.stable_prefix(snapshot), user_segment(user_preferences))
+
+        if use_stable_prefix:
+            allowed = set(allowed_items)
+            excluded = [item for i, item in enumerate(snapshot.items) if i not in allowed]
+            return Prompt(self.stable_prefix(snapshot), user_segment(user_preferences, excluded))
+
+        menu_block = self._menu_block(snapshot, allowed_items)
+        return Prompt(self._menu_prefix(menu_block), user_segment(user_preferences))
+
+    def build_meal(self, snapshot, meal_items, meal, budget, user_preferences):
+        """Prompt for one meal: its instructions, only the items served at that meal, its targets"""
+        menu_block = self._menu_block(snapshot, meal_items)
+        prefix = "".join([meal_instructions(meal, self.output_format), "\n", f"## INPUT DATA:\n\n{meal.upper()} MENU:\n", menu_block, "\n"])
+        return Prompt(prefix, meal_segment(user_preferences, budget))
+
+    def build_shortlist(self, snapshot, shortlists, user_preferences):
+        """Prompt for the optimized mode: per-meal shortlists in, item choices and reasons out"""
+        return Prompt(SHORTLIST_INSTRUCTIONS, shortlist_segment(snapshot, shortlists) + user_segment(user_preferences))
+
+    def _menu_block(self, snapshot, indices):
+        return snapshot.menu_block_for(indices, self.menu_format, with_ids=self._with_ids)
+
+    def _menu_prefix(self, menu_block):
+        instructions = COMPACT_INSTRUCTIONS if self.output_format == 'compact' else INSTRUCTIONS
+        return "".join([instructions, "\n", MENU_HEADER, menu_block, "\n"])
@@ -0,0 +1,202 @@
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def _normalize(value):
+    """Canonical form of a preference value: trimmed lowercase text, sorted de-duplicated lists"""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, (list, tuple, set)):
+        # Keyed on the JSON form so lists of dicts / lists (unhashable) are handled too
+        items = {}
+        for v in value:
+            v = _normalize(v)
+            if v != "":
+                items.setdefault(json.dumps(v, sort_keys=True, default=str), v)
+        return [items[k] for k in sorted(items)]
+    if isinstance(value, dict):
+        return {str(k).lower(): _normalize(v) for k, v in value.items()}
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def preference_key(user_preferences, menu_version):
+    """Hash of the normalized preferences together with the menu version"""
+    payload = json.dumps(
+        {"menu": menu_version, "preferences": _normalize(user_preferences)},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecommendationCache:
+    """Size-bounded LRU cache of generated meal plans with a TTL.
+
+    Entries remember the menu version they were generated for, so invalidate_menu()
+    can drop everything produced for an old menu as soon as a new one is loaded.
+    """
+
+    def __init__(self, max_entries=1024, ttl=1800):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (menu_version, expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key):
+        """Cached plan for key (a private copy), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[2]
+        return copy.deepcopy(value)
+
+    def put(self, key, value, menu_version=None):
+        if not self.enabled:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (menu_version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_menu(self, current_version=None):
+        """Drop every entry not generated for current_version (all entries if None)"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if current_version is None or entry[0] != current_version]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is in
+    flight wait and receive (a copy of) the same result, or the same exception. The
+    entry is removed as soon as the call finishes, so later calls run again (by then
+    the result cache normally answers them).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        if call.waiters:
+            print(f"Shared one meal plan generation with {call.waiters} identical requests")
+        return call.result
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for the async recommendation path.
+
+    If the leading request is cancelled (client went away), one of the waiters takes
+    over instead of failing every waiting request.
+    """
+
+    def __init__(self):
+        self._calls = {}  # (event loop id, key) -> Future
+
+    def in_flight(self):
+        return len(self._calls)
+
+    async def do(self, key, coro_fn):
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+
+        while True:
+            future = self._calls.get(flight_key)
+            if future is None:
+                break
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    continue  # the leader was cancelled: retry (possibly as the new leader)
+                raise
+            return copy.deepcopy(result)
+
+        future = loop.create_future()
+        # Waiters may all be gone; make sure an unobserved exception is not reported
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[flight_key] = future
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(flight_key, None)
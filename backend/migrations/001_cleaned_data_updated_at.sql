@@ -0,0 +1,21 @@
+-- Change tracking for the menu delta sync (MenuSync in backend/app/services/menu_repository.py).
+-- Every insert gets updated_at = now(); the trigger bumps it on every update, so delta
+-- syncs (updated_at >= high-water mark) see changed rows, not only new ones.
+
+alter table cleaned_data
+    add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists cleaned_data_updated_at_idx on cleaned_data (updated_at);
+
+create or replace function set_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at = clock_timestamp();
+    return new;
+end;
+$$;
+
+drop trigger if exists cleaned_data_set_updated_at on cleaned_data;
+create trigger cleaned_data_set_updated_at
+    before update on cleaned_data
+    for each row execute function set_updated_at();
@@ -0,0 +1,13 @@
+-- Keys for content-hash delta uploads (SupabaseUploader.upload_json_file in backend/app/database.py).
+-- item_key identifies a menu item (name, station, meal type, date) and is the upsert
+-- conflict target; content_hash changes whenever anything served from the item changes.
+-- Run 001_cleaned_data_updated_at.sql first: its trigger bumps updated_at on every
+-- upsert that changes a row, which is how the backend's menu delta sync sees updates.
+
+alter table cleaned_data
+    add column if not exists item_key text,
+    add column if not exists content_hash text;
+
+-- Rows loaded before this migration keep item_key = null (nulls never conflict); run the
+-- uploader with --prune once to replace them with keyed rows.
+create unique index if not exists cleaned_data_item_key_idx on cleaned_data (item_key);
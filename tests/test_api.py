@@ -1,7 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
-from backend.app.api import app
+from unittest.mock import AsyncMock, Mock, patch
+from backend.app.api import app, recommender
+from backend.app.services.llm_limiter import LLMOverloadedError
 
 
 @pytest.fixture
@@ -99,14 +100,14 @@ class TestRecommendationsEndpoint:
 
     def test_recommendations_success(self, client, valid_user_data, mock_meal_schedule):
         """Test successful request with valid data returns 200"""
-        with patch("backend.app.api.recommender.get_daily_meal_schedule") as mock_schedule:
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
             mock_schedule.return_value = mock_meal_schedule
             response = client.post("/recommendations", json=valid_user_data)
             assert response.status_code == 200
 
     def test_recommendations_response_structure(self, client, valid_user_data, mock_meal_schedule):
         """Test that response contains expected fields"""
-        with patch("backend.app.api.recommender.get_daily_meal_schedule") as mock_schedule:
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
             mock_schedule.return_value = mock_meal_schedule
             response = client.post("/recommendations", json=valid_user_data)
             data = response.json()
@@ -185,7 +186,7 @@ class TestRecommendationsEndpoint:
 
     def test_recommendations_empty_allergens(self, client, valid_user_data, mock_meal_schedule):
         """Test that empty allergens list is accepted"""
-        with patch("backend.app.api.recommender.get_daily_meal_schedule") as mock_schedule:
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
             mock_schedule.return_value = mock_meal_schedule
             test_data = valid_user_data.copy()
             test_data["allergens"] = []
@@ -194,7 +195,7 @@ class TestRecommendationsEndpoint:
 
     def test_recommendations_empty_dislikes(self, client, valid_user_data, mock_meal_schedule):
         """Test that empty dislikes list is accepted"""
-        with patch("backend.app.api.recommender.get_daily_meal_schedule") as mock_schedule:
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
             mock_schedule.return_value = mock_meal_schedule
             test_data = valid_user_data.copy()
             test_data["dislikes"] = []
@@ -203,7 +204,7 @@ class TestRecommendationsEndpoint:
 
     def test_recommendations_empty_comments(self, client, valid_user_data, mock_meal_schedule):
         """Test that empty comments string is accepted"""
-        with patch("backend.app.api.recommender.get_daily_meal_schedule") as mock_schedule:
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
             mock_schedule.return_value = mock_meal_schedule
             test_data = valid_user_data.copy()
             test_data["comments"] = ""
@@ -212,7 +213,7 @@ class TestRecommendationsEndpoint:
 
     def test_recommendations_edge_case_high_calories(self, client, valid_user_data, mock_meal_schedule):
         """Test that high calorie values are accepted"""
-        with patch("backend.app.api.recommender.get_daily_meal_schedule") as mock_schedule:
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
             mock_schedule.return_value = mock_meal_schedule
             test_data = valid_user_data.copy()
             test_data["calories"] = 5000
@@ -221,7 +222,7 @@ class TestRecommendationsEndpoint:
 
     def test_recommendations_edge_case_high_protein(self, client, valid_user_data, mock_meal_schedule):
         """Test that high protein values are accepted"""
-        with patch("backend.app.api.recommender.get_daily_meal_schedule") as mock_schedule:
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
             mock_schedule.return_value = mock_meal_schedule
             test_data = valid_user_data.copy()
             test_data["protein"] = 300
@@ -229,8 +230,8 @@ class TestRecommendationsEndpoint:
             assert response.status_code == 200
 
     def test_recommendations_calls_recommender(self, client, valid_user_data, mock_meal_schedule):
-        """Test that endpoint calls FoodRecommender.get_daily_meal_schedule"""
-        with patch("backend.app.api.recommender.get_daily_meal_schedule") as mock_schedule:
+        """Test that endpoint calls FoodRecommender.get_daily_meal_schedule_async"""
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
             mock_schedule.return_value = mock_meal_schedule
             client.post("/recommendations", json=valid_user_data)
             assert mock_schedule.called
@@ -238,13 +239,65 @@ class TestRecommendationsEndpoint:
             assert call_args["age"] == 25
             assert call_args["calories"] == 2500
 
+    def test_recommendations_overloaded_returns_503(self, client, valid_user_data):
+        """Test that load shedding returns 503 with a Retry-After header"""
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
+            mock_schedule.side_effect = LLMOverloadedError("LLM wait queue is full", retry_after=7)
+            response = client.post("/recommendations", json=valid_user_data)
+
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "7"
+            assert "error" in response.json()
+
+
+class TestRecommendationsStreamEndpoint:
+    """Test suite for /recommendations/stream endpoint"""
+
+    def test_stream_returns_sse_events(self, client, valid_user_data, mock_meal_schedule):
+        """Test that sections are sent as text/event-stream frames"""
+        async def events():
+            for name, value in mock_meal_schedule.items():
+                yield "section", {"name": name, "data": value}
+            yield "done", {}
+
+        with patch("backend.app.api.recommender.stream_daily_meal_schedule", new_callable=AsyncMock) as mock_stream:
+            mock_stream.return_value = events()
+            response = client.post("/recommendations/stream", json=valid_user_data)
+
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            assert response.text.count("event: section") == len(mock_meal_schedule)
+            assert response.text.rstrip().splitlines()[-2] == "event: done"
+
+    def test_stream_overloaded_returns_503(self, client, valid_user_data):
+        """Test that admission failures happen before streaming starts"""
+        with patch("backend.app.api.recommender.stream_daily_meal_schedule", new_callable=AsyncMock) as mock_stream:
+            mock_stream.side_effect = LLMOverloadedError("LLM wait queue is full", retry_after=3)
+            response = client.post("/recommendations/stream", json=valid_user_data)
+
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "3"
+
+
+class TestMetricsEndpoint:
+    """Test suite for /metrics endpoint"""
+
+    def test_metrics_reports_llm_queue(self, client):
+        """Test that limiter queue depth and wait times are exposed"""
+        response = client.get("/metrics")
+        data = response.json()
+
+        assert response.status_code == 200
+        assert {"in_flight", "queue_depth", "shed", "avg_wait_seconds"} <= set(data["llm"])
+        assert "hits" in data["recommendation_cache"]
+
 
 class TestMenuEndpoint:
     """Test suite for /menu endpoint"""
 
     def test_menu_endpoint_success(self, client):
         """Test that menu endpoint returns 200"""
-        with patch("backend.app.api.recommender.get_all_menu_data") as mock_menu:
+        with patch("backend.app.api.recommender.get_full_menu_data") as mock_menu:
             mock_menu.return_value = [
                 {
                     "id": 1,
@@ -262,9 +315,18 @@ class TestMenuEndpoint:
             response = client.get("/menu")
             assert response.status_code == 200
 
+    def test_menu_endpoint_returns_full_rows(self, client):
+        """Test that menu endpoint returns every column and data field, not the prompt projection"""
+        row = {"id": 1, "created_at": "2025-09-09T08:00:00+00:00",
+               "data": {"food_name": "Scrambled Eggs", "date": "2025-09-09", "raw_html": "<div></div>"}}
+        with patch("backend.app.api.recommender.get_full_menu_data") as mock_menu:
+            mock_menu.return_value = [row]
+            response = client.get("/menu")
+            assert response.json() == [row]
+
     def test_menu_endpoint_returns_list(self, client):
         """Test that menu endpoint returns a list"""
-        with patch("backend.app.api.recommender.get_all_menu_data") as mock_menu:
+        with patch("backend.app.api.recommender.get_full_menu_data") as mock_menu:
             mock_menu.return_value = [{"id": 1}, {"id": 2}]
             response = client.get("/menu")
             data = response.json()
@@ -272,15 +334,15 @@ class TestMenuEndpoint:
 
     def test_menu_endpoint_empty_list(self, client):
         """Test that menu endpoint handles empty menu data"""
-        with patch("backend.app.api.recommender.get_all_menu_data") as mock_menu:
+        with patch("backend.app.api.recommender.get_full_menu_data") as mock_menu:
             mock_menu.return_value = []
             response = client.get("/menu")
             assert response.status_code == 200
             assert response.json() == []
 
     def test_menu_endpoint_calls_recommender(self, client):
-        """Test that endpoint calls FoodRecommender.get_all_menu_data"""
-        with patch("backend.app.api.recommender.get_all_menu_data") as mock_menu:
+        """Test that endpoint calls FoodRecommender.get_full_menu_data"""
+        with patch("backend.app.api.recommender.get_full_menu_data") as mock_menu:
             mock_menu.return_value = []
             client.get("/menu")
             assert mock_menu.called
@@ -298,7 +360,7 @@ class TestErrorHandling:
 
     def test_recommendations_with_extra_fields(self, client, valid_user_data, mock_meal_schedule):
         """Test that extra fields are ignored"""
-        with patch("backend.app.api.recommender.get_daily_meal_schedule") as mock_schedule:
+        with patch("backend.app.api.recommender.get_daily_meal_schedule_async", new_callable=AsyncMock) as mock_schedule:
             mock_schedule.return_value = mock_meal_schedule
             test_data = valid_user_data.copy()
             test_data["extra_field"] = "should be ignored"
@@ -319,3 +381,14 @@ class TestErrorHandling:
         """Test that POST on /menu returns 405"""
         response = client.post("/menu")
         assert response.status_code == 405
+
+
+class TestLifespan:
+    """Test suite for application startup / shutdown"""
+
+    def test_shutdown_closes_plan_history(self):
+        """Test that stopping the app flushes and closes the plan history writer"""
+        with patch.object(recommender.plan_history, "close") as mock_close:
+            with TestClient(app):
+                assert not mock_close.called
+            mock_close.assert_called_once()
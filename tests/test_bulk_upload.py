@@ -0,0 +1,103 @@
+import threading
+import time
+import pytest
+from backend.app.services.bulk_upload import BulkUploader, chunked, format_report
+
+
+class RecordingSender:
+    """Fake batch endpoint: records batches, can fail a batch a given number of times"""
+
+    def __init__(self, failures=None, delay=0.0):
+        self.batches = []
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, rows):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            first = rows[0]
+            with self.lock:
+                if self.failures.get(first, 0) > 0:
+                    self.failures[first] -= 1
+                    raise RuntimeError("503 Service Unavailable")
+                self.batches.append(list(rows))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class TestChunked:
+    """Test suite for batching rows"""
+
+    def test_chunked(self):
+        """Test that rows are split into full batches plus a remainder"""
+        assert list(chunked(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+        assert list(chunked([], 3)) == []
+
+
+class TestBulkUploader:
+    """Test suite for batched, parallel uploads with retries"""
+
+    def test_uploads_every_row_once_in_batches(self):
+        """Test that all rows arrive exactly once, batch_size at a time"""
+        sender = RecordingSender()
+        report = BulkUploader(sender, batch_size=10, workers=3).upload(range(95))
+
+        assert sorted(row for batch in sender.batches for row in batch) == list(range(95))
+        assert max(len(batch) for batch in sender.batches) == 10
+        assert report.items == report.uploaded == 95
+        assert report.batches == 10
+        assert report.failed_batches == [] and report.retries == 0
+
+    def test_batches_run_in_parallel(self):
+        """Test that up to `workers` batches are sent at the same time"""
+        sender = RecordingSender(delay=0.05)
+        start = time.monotonic()
+        BulkUploader(sender, batch_size=1, workers=4).upload(range(8))
+        assert sender.max_in_flight == 4
+        assert time.monotonic() - start < 0.3  # about two rounds, not eight
+
+    def test_failed_batch_is_retried(self):
+        """Test that a transient failure is retried with backoff and then succeeds"""
+        sleeps = []
+        sender = RecordingSender(failures={10: 2})
+        report = BulkUploader(sender, batch_size=10, workers=2, backoff=0.1, sleep=sleeps.append).upload(range(30))
+
+        assert report.uploaded == 30 and report.retries == 2
+        assert len(sleeps) == 2 and sleeps[1] > sleeps[0] / 2
+        assert all(0.05 <= s <= 0.2 for s in sleeps)
+
+    def test_batch_failing_every_retry_is_reported(self):
+        """Test that a batch that keeps failing is reported instead of aborting the upload"""
+        sender = RecordingSender(failures={20: 10})
+        report = BulkUploader(sender, batch_size=10, max_retries=2, sleep=lambda s: None).upload(range(35))
+
+        assert report.uploaded == 25
+        assert report.failed_items == 10
+        assert report.failed_batches == [2]
+        assert "failed: [2]" in format_report(report)
+
+    def test_generator_input_is_consumed_lazily(self):
+        """Test that only a bounded number of batches is read ahead of the uploads"""
+        read = []
+
+        def rows():
+            for i in range(1000):
+                read.append(i)
+                yield i
+
+        seen_ahead = []
+        sender = RecordingSender()
+
+        def slow_sender(batch):
+            seen_ahead.append(len(read) - batch[0])
+            sender(batch)
+
+        BulkUploader(slow_sender, batch_size=10, workers=2).upload(rows())
+        assert max(seen_ahead) <= 10 * (2 * 2 + 1)
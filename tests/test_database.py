@@ -0,0 +1,250 @@
+import json
+import threading
+import pytest
+from unittest.mock import patch
+from postgrest import ReturnMethod
+from backend.app.database import SupabaseUploader
+from backend.app.services.menu_delta import content_hash, item_key
+
+
+class FakeMenuTable:
+    """In-memory cleaned_data table supporting the calls the uploader makes"""
+
+    def __init__(self):
+        self.rows = {}
+        self.next_id = 1
+        self.requests = []
+        self.fail = 0
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        assert name == "cleaned_data"
+        return FakeRequest(self)
+
+    def upsert(self, rows, on_conflict, returning):
+        with self.lock:
+            self.requests.append(("upsert", len(rows), returning))
+            if self.fail:
+                self.fail -= 1
+                raise Exception("timeout")
+            by_key = {row["item_key"]: row_id for row_id, row in self.rows.items() if row.get("item_key")}
+            for row in rows:
+                row_id = by_key.get(row[on_conflict])
+                if row_id is None:
+                    row_id, self.next_id = self.next_id, self.next_id + 1
+                self.rows[row_id] = dict(row, id=row_id)
+
+
+class FakeRequest:
+    def __init__(self, db):
+        self.db = db
+        self.action = None
+        self.last_id = None
+        self.page_size = None
+
+    def select(self, columns):
+        self.action = ("select", columns)
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, n):
+        self.page_size = n
+        return self
+
+    def gt(self, column, value):
+        self.last_id = value
+        return self
+
+    def upsert(self, rows, on_conflict="", returning=None):
+        self.action = ("upsert", rows, on_conflict, returning)
+        return self
+
+    def delete(self, returning=None):
+        self.action = ("delete", returning)
+        return self
+
+    def in_(self, column, values):
+        self.ids = list(values)
+        return self
+
+    def execute(self):
+        db = self.db
+        if self.action[0] == "upsert":
+            db.upsert(*self.action[1:])
+            return type("Response", (), {"data": []})
+        if self.action[0] == "delete":
+            with db.lock:
+                db.requests.append(("delete", len(self.ids), self.action[1]))
+                for row_id in self.ids:
+                    db.rows.pop(row_id, None)
+            return type("Response", (), {"data": []})
+        ids = sorted(i for i in db.rows if self.last_id is None or i > self.last_id)[:self.page_size]
+        data = [{"id": i, "item_key": db.rows[i].get("item_key"), "content_hash": db.rows[i].get("content_hash")}
+                for i in ids]
+        return type("Response", (), {"data": data})
+
+
+@pytest.fixture
+def db():
+    return FakeMenuTable()
+
+
+@pytest.fixture
+def uploader(monkeypatch, db):
+    """SupabaseUploader backed by the in-memory table"""
+    monkeypatch.setenv("SUPABASE_URL", "https://test.supabase.co")
+    monkeypatch.setenv("SUPABASE_ANON_KEY", "test_key")
+    monkeypatch.setenv("UPLOAD_BATCH_SIZE", "2")
+    monkeypatch.setenv("UPLOAD_WORKERS", "2")
+    with patch('backend.app.database.create_client', return_value=db):
+        yield SupabaseUploader()
+
+
+@pytest.fixture
+def items():
+    return [
+        {"food_name": f"Item {i}", "station_name": "Grill", "meal_type": "Lunch", "date": "2025-09-01",
+         "nutrition": {"calories": 100 + i}}
+        for i in range(5)
+    ]
+
+
+def write_json(tmp_path, data, name="items.json"):
+    path = tmp_path / name
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def upserts(db):
+    return [request for request in db.requests if request[0] == "upsert"]
+
+
+class TestUploadJsonFile:
+    """Test suite for batched menu uploads"""
+
+    def test_settings_from_env(self, uploader):
+        """Test that batch size and workers are read from the environment"""
+        assert uploader.batch_size == 2
+        assert uploader.workers == 2
+        assert uploader.max_retries == 3
+
+    def test_list_uploaded_in_batches(self, uploader, db, items, tmp_path):
+        """Test that a list of items is upserted in a few batched requests"""
+        report = uploader.upload_json_file(write_json(tmp_path, items))
+
+        assert [request[1] for request in upserts(db)] == [2, 2, 1]
+        assert all(request[2] == ReturnMethod.minimal for request in upserts(db))
+        stored = sorted(db.rows.values(), key=lambda row: row["data"]["food_name"])
+        assert [row["data"]["nutrition"] for row in stored] == [item["nutrition"] for item in items]
+        assert stored[0]["item_key"] == item_key(items[0])
+        assert stored[0]["content_hash"] == content_hash(stored[0]["data"])
+        assert report.new == 5 and report.upload.uploaded == 5 and report.upload.batches == 3
+
+    def test_single_object_uploaded_as_one_row(self, uploader, db, items, tmp_path):
+        """Test that a file holding one object becomes one row"""
+        report = uploader.upload_json_file(write_json(tmp_path, items[0]))
+        assert [row["data"]["food_name"] for row in db.rows.values()] == ["Item 0"]
+        assert report.upload.uploaded == 1
+
+    def test_json_lines_file_streamed(self, uploader, db, items, tmp_path):
+        """Test that a JSON Lines dump is uploaded the same way as an array"""
+        path = tmp_path / "items.jsonl"
+        path.write_text("\n".join(json.dumps(item) for item in items))
+        report = uploader.upload_json_file(str(path))
+        assert len(db.rows) == 5 and report.upload.uploaded == 5
+
+    @patch('backend.app.services.bulk_upload.time.sleep')
+    def test_failed_batch_reported(self, mock_sleep, uploader, db, items, tmp_path):
+        """Test that a batch the database keeps rejecting is reported, the rest still uploaded"""
+        db.fail = 4
+        report = uploader.upload_json_file(write_json(tmp_path, items[:4]), workers=1)
+
+        assert report.upload.uploaded == 2
+        assert report.upload.failed_batches == [0]
+        assert mock_sleep.call_count == 3
+
+
+class TestNormalization:
+    """Test suite for ingest-time nutrition normalization"""
+
+    def test_normalized_nutrition_stored_next_to_raw(self, uploader, db, items, tmp_path):
+        """Test that parsed numeric values are stored alongside the untouched raw nutrition"""
+        items[0]["nutrition"] = {"serving_size": "1/2 cup", "calories": "210 kcal", "sodium_mg": "0.4 g"}
+        uploader.upload_json_file(write_json(tmp_path, items[:1]))
+
+        data = next(iter(db.rows.values()))["data"]
+        assert data["nutrition"] == items[0]["nutrition"]
+        assert data["nutrition_normalized"] == {"calories": 210, "sodium_mg": 400,
+                                                "serving_quantity": 0.5, "serving_unit": "cup"}
+
+    def test_rows_without_normalized_values_backfilled(self, uploader, db, items, tmp_path):
+        """Test that rows written before normalization are upserted once, then left alone"""
+        uploader.upload_json_file(write_json(tmp_path, items))
+        for row in db.rows.values():
+            row["data"].pop("nutrition_normalized")
+            row["content_hash"] = content_hash(row["data"])
+
+        report = uploader.upload_json_file(write_json(tmp_path, items))
+        assert report.changed == 5 and len(db.rows) == 5
+        assert all("nutrition_normalized" in row["data"] for row in db.rows.values())
+        assert uploader.upload_json_file(write_json(tmp_path, items)).unchanged == 5
+
+
+class TestDeltaUpload:
+    """Test suite for content-hash delta uploads"""
+
+    def test_rerun_sends_nothing(self, uploader, db, items, tmp_path):
+        """Test that uploading the same file twice writes no rows the second time"""
+        path = write_json(tmp_path, items)
+        uploader.upload_json_file(path)
+        db.requests.clear()
+
+        report = uploader.upload_json_file(path)
+        assert upserts(db) == []
+        assert len(db.rows) == 5
+        assert (report.new, report.changed, report.unchanged) == (0, 0, 5)
+
+    def test_changed_item_updated_in_place(self, uploader, db, items, tmp_path):
+        """Test that an item with new nutrition replaces its row instead of adding one"""
+        uploader.upload_json_file(write_json(tmp_path, items))
+        ids = {row["data"]["food_name"]: row_id for row_id, row in db.rows.items()}
+        db.requests.clear()
+
+        items[1] = dict(items[1], nutrition={"calories": 999})
+        items.append(dict(items[0], date="2025-09-02"))
+        report = uploader.upload_json_file(write_json(tmp_path, items))
+
+        assert [request[1] for request in upserts(db)] == [2]
+        assert db.rows[ids["Item 1"]]["data"]["nutrition"] == {"calories": 999}
+        assert len(db.rows) == 6
+        assert (report.new, report.changed, report.unchanged) == (1, 1, 4)
+
+    def test_duplicates_in_input_skipped(self, uploader, db, items, tmp_path):
+        """Test that repeats of an item in the same file are written once"""
+        report = uploader.upload_json_file(write_json(tmp_path, items + items[:2]))
+        assert len(db.rows) == 5
+        assert report.duplicates == 2
+
+    def test_prune_deletes_missing_and_unkeyed_rows(self, uploader, db, items, tmp_path):
+        """Test that prune removes items gone from the file and legacy rows without a key"""
+        uploader.upload_json_file(write_json(tmp_path, items))
+        db.rows[100] = {"id": 100, "data": items[0]}  # inserted before item keys existed
+
+        report = uploader.upload_json_file(write_json(tmp_path, items[:3]), prune=True)
+        assert sorted(row["data"]["food_name"] for row in db.rows.values()) == ["Item 0", "Item 1", "Item 2"]
+        assert report.deleted == 3
+        assert all(request[2] == ReturnMethod.minimal for request in db.requests if request[0] == "delete")
+
+    def test_no_prune_by_default_or_after_failures(self, uploader, db, items, tmp_path):
+        """Test that nothing is deleted without prune, or when some batch failed"""
+        uploader.upload_json_file(write_json(tmp_path, items))
+        uploader.upload_json_file(write_json(tmp_path, items[:1]))
+        assert len(db.rows) == 5
+
+        db.fail = 10
+        items[0] = dict(items[0], nutrition={})
+        with patch('backend.app.services.bulk_upload.time.sleep'):
+            report = uploader.upload_json_file(write_json(tmp_path, items[:1]), prune=True)
+        assert report.deleted == 0 and len(db.rows) == 5
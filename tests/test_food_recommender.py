@@ -1,13 +1,49 @@
 import pytest
+import asyncio
+import copy
+import gc
 import json
-from unittest.mock import Mock, patch, MagicMock, mock_open
+import os
+import threading
+import time
+from unittest.mock import AsyncMock, Mock, patch, MagicMock, mock_open
 from pathlib import Path
 from backend.app.ai_food_recommendation import FoodRecommender
+from backend.app.services.llm_limiter import LLMOverloadedError
+from backend.app.services.plan_history import read_history
+
+
+def mock_menu_table(supabase_instance, menu_rows):
+    """Wire a mocked Supabase client so the paginated cleaned_data query returns menu_rows"""
+    query = MagicMock()
+    query.order.return_value = query
+    query.limit.return_value = query
+    query.gt.return_value = query
+    query.gte.return_value = query
+    # The fetch layer projects `data` fields into top-level columns
+    query.execute.return_value = MagicMock(data=[{"id": row["id"], **row["data"]} for row in menu_rows])
+    supabase_instance.table.return_value.select.return_value = query
+    return query
+
+
+class StreamedResponse:
+    """Async-iterable stand-in for a streamed Gemini response"""
+
+    def __init__(self, text, chunk_size=40):
+        self.chunks = [MagicMock(text=text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
 
 
 @pytest.fixture
-def mock_env_variables(monkeypatch):
+def mock_env_variables(monkeypatch, tmp_path):
     """Mock environment variables"""
+    monkeypatch.setenv("PLAN_HISTORY_DIR", str(tmp_path / "plan_history"))
     monkeypatch.setenv("GEMINI_API_KEY", "test_gemini_key_12345")
     monkeypatch.setenv("SUPABASE_URL", "https://test.supabase.co")
     monkeypatch.setenv("SUPABASE_ANON_KEY", "test_supabase_key_12345")
@@ -148,6 +184,16 @@ class TestFoodRecommenderInitialization:
         with pytest.raises(ValueError, match="Missing Supabase credentials"):
             FoodRecommender()
 
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_initialization_invalid_menu_format(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, monkeypatch):
+        """Test that an unknown MENU_PROMPT_FORMAT raises ValueError"""
+        monkeypatch.setenv("MENU_PROMPT_FORMAT", "xml")
+
+        with pytest.raises(ValueError, match="Invalid MENU_PROMPT_FORMAT"):
+            FoodRecommender()
+
 
 class TestGetAllMenuData:
     """Test suite for get_all_menu_data method"""
@@ -158,9 +204,7 @@ class TestGetAllMenuData:
     def test_get_menu_data_success(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data):
         """Test successful menu data retrieval"""
         mock_supabase_instance = MagicMock()
-        mock_result = MagicMock()
-        mock_result.data = mock_menu_data
-        mock_supabase_instance.table.return_value.select.return_value.execute.return_value = mock_result
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
         mock_supabase.return_value = mock_supabase_instance
 
         recommender = FoodRecommender()
@@ -175,9 +219,7 @@ class TestGetAllMenuData:
     def test_get_menu_data_empty(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables):
         """Test menu data retrieval when database is empty"""
         mock_supabase_instance = MagicMock()
-        mock_result = MagicMock()
-        mock_result.data = []
-        mock_supabase_instance.table.return_value.select.return_value.execute.return_value = mock_result
+        mock_menu_table(mock_supabase_instance, [])
         mock_supabase.return_value = mock_supabase_instance
 
         recommender = FoodRecommender()
@@ -191,7 +233,8 @@ class TestGetAllMenuData:
     def test_get_menu_data_error_handling(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables):
         """Test error handling when database query fails"""
         mock_supabase_instance = MagicMock()
-        mock_supabase_instance.table.return_value.select.return_value.execute.side_effect = Exception("Database error")
+        query = mock_menu_table(mock_supabase_instance, [])
+        query.execute.side_effect = Exception("Database error")
         mock_supabase.return_value = mock_supabase_instance
 
         recommender = FoodRecommender()
@@ -202,25 +245,61 @@ class TestGetAllMenuData:
     @patch("backend.app.ai_food_recommendation.create_client")
     @patch("backend.app.ai_food_recommendation.genai.configure")
     @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
-    @patch("backend.app.ai_food_recommendation.time.time")
-    def test_get_menu_data_caching(self, mock_time, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data):
+    def test_get_menu_data_caching(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data):
         """Test that menu data is cached correctly"""
-        mock_time.side_effect = [100, 100]
         mock_supabase_instance = MagicMock()
-        mock_result = MagicMock()
-        mock_result.data = mock_menu_data
-        mock_supabase_instance.table.return_value.select.return_value.execute.return_value = mock_result
+        query = mock_menu_table(mock_supabase_instance, mock_menu_data)
         mock_supabase.return_value = mock_supabase_instance
 
         recommender = FoodRecommender()
-        recommender._cache_duration = 3600
-        recommender._menu_cache = None
-        recommender._cache_timestamp = 0
-
         first_call = recommender.get_all_menu_data()
+        second_call = recommender.get_all_menu_data()
 
-        assert recommender._menu_cache is not None
+        assert recommender.menu_cache.data is not None
         assert len(first_call) == 2
+        assert second_call is first_call
+        assert query.execute.call_count == 1
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_get_menu_data_falls_back_to_last_snapshot(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data):
+        """Test that a failed refresh keeps serving the last good snapshot"""
+        mock_supabase_instance = MagicMock()
+        query = mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        recommender = FoodRecommender()
+        recommender.get_all_menu_data()
+
+        query.execute.side_effect = Exception("Database error")
+        menu_data = recommender.menu_cache.refresh()
+
+        assert len(menu_data) == 2
+        assert [row["data"] for row in recommender.get_all_menu_data()] == [row["data"] for row in mock_menu_data]
+
+
+class TestGetFullMenuData:
+    """Test suite for get_full_menu_data method (backs /menu)"""
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_full_rows_are_not_projected(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data):
+        """Test that /menu rows keep every column and data field"""
+        mock_supabase_instance = MagicMock()
+        query = mock_menu_table(mock_supabase_instance, mock_menu_data)
+        rows = [dict(row, created_at="2025-09-09T08:00:00+00:00") for row in mock_menu_data]
+        query.execute.return_value = MagicMock(data=rows)
+        mock_supabase.return_value = mock_supabase_instance
+
+        recommender = FoodRecommender()
+        menu_data = recommender.get_full_menu_data()
+
+        assert menu_data == rows
+        mock_supabase_instance.table.return_value.select.assert_called_with("*")
+        assert recommender.full_menu_cache.data is menu_data
+        assert recommender.menu_cache.data is None
 
 
 class TestFormatMenuData:
@@ -254,6 +333,17 @@ class TestFormatMenuData:
         assert "Disclaimer:" not in ingredients
         assert "Chicken breast, olive oil, seasonings." in ingredients
 
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_format_menu_data_does_not_mutate_input(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data):
+        """Test that formatting leaves the (cached) input rows untouched"""
+        original = copy.deepcopy(mock_menu_data)
+        recommender = FoodRecommender()
+        recommender.format_menu_data(mock_menu_data)
+
+        assert mock_menu_data == original
+
     @patch("backend.app.ai_food_recommendation.create_client")
     @patch("backend.app.ai_food_recommendation.genai.configure")
     @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
@@ -273,9 +363,7 @@ class TestGetDailyMealSchedule:
     def test_meal_schedule_no_menu_data(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, user_preferences):
         """Test that error is returned when no menu data is available"""
         mock_supabase_instance = MagicMock()
-        mock_result = MagicMock()
-        mock_result.data = []
-        mock_supabase_instance.table.return_value.select.return_value.execute.return_value = mock_result
+        mock_menu_table(mock_supabase_instance, [])
         mock_supabase.return_value = mock_supabase_instance
 
         recommender = FoodRecommender()
@@ -290,9 +378,7 @@ class TestGetDailyMealSchedule:
     def test_meal_schedule_success(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
         """Test successful meal schedule generation"""
         mock_supabase_instance = MagicMock()
-        mock_result = MagicMock()
-        mock_result.data = mock_menu_data
-        mock_supabase_instance.table.return_value.select.return_value.execute.return_value = mock_result
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
         mock_supabase.return_value = mock_supabase_instance
 
         mock_model_instance = MagicMock()
@@ -316,9 +402,7 @@ class TestGetDailyMealSchedule:
     def test_meal_schedule_json_parse_error(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences):
         """Test handling of invalid JSON response from AI"""
         mock_supabase_instance = MagicMock()
-        mock_result = MagicMock()
-        mock_result.data = mock_menu_data
-        mock_supabase_instance.table.return_value.select.return_value.execute.return_value = mock_result
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
         mock_supabase.return_value = mock_supabase_instance
 
         mock_model_instance = MagicMock()
@@ -339,9 +423,7 @@ class TestGetDailyMealSchedule:
     def test_meal_schedule_ai_exception(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences):
         """Test handling of AI service exception"""
         mock_supabase_instance = MagicMock()
-        mock_result = MagicMock()
-        mock_result.data = mock_menu_data
-        mock_supabase_instance.table.return_value.select.return_value.execute.return_value = mock_result
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
         mock_supabase.return_value = mock_supabase_instance
 
         mock_model_instance = MagicMock()
@@ -360,9 +442,7 @@ class TestGetDailyMealSchedule:
     def test_meal_schedule_with_json_markdown(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
         """Test handling of JSON response wrapped in markdown code blocks"""
         mock_supabase_instance = MagicMock()
-        mock_result = MagicMock()
-        mock_result.data = mock_menu_data
-        mock_supabase_instance.table.return_value.select.return_value.execute.return_value = mock_result
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
         mock_supabase.return_value = mock_supabase_instance
 
         mock_model_instance = MagicMock()
@@ -380,40 +460,794 @@ class TestGetDailyMealSchedule:
         assert "error" not in result
 
 
-class TestSaveResponseToFile:
-    """Test suite for save_response_to_file method"""
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_meal_schedule_truncated_output_keeps_partial_plan(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that a truncated response reports where parsing failed and the sections it completed"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        text = json.dumps(mock_ai_response)
+        truncated = text[:text.index('"daily_totals"') + 30]
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.return_value = MagicMock(text=truncated)
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        result = recommender.get_daily_meal_schedule(user_preferences)
+
+        assert result["error"] == "Failed to parse AI response as JSON"
+        assert result["error_position"]["char"] == len(truncated)
+        assert set(result["partial_plan"]) == {"breakfast", "lunch", "dinner"}
+        assert len(recommender.result_cache) == 0
 
     @patch("backend.app.ai_food_recommendation.create_client")
     @patch("backend.app.ai_food_recommendation.genai.configure")
     @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
-    def test_save_response_creates_directory(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_ai_response, user_preferences):
-        """Test that save_response_to_file creates directory"""
-        with patch("backend.app.ai_food_recommendation.os.makedirs") as mock_makedirs:
-            with patch("builtins.open", mock_open()):
+    def test_meal_schedule_prefilters_allergens(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that items conflicting with the user's allergens never reach the prompt"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.return_value = MagicMock(text=json.dumps(mock_ai_response))
+        mock_model_class.return_value = mock_model_instance
+
+        with patch("builtins.open", mock_open()):
+            with patch("backend.app.ai_food_recommendation.os.makedirs"):
                 recommender = FoodRecommender()
-                recommender.save_response_to_file(mock_ai_response, user_preferences)
-                mock_makedirs.assert_called_once_with('backend/app/data/ai_response', exist_ok=True)
+                recommender.get_daily_meal_schedule(dict(user_preferences, allergens=["Eggs"]))
+
+        prompt = mock_model_instance.generate_content.call_args[0][0]
+        assert "Scrambled Eggs" not in prompt
+        assert "Grilled Chicken" in prompt
 
     @patch("backend.app.ai_food_recommendation.create_client")
     @patch("backend.app.ai_food_recommendation.genai.configure")
     @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
-    def test_save_response_writes_file(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_ai_response, user_preferences):
-        """Test that save_response_to_file writes to correct file"""
-        mock_file = mock_open()
-        with patch("backend.app.ai_food_recommendation.os.makedirs"):
-            with patch("builtins.open", mock_file):
+    def test_meal_schedule_everything_filtered(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences):
+        """Test that an error is returned when no item fits the preferences"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        recommender = FoodRecommender()
+        result = recommender.get_daily_meal_schedule(dict(user_preferences, dislikes=["eggs", "chicken"]))
+
+        assert result["error"] == "No menu items match your dietary preferences"
+        assert not recommender.model.generate_content.called
+
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_meal_schedule_uses_context_cache(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response, monkeypatch):
+        """Test that with GEMINI_CONTEXT_CACHE the prefix is cached once and only the suffix is sent"""
+        monkeypatch.setenv("GEMINI_CONTEXT_CACHE", "1")
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        cached_model = MagicMock()
+        cached_model.generate_content.return_value = MagicMock(text=json.dumps(mock_ai_response))
+        mock_model_class.from_cached_content.return_value = cached_model
+
+        with patch("backend.app.ai_food_recommendation.genai.caching.CachedContent.create") as mock_create:
+            with patch("builtins.open", mock_open()):
+                with patch("backend.app.ai_food_recommendation.os.makedirs"):
+                    recommender = FoodRecommender()
+                    recommender.get_daily_meal_schedule(user_preferences)
+                    result = recommender.get_daily_meal_schedule(user_preferences)
+
+        assert "breakfast" in result
+        assert mock_create.call_count == 1
+        sent = cached_model.generate_content.call_args[0][0]
+        assert sent.startswith("\nUSER PREFERENCES AND GOALS")
+        assert "Scrambled Eggs" not in sent
+
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_context_cache_created_once_under_concurrency(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables):
+        """Test that concurrent requests on a new prefix share one provider cache"""
+        recommender = FoodRecommender()
+
+        def slow_create(**kwargs):
+            time.sleep(0.05)
+            return MagicMock()
+
+        with patch("backend.app.ai_food_recommendation.genai.caching.CachedContent.create", side_effect=slow_create) as mock_create:
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(recommender._cached_model("menu prefix")))
+                       for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        assert mock_create.call_count == 1
+        assert len(results) == 8 and len({id(model) for model in results}) == 1
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_short_context_cache_ttl_renews_before_expiry(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, monkeypatch):
+        """Test that a TTL under a minute is renewed before the provider expires it"""
+        monkeypatch.setenv("GEMINI_CONTEXT_CACHE_TTL", "30")
+        recommender = FoodRecommender()
+
+        with patch("backend.app.ai_food_recommendation.genai.caching.CachedContent.create"):
+            before = time.monotonic()
+            recommender._cached_model("menu prefix")
+
+        (_, renew_at), = recommender._cached_models.values()
+        assert renew_at - before <= 30
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_meal_schedule_served_from_result_cache(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that an equivalent repeat request does not call Gemini again"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.return_value = MagicMock(text=json.dumps(mock_ai_response))
+        mock_model_class.return_value = mock_model_instance
+
+        with patch("builtins.open", mock_open()):
+            with patch("backend.app.ai_food_recommendation.os.makedirs"):
                 recommender = FoodRecommender()
-                recommender.save_response_to_file(mock_ai_response, user_preferences)
+                first = recommender.get_daily_meal_schedule(user_preferences)
+                second = recommender.get_daily_meal_schedule(dict(user_preferences, diet="KETO "))
+
+        assert second == first
+        assert mock_model_instance.generate_content.call_count == 1
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_meal_schedule_errors_are_not_cached(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences):
+        """Test that failed generations are retried on the next request"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.return_value = MagicMock(text="Invalid JSON response")
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.get_daily_meal_schedule(user_preferences)
+        recommender.get_daily_meal_schedule(user_preferences)
+
+        assert mock_model_instance.generate_content.call_count == 2
+
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_meal_schedule_concurrent_requests_share_one_call(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that concurrent identical requests trigger a single Gemini call"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        def slow_generate(prompt):
+            time.sleep(0.1)
+            return MagicMock(text=json.dumps(mock_ai_response))
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.side_effect = slow_generate
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        recommender.get_all_menu_data()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(recommender.get_daily_meal_schedule(user_preferences)))
+                   for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert mock_model_instance.generate_content.call_count == 1
+        assert len(results) == 6
+        assert all("breakfast" in r for r in results)
+
+
+class TestPlanValidation:
+    """Test suite for server-side recomputation of model-written nutrition"""
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_initialization_invalid_validation_mode(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, monkeypatch):
+        """Test that an unknown validation mode fails fast"""
+        monkeypatch.setenv("PLAN_VALIDATION", "ignore")
+        with pytest.raises(ValueError, match="PLAN_VALIDATION"):
+            FoodRecommender()
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_plan_totals_are_recomputed(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that wrong model totals are corrected before the plan is returned and cached"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.return_value = MagicMock(text=json.dumps(mock_ai_response))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        result = recommender.get_daily_meal_schedule(user_preferences)
+
+        assert result["daily_totals"]["total_calories"] == 210
+        assert result["breakfast"][0]["sodium_mg"] == 180
+        assert result["validation"]["corrected"] is True
+        assert recommender.get_daily_meal_schedule(user_preferences) == result
+        assert mock_model_instance.generate_content.call_count == 1
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_flag_mode_keeps_model_numbers(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response, monkeypatch):
+        """Test that PLAN_VALIDATION=flag only reports mismatches"""
+        monkeypatch.setenv("PLAN_VALIDATION", "flag")
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.return_value = MagicMock(text=json.dumps(mock_ai_response))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        result = recommender.get_daily_meal_schedule(user_preferences)
+
+        assert result["daily_totals"]["total_calories"] == 2500
+        assert result["validation"]["total_mismatches"][0] == {"field": "total_calories", "reported": 2500, "actual": 210}
+
+
+class TestGetDailyMealScheduleAsync:
+    """Test suite for the async get_daily_meal_schedule_async path"""
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_async_meal_schedule_success(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that the async path uses generate_content_async"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(return_value=MagicMock(text=json.dumps(mock_ai_response)))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        result = await recommender.get_daily_meal_schedule_async(user_preferences)
+
+        assert "breakfast" in result
+        assert mock_model_instance.generate_content_async.await_count == 1
+        assert not mock_model_instance.generate_content.called
+        assert recommender.record_plan.called
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_async_meal_schedule_ai_exception(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences):
+        """Test that AI errors are reported the same way as on the sync path"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(side_effect=Exception("AI API Error"))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        result = await recommender.get_daily_meal_schedule_async(user_preferences)
+
+        assert "AI service error" in result["error"]
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_async_concurrent_requests_share_one_call(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that identical concurrent async requests are coalesced"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
 
-                calls = [call for call in mock_file.call_args_list if len(call[0]) > 0]
-                target_call = [call for call in calls if 'daily_meal_schedule.json' in str(call)]
-                assert len(target_call) > 0
+        async def slow_generate(prompt, **kwargs):
+            await asyncio.sleep(0.05)
+            return MagicMock(text=json.dumps(mock_ai_response))
 
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(side_effect=slow_generate)
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        results = await asyncio.gather(*[recommender.get_daily_meal_schedule_async(user_preferences) for _ in range(10)])
+
+        assert mock_model_instance.generate_content_async.await_count == 1
+        assert all("breakfast" in r for r in results)
+
+    @pytest.mark.asyncio
     @patch("backend.app.ai_food_recommendation.create_client")
     @patch("backend.app.ai_food_recommendation.genai.configure")
     @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
-    def test_save_response_error_handling(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_ai_response, user_preferences):
-        """Test error handling in save_response_to_file"""
-        with patch("backend.app.ai_food_recommendation.os.makedirs", side_effect=Exception("Write error")):
+    async def test_async_overload_is_raised_not_reported(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences):
+        """Test that load shedding surfaces as LLMOverloadedError instead of an error dict"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+        mock_model_instance = MagicMock()
+        mock_model_class.return_value = mock_model_instance
+
+        with patch.dict(os.environ, {"LLM_MAX_CONCURRENCY": "1", "LLM_MAX_QUEUE": "0"}):
             recommender = FoodRecommender()
-            recommender.save_response_to_file(mock_ai_response, user_preferences)
+        await recommender.llm_limiter.acquire_async()  # every slot busy
+
+        with pytest.raises(LLMOverloadedError):
+            await recommender.get_daily_meal_schedule_async(user_preferences)
+        assert not mock_model_instance.generate_content_async.called
+        assert len(recommender.result_cache) == 0
+
+
+class TestStreamDailyMealSchedule:
+    """Test suite for the streamed (SSE) generation path"""
+
+    async def collect(self, recommender, user_preferences):
+        events = await recommender.stream_daily_meal_schedule(user_preferences)
+        return [event async for event in events]
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_stream_emits_sections_then_done(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that each section is streamed once, followed by done, and the plan is cached"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(return_value=StreamedResponse(json.dumps(mock_ai_response)))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        events = await self.collect(recommender, user_preferences)
+
+        sections = [data["name"] for event, data in events if event == "section"]
+        assert sections[:5] == [name for name in mock_ai_response]
+        # The model's totals are wrong, so the recomputed ones are sent again before done
+        assert sections[5:] == ["daily_totals", "meal_plan_analysis"]
+        assert events[-2][0] == "validation" and events[-2][1]["corrected"] is True
+        items = [(data["section"], data["index"]) for event, data in events if event == "item"]
+        assert items[0] == ("breakfast", 0)
+        assert len(items) == sum(len(mock_ai_response[meal]) for meal in ("breakfast", "lunch", "dinner"))
+        assert events[-1] == ("done", {})
+        assert mock_model_instance.generate_content_async.call_args.kwargs["stream"] is True
+        assert recommender.llm_limiter.metrics()["in_flight"] == 0
+        assert recommender.record_plan.called
+
+        # A repeat request replays the cached plan without calling Gemini again
+        replay = await self.collect(recommender, user_preferences)
+        assert [data["name"] for event, data in replay if event == "section"] == sections[:5]
+        assert replay[-2][0] == "validation"
+        assert mock_model_instance.generate_content_async.await_count == 1
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_stream_invalid_output_ends_with_error(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences):
+        """Test that unparseable output produces an error event and is not cached"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(return_value=StreamedResponse("no json here"))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        events = await self.collect(recommender, user_preferences)
+
+        assert events[-1][0] == "error"
+        assert len(recommender.result_cache) == 0
+        assert recommender.llm_limiter.metrics()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_stream_closed_early_releases_slot(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that a client disconnect mid-stream frees the LLM slot"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(return_value=StreamedResponse(json.dumps(mock_ai_response)))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        events = await recommender.stream_daily_meal_schedule(user_preferences)
+        assert recommender.llm_limiter.metrics()["in_flight"] == 1
+        await events.__anext__()
+        await events.aclose()
+
+        assert recommender.llm_limiter.metrics()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_stream_never_iterated_releases_slot(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response):
+        """Test that a stream dropped before its body starts frees the slot without calling Gemini"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(return_value=StreamedResponse(json.dumps(mock_ai_response)))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        events = await recommender.stream_daily_meal_schedule(user_preferences)
+        assert recommender.llm_limiter.metrics()["in_flight"] == 1
+        await events.aclose()
+        assert recommender.llm_limiter.metrics()["in_flight"] == 0
+
+        # Never closed either: the event loop finalizes the generator once it is garbage collected
+        events = await recommender.stream_daily_meal_schedule(user_preferences)
+        del events
+        gc.collect()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert recommender.llm_limiter.metrics()["in_flight"] == 0
+        assert not mock_model_instance.generate_content_async.called
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_stream_cancelled_during_call_releases_slot(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences):
+        """Test that cancelling the request while Gemini is awaited frees the slot"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        started = asyncio.Event()
+
+        async def hang(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(60)
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = hang
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        task = asyncio.ensure_future(self.collect(recommender, user_preferences))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert recommender.llm_limiter.metrics()["in_flight"] == 0
+
+
+def per_meal_response(prompt, **kwargs):
+    """Fake Gemini output for a per-meal prompt: one item for the meal named in the prompt"""
+    text = prompt if isinstance(prompt, str) else str(prompt)
+    meal = next(m for m in ("breakfast", "lunch", "dinner") if f'"{m}": [' in text)
+    item = {"name": f"{meal} item", "calories": 600, "protein_g": 40}
+    return MagicMock(text=json.dumps({meal: [item], "tip": f"{meal} tip"}))
+
+
+class TestPerMealGeneration:
+    """Test suite for MEAL_GENERATION_MODE=per_meal"""
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_initialization_invalid_generation_mode(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, monkeypatch):
+        """Test that an unknown generation mode fails fast"""
+        monkeypatch.setenv("MEAL_GENERATION_MODE", "weekly")
+        with pytest.raises(ValueError, match="MEAL_GENERATION_MODE"):
+            FoodRecommender()
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_per_meal_calls_run_in_parallel(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, monkeypatch):
+        """Test that each meal gets its own prompt, calls overlap and totals are recomputed"""
+        monkeypatch.setenv("MEAL_GENERATION_MODE", "per_meal")
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data + [
+            {"id": 3, "data": {"food_name": "Baked Salmon", "station_name": "Grill", "meal_type": "Dinner",
+                               "nutrition": {"calories": 200, "protein_g": 25}}},
+        ])
+        mock_supabase.return_value = mock_supabase_instance
+
+        def slow_response(prompt, **kwargs):
+            time.sleep(0.2)
+            return per_meal_response(prompt)
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.side_effect = slow_response
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        start = time.monotonic()
+        result = recommender.get_daily_meal_schedule(user_preferences)
+        elapsed = time.monotonic() - start
+
+        assert mock_model_instance.generate_content.call_count == 3
+        assert elapsed < 0.5  # about one call, not three
+        prompts = {call.args[0] for call in mock_model_instance.generate_content.call_args_list}
+        breakfast_prompt = next(p for p in prompts if '"breakfast": [' in p)
+        assert "Scrambled Eggs" in breakfast_prompt and "Baked Salmon" not in breakfast_prompt
+        assert [item["name"] for item in result["dinner"]] == ["dinner item"]
+        assert result["daily_totals"]["total_calories"] == 1800
+        assert result["daily_totals"]["calorie_difference"] == -700
+        assert result["meal_plan_analysis"]["suggestions"] == ["breakfast tip", "lunch tip", "dinner tip"]
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_per_meal_async_skips_empty_meals(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, monkeypatch):
+        """Test that meals without menu items are skipped and their budget redistributed"""
+        monkeypatch.setenv("MEAL_GENERATION_MODE", "per_meal")
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)  # breakfast and lunch items only
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(side_effect=per_meal_response)
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        result = await recommender.get_daily_meal_schedule_async(user_preferences)
+
+        assert mock_model_instance.generate_content_async.await_count == 2
+        assert result["dinner"] == []
+        lunch_prompt = next(call.args[0] for call in mock_model_instance.generate_content_async.call_args_list
+                            if '"lunch": [' in call.args[0])
+        assert "about 1458" in lunch_prompt  # lunch share of 2500 kcal once dinner is dropped
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_per_meal_error_is_reported_and_not_cached(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, monkeypatch):
+        """Test that one failed meal fails the plan"""
+        monkeypatch.setenv("MEAL_GENERATION_MODE", "per_meal")
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        def flaky(prompt, **kwargs):
+            if '"lunch": [' in prompt:
+                raise Exception("quota")
+            return per_meal_response(prompt)
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.side_effect = flaky
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        result = recommender.get_daily_meal_schedule(user_preferences)
+
+        assert "AI service error" in result["error"]
+        assert result["meal"] == "lunch"
+        assert len(recommender.result_cache) == 0
+
+
+def optimized_response(prompt, **kwargs):
+    """Fake Gemini output for a shortlist prompt: picks the starred items, with a reason each"""
+    text = prompt if isinstance(prompt, str) else str(prompt)
+    choices, meal = {}, None
+    for line in text.splitlines():
+        if " SHORTLIST (" in line:
+            meal = line.split()[0].lower()
+            choices[meal] = []
+        elif meal and line.startswith("*"):
+            choices[meal].append({"id": line.split("|")[0], "reason": f"{meal} pick"})
+    choices["suggestions"] = ["drink water"]
+    return MagicMock(text=json.dumps(choices))
+
+
+class TestOptimizedGeneration:
+    """Test suite for MEAL_GENERATION_MODE=optimized"""
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_optimized_plan_uses_local_portions(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, monkeypatch):
+        """Test that one short call picks items and portions and totals are computed locally"""
+        monkeypatch.setenv("MEAL_GENERATION_MODE", "optimized")
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.side_effect = optimized_response
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        result = recommender.get_daily_meal_schedule(user_preferences)
+
+        assert mock_model_instance.generate_content.call_count == 1
+        prompt = mock_model_instance.generate_content.call_args.args[0]
+        assert "BREAKFAST SHORTLIST" in prompt and "DINNER SHORTLIST" not in prompt
+        eggs = result["breakfast"][0]
+        assert eggs["name"] == "Scrambled Eggs"
+        assert eggs["reason_selected"] == "breakfast pick"
+        portion = float(eggs["recommended_portion"].split()[0])
+        assert eggs["calories"] == 70 * portion
+        assert result["dinner"] == []
+        expected = sum(item["calories"] for meal in ("breakfast", "lunch") for item in result[meal])
+        assert result["daily_totals"]["total_calories"] == expected
+        assert result["meal_plan_analysis"]["suggestions"] == ["drink water"]
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_optimized_ignores_unknown_ids(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, monkeypatch):
+        """Test that picks outside the shortlist are dropped and the suggestion is used instead"""
+        monkeypatch.setenv("MEAL_GENERATION_MODE", "optimized")
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(return_value=MagicMock(
+            text=json.dumps({"lunch": [{"id": "zzz", "reason": "made up"}], "suggestions": []})))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        result = await recommender.get_daily_meal_schedule_async(user_preferences)
+
+        assert [item["name"] for item in result["lunch"]] == ["Grilled Chicken"]
+        assert result["lunch"][0]["reason_selected"] == ""
+        assert [item["name"] for item in result["breakfast"]] == ["Scrambled Eggs"]
+
+
+class TestCompactOutput:
+    """Test suite for MEAL_OUTPUT_FORMAT=compact"""
+
+    COMPACT_PLAN = {
+        "breakfast": [{"id": "1", "portion": 3, "reason": "protein"}],
+        "lunch": [{"id": "2", "portion": 1.5, "reason": "lean"}, {"id": "99", "portion": 1, "reason": "made up"}],
+        "dinner": [],
+        "suggestions": ["tip 1", "tip 2", "tip 3"],
+    }
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_initialization_invalid_output_format(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, monkeypatch):
+        """Test that an unknown output format fails fast"""
+        monkeypatch.setenv("MEAL_OUTPUT_FORMAT", "tiny")
+        with pytest.raises(ValueError, match="MEAL_OUTPUT_FORMAT"):
+            FoodRecommender()
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_compact_plan_is_hydrated(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, monkeypatch):
+        """Test that ids and portions are expanded into full items with exact totals"""
+        monkeypatch.setenv("MEAL_OUTPUT_FORMAT", "compact")
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.return_value = MagicMock(text=json.dumps(self.COMPACT_PLAN))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        result = recommender.get_daily_meal_schedule(user_preferences)
+
+        prompt = mock_model_instance.generate_content.call_args.args[0]
+        assert '"id": "1"' in prompt and "per_menu_serving_nutrition" not in prompt
+        assert result["breakfast"][0]["name"] == "Scrambled Eggs"
+        assert result["breakfast"][0]["calories"] == 210
+        assert [item["name"] for item in result["lunch"]] == ["Grilled Chicken"]
+        assert result["daily_totals"]["total_calories"] == 210 + 247.5
+        assert "validation" not in result
+
+    @pytest.mark.asyncio
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    async def test_compact_stream_sends_hydrated_items(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, monkeypatch):
+        """Test that streamed items are hydrated as they arrive and totals follow the meals"""
+        monkeypatch.setenv("MEAL_OUTPUT_FORMAT", "compact")
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content_async = AsyncMock(
+            return_value=StreamedResponse(json.dumps(self.COMPACT_PLAN), chunk_size=15))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.record_plan = MagicMock()
+        events = [event async for event in await recommender.stream_daily_meal_schedule(user_preferences)]
+
+        items = [data for event, data in events if event == "item"]
+        assert [item["data"]["name"] for item in items] == ["Scrambled Eggs", "Grilled Chicken"]
+        sections = [data["name"] for event, data in events if event == "section"]
+        assert sections == ["breakfast", "lunch", "dinner", "daily_totals", "meal_plan_analysis"]
+        totals = next(data["data"] for event, data in events if event == "section" and data["name"] == "daily_totals")
+        assert totals["total_calories"] == 210 + 247.5
+        assert events[-1] == ("done", {})
+
+
+class TestRecordPlan:
+    """Test suite for recording generated plans in the history log"""
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_generated_plans_are_appended(self, mock_model_class, mock_genai_config, mock_supabase, mock_env_variables, mock_menu_data, user_preferences, mock_ai_response, tmp_path):
+        """Test that each generated plan is appended with its menu version, not overwritten"""
+        mock_supabase_instance = MagicMock()
+        mock_menu_table(mock_supabase_instance, mock_menu_data)
+        mock_supabase.return_value = mock_supabase_instance
+
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.return_value = MagicMock(text=json.dumps(mock_ai_response))
+        mock_model_class.return_value = mock_model_instance
+
+        recommender = FoodRecommender()
+        recommender.get_daily_meal_schedule(user_preferences)
+        recommender.get_daily_meal_schedule(dict(user_preferences, calories=3000))
+        recommender.plan_history.close()
+
+        records = read_history(str(tmp_path / "plan_history"))
+        assert len(records) == 2
+        assert records[0]["menu_version"] == recommender.get_menu_snapshot().version
+        assert records[1]["user_preferences"]["calories"] == 3000
+        assert records[0]["request_id"] != records[1]["request_id"]
+        assert recommender.metrics()["plan_history"]["written"] == 2
+
+    @patch("backend.app.ai_food_recommendation.create_client")
+    @patch("backend.app.ai_food_recommendation.genai.configure")
+    @patch("backend.app.ai_food_recommendation.genai.GenerativeModel")
+    def test_record_plan_does_not_wait_for_disk(self, mock_model, mock_genai_config, mock_supabase, mock_env_variables, mock_ai_response, user_preferences):
+        """Test that recording returns immediately even when writing fails"""
+        recommender = FoodRecommender()
+        with patch("backend.app.services.plan_history.os.makedirs", side_effect=OSError("Write error")):
+            assert recommender.record_plan(mock_ai_response, user_preferences)
+            assert recommender.plan_history.flush(timeout=5)
+        assert recommender.plan_history.metrics()["errors"] == 1
@@ -0,0 +1,94 @@
+import pytest
+from backend.app.model.menu import MenuItem
+from backend.app.services.hydration import choice_portion, describe_portion, hydrate_choice, hydrate_item, hydrate_plan
+from backend.app.services.menu_encoding import item_code
+from backend.app.services.menu_snapshot import MenuSnapshot
+
+
+def make_item(nutrition):
+    return MenuItem.from_row({"id": 7, "data": {"food_name": "Grilled Chicken", "station_name": "Grill",
+                                                "ingredients": "chicken, salt", "nutrition": nutrition}})
+
+
+class TestHydration:
+    """Test suite for building full plan items from menu records"""
+
+    def test_describe_portion(self):
+        """Test portion text with and without a menu serving size"""
+        assert describe_portion(1.5, "3 oz") == "1.5 x 3 oz"
+        assert describe_portion(1.0, None) == "1 serving"
+        assert describe_portion(2.0, "") == "2 servings"
+
+    def test_hydrate_item_scales_nutrition(self):
+        """Test that every nutrient is scaled by the portion from the menu values"""
+        item = make_item({"serving_size": "3 oz", "calories": "165", "protein_g": "31g",
+                          "sodium_mg": "1,200 mg", "allergens": "Soy, Wheat"})
+        hydrated = hydrate_item(item, 1.5, "lean protein")
+
+        assert hydrated["name"] == "Grilled Chicken"
+        assert hydrated["station"] == "Grill"
+        assert hydrated["recommended_portion"] == "1.5 x 3 oz"
+        assert hydrated["calories"] == 247.5
+        assert hydrated["protein_g"] == 46.5
+        assert hydrated["sodium_mg"] == 1800
+        assert hydrated["fat_g"] is None
+        assert hydrated["allergens"] == ["Soy", "Wheat"]
+        assert hydrated["per_menu_serving_nutrition"]["calories"] == 165
+        assert hydrated["full_nutrition"]["calories"] == 247.5
+        assert hydrated["portion_math"].startswith("1.5 servings x 165 cal = 247.5 cal")
+        assert hydrated["reason_selected"] == "lean protein"
+
+    def test_hydrate_item_field_order(self):
+        """Test that keys come in the order the model is asked to write them"""
+        hydrated = hydrate_item(make_item({"calories": 100}), 1.0)
+        assert list(hydrated)[:5] == ["name", "station", "recommended_portion", "serving_size", "calories"]
+        assert list(hydrated)[-1] == "reason_selected"
+
+
+class TestCompactPlan:
+    """Test suite for hydrating compact (id / portion / reason) model output"""
+
+    @pytest.fixture
+    def snapshot(self):
+        return MenuSnapshot([
+            {"id": 40, "data": {"food_name": "Scrambled Eggs", "station_name": "Main Grill", "meal_type": "Breakfast",
+                                "nutrition": {"calories": 70, "protein_g": 6}}},
+            {"id": 41, "data": {"food_name": "Grilled Chicken", "station_name": "Main Grill", "meal_type": "Lunch",
+                                "nutrition": {"calories": 165, "protein_g": 31}}},
+        ])
+
+    def test_choice_portion_fallback(self):
+        """Test that missing or unreasonable portions become one serving"""
+        assert choice_portion({"portion": "1.5"}) == 1.5
+        assert choice_portion({"portion": 0}) == 1.0
+        assert choice_portion({"portion": 50}) == 1.0
+        assert choice_portion({}) == 1.0
+
+    def test_hydrate_choice(self, snapshot):
+        """Test that ids resolve to menu items and unknown or excluded ids are rejected"""
+        item = hydrate_choice(snapshot, {"id": item_code(41), "portion": 2, "reason": "protein"})
+        assert item["name"] == "Grilled Chicken" and item["calories"] == 330
+        assert item["reason_selected"] == "protein"
+        assert hydrate_choice(snapshot, {"id": "nope"}) is None
+        assert hydrate_choice(snapshot, {"id": item_code(41)}, allowed={0}) is None
+        assert hydrate_choice(snapshot, "Grilled Chicken") is None
+
+    def test_hydrate_plan_builds_full_response(self, snapshot):
+        """Test that the full response shape is rebuilt with totals from the menu"""
+        compact = {
+            "breakfast": [{"id": item_code(40), "portion": 3, "reason": "classic"}],
+            "lunch": [{"id": item_code(41), "portion": 1.5, "reason": "lean"}, {"id": "zz", "portion": 1}],
+            "dinner": [],
+            "user_comment_compliance": "No specific requests",
+            "suggestions": ["tip 1", "tip 2", "tip 3"],
+        }
+        plan = hydrate_plan(compact, snapshot, {"calories": 2000, "protein": 100})
+
+        assert list(plan) == ["breakfast", "lunch", "dinner", "daily_totals", "meal_plan_analysis"]
+        assert plan["breakfast"][0]["calories"] == 210
+        assert plan["daily_totals"]["total_calories"] == 210 + 247.5
+        assert plan["daily_totals"]["total_protein_g"] == 18 + 46.5
+        analysis = plan["meal_plan_analysis"]
+        assert analysis["user_comment_compliance"] == "No specific requests"
+        assert analysis["suggestions"] == ["tip 1", "tip 2", "tip 3"]
+        assert analysis["dropped_items"] == [{"meal": "lunch", "id": "zz"}]
@@ -0,0 +1,81 @@
+import io
+import json
+import tracemalloc
+import pytest
+from backend.app.services.json_items import JSONItemsError, iter_json_items
+
+
+@pytest.fixture
+def items():
+    """Cleaned menu items with strings that look like JSON structure"""
+    return [
+        {"food_name": "Scrambled Eggs", "station": "Grill", "nutrition": {"calories": 210}},
+        {"food_name": "Brace } and ] in [text], \"quoted\"", "station": "Deli", "nutrition": {}},
+        {"food_name": "Soup", "station": "Kettle", "nutrition": {"calories": 123456789}},
+    ]
+
+
+class TestIterJsonItems:
+    """Test suite for streaming items out of cleaned menu files"""
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 16, 65536])
+    def test_array_items_at_any_chunk_size(self, items, chunk_size):
+        """Test that a top-level array yields its elements whatever the read size"""
+        text = json.dumps(items, indent=2)
+        assert list(iter_json_items(io.StringIO(text), chunk_size)) == items
+
+    @pytest.mark.parametrize("chunk_size", [1, 5, 65536])
+    def test_json_lines(self, items, chunk_size):
+        """Test that JSON Lines yield one item per line, blank lines ignored"""
+        text = "\n".join(json.dumps(item) for item in items) + "\n\n"
+        assert list(iter_json_items(io.StringIO(text), chunk_size)) == items
+
+    def test_numbers_split_across_chunks(self):
+        """Test that a number cut by a chunk boundary is not decoded early"""
+        assert list(iter_json_items(io.StringIO("123456 7890"), 3)) == [123456, 7890]
+        assert list(iter_json_items(io.StringIO("[123456, 7890]"), 3)) == [123456, 7890]
+
+    def test_single_object_and_empty_inputs(self, items):
+        """Test that one object is one item and empty files / arrays yield nothing"""
+        assert list(iter_json_items(io.StringIO(json.dumps(items[0])))) == [items[0]]
+        assert list(iter_json_items(io.StringIO(" [ ] "))) == []
+        assert list(iter_json_items(io.StringIO(""))) == []
+
+    def test_path(self, items, tmp_path):
+        """Test that a file path is opened and read"""
+        path = tmp_path / "items.json"
+        path.write_text(json.dumps(items), encoding="utf-8")
+        assert list(iter_json_items(str(path))) == items
+
+    def test_reads_lazily(self, items):
+        """Test that the first item is available after reading only the start of the file"""
+        f = io.StringIO(json.dumps(items * 1000))
+        first = next(iter_json_items(f, chunk_size=256))
+        assert first == items[0]
+        assert f.tell() <= 512
+
+    def test_memory_stays_flat(self):
+        """Test that peak memory does not grow with the number of items"""
+        item = {"food_name": "Grilled Chicken", "nutrition": {"calories": "330", "protein": "31g"}}
+        text = "[" + ",".join([json.dumps(item)] * 20000) + "]"
+
+        f = io.StringIO(text)
+        tracemalloc.start()
+        count = sum(1 for _ in iter_json_items(f, chunk_size=4096))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert count == 20000
+        assert peak < len(text) / 10
+
+    @pytest.mark.parametrize("text, pos", [
+        ('[{"a": 1} {"a": 2}]', 10),
+        ('[{"a": 1}, {"a": }]', 17),
+        ('[{"a": 1}] extra', 11),
+        ('[{"a": 1}', 9),
+    ])
+    def test_errors_report_file_offset(self, text, pos):
+        """Test that malformed input raises with the character offset in the whole file"""
+        with pytest.raises(JSONItemsError) as exc_info:
+            list(iter_json_items(io.StringIO(text), chunk_size=4))
+        assert exc_info.value.pos == pos
@@ -0,0 +1,123 @@
+import json
+import pytest
+from backend.app.services.json_stream import ParseEvent, StreamingJSONParser, StreamParseError
+
+
+@pytest.fixture
+def plan():
+    """Meal plan in the shape produced by the model"""
+    return {
+        "breakfast": [{"name": "Scrambled Eggs", "calories": 210}, {"name": "Toast \"wheat\"", "calories": 80}],
+        "lunch": [{"name": "Grilled Chicken", "calories": 330}],
+        "dinner": [{"name": "Brace } and \\ in text", "calories": 400, "allergens": ["soy"]}],
+        "daily_totals": {"total_calories": 1020},
+        "meal_plan_analysis": {"suggestions": ["Drink water"]},
+    }
+
+
+def feed_in_chunks(parser, text, size):
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return events
+
+
+class TestStreamingJSONParser:
+    """Test suite for incremental parsing of model output"""
+
+    @pytest.mark.parametrize("size", [1, 2, 7, 64, 10000])
+    def test_result_matches_json_loads(self, plan, size):
+        """Test that any chunking yields the same object as json.loads"""
+        parser = StreamingJSONParser()
+        feed_in_chunks(parser, json.dumps(plan, indent=2), size)
+
+        assert parser.finish() == plan
+
+    def test_events_in_document_order(self, plan):
+        """Test that items are emitted as they close, each section right after its last item"""
+        events = feed_in_chunks(StreamingJSONParser(), json.dumps(plan), 5)
+
+        assert [(e.kind, e.key, e.index) for e in events][:4] == [
+            ("item", "breakfast", 0), ("item", "breakfast", 1), ("section", "breakfast", None), ("item", "lunch", 0),
+        ]
+        assert [e.key for e in events if e.kind == "section"] == list(plan)
+
+    def test_first_item_available_before_rest_of_plan(self, plan):
+        """Test that the first breakfast item is emitted while the second is still being generated"""
+        text = json.dumps(plan)
+        parser = StreamingJSONParser()
+        events = parser.feed(text[:text.index('{"name": "Toast')])
+
+        assert events == [ParseEvent("item", "breakfast", 0, plan["breakfast"][0])]
+
+    def test_scalar_values_wait_for_delimiter(self):
+        """Test that a number at the end of the buffer is not emitted before it is complete"""
+        parser = StreamingJSONParser()
+
+        assert parser.feed('{"count": 12') == []
+        assert parser.feed('3, "ok": true}') == [
+            ParseEvent("section", "count", None, 123), ParseEvent("section", "ok", None, True),
+        ]
+
+    def test_tolerates_code_fences_and_prose(self, plan):
+        """Test that text before and after the JSON object is ignored"""
+        text = "Here is your plan:\n```json\n" + json.dumps(plan) + "\n```\nEnjoy your meals {really}!"
+        parser = StreamingJSONParser()
+        feed_in_chunks(parser, text, 9)
+
+        assert parser.finish() == plan
+
+    def test_escape_split_across_chunks(self):
+        """Test that a backslash at a chunk boundary does not end the string early"""
+        parser = StreamingJSONParser()
+        parser.feed('{"name": "say \\')
+        parser.feed('"hi\\"", "n": 1}')
+
+        assert parser.finish() == {"name": 'say "hi"', "n": 1}
+
+    def test_error_reports_exact_position(self, plan):
+        """Test that a malformed item reports its position in the whole output"""
+        good = json.dumps(plan)
+        bad = good.replace('"calories": 330', '"calories": 33O')
+        parser = StreamingJSONParser()
+        feed_in_chunks(parser, "```json\n" + bad, 16)
+
+        with pytest.raises(StreamParseError) as exc:
+            parser.finish()
+        assert exc.value.pos == len("```json\n") + bad.index("33O") + 2
+        assert exc.value.lineno == 2
+
+    def test_completed_sections_survive_later_error(self, plan):
+        """Test that sections before a truncation remain available"""
+        text = json.dumps(plan)
+        parser = StreamingJSONParser()
+        parser.feed(text[:text.index('"daily_totals"') + 20])
+
+        with pytest.raises(StreamParseError, match="Unexpected end"):
+            parser.finish()
+        assert list(parser.sections) == ["breakfast", "lunch", "dinner"]
+
+    @pytest.mark.parametrize("text, message", [
+        ('{"a": [1, 2}', "Mismatched"),
+        ('{"a" 1}', "Expecting ':' delimiter"),
+        ('{"a": 1 "b": 2}', "Expecting ',' delimiter"),
+        ('{"a": 1,}', "Expecting property name"),
+        ('{"a": tru}', "Expecting value"),
+    ])
+    def test_structural_errors(self, text, message):
+        """Test that top-level grammar errors are detected with json-style messages"""
+        parser = StreamingJSONParser()
+        parser.feed(text)
+
+        with pytest.raises(StreamParseError, match=message):
+            parser.finish()
+
+    def test_no_object(self):
+        """Test that output without any JSON object is reported at position 0"""
+        parser = StreamingJSONParser()
+        parser.feed("I cannot help with that.")
+
+        with pytest.raises(StreamParseError) as exc:
+            parser.finish()
+        assert not parser.started
+        assert exc.value.pos == 0
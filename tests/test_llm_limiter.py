@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+import pytest
+from backend.app.services.llm_limiter import LLMLimiter, LLMOverloadedError
+
+
+def hold_slot(limiter, release_event, started=None):
+    """Thread target: take a slot and keep it until release_event is set"""
+    with limiter.slot():
+        if started is not None:
+            started.set()
+        release_event.wait(2)
+
+
+class TestLLMLimiter:
+    """Test suite for the sync side of the LLM concurrency limiter"""
+
+    def test_admits_up_to_max_concurrent(self):
+        """Test that free slots are taken without waiting"""
+        limiter = LLMLimiter(max_concurrent=2, max_queue=0, max_wait=0.1)
+        limiter.acquire()
+        limiter.acquire()
+
+        metrics = limiter.metrics()
+        assert metrics["in_flight"] == 2
+        assert metrics["admitted"] == 2
+
+    def test_full_queue_is_shed_immediately(self):
+        """Test that requests beyond slots + queue fail fast with a Retry-After hint"""
+        limiter = LLMLimiter(max_concurrent=1, max_queue=0, max_wait=5)
+        limiter.acquire()
+
+        start = time.monotonic()
+        with pytest.raises(LLMOverloadedError) as exc:
+            limiter.acquire()
+
+        assert time.monotonic() - start < 0.5
+        assert exc.value.retry_after >= 1
+        assert limiter.metrics()["shed"] == 1
+
+    def test_expected_long_wait_is_shed_immediately(self):
+        """Test that a request that would wait past max_wait is rejected at once, not after max_wait"""
+        limiter = LLMLimiter(max_concurrent=1, max_queue=10, max_wait=5)
+        limiter.acquire()
+        limiter.release(held_seconds=8)  # calls take about 8s: any queued request would time out
+        limiter.acquire()
+
+        start = time.monotonic()
+        with pytest.raises(LLMOverloadedError) as exc:
+            limiter.acquire()
+
+        assert time.monotonic() - start < 0.5
+        assert "Expected wait" in str(exc.value)
+        assert exc.value.retry_after == 8
+        assert limiter.metrics()["shed"] == 1
+        assert limiter.metrics()["queue_depth"] == 0
+
+    def test_short_expected_wait_is_queued(self):
+        """Test that requests whose estimate fits in max_wait still wait for a slot"""
+        limiter = LLMLimiter(max_concurrent=1, max_queue=10, max_wait=2)
+        limiter.acquire()
+        limiter.release(held_seconds=0.05)
+        limiter.acquire()
+
+        threading.Timer(0.05, limiter.release).start()
+        limiter.acquire()
+        assert limiter.metrics()["shed"] == 0
+
+    def test_waiter_times_out_after_max_wait(self):
+        """Test that a queued request gives up after max_wait and leaves the queue"""
+        limiter = LLMLimiter(max_concurrent=1, max_queue=1, max_wait=0.05)
+        limiter.acquire()
+
+        with pytest.raises(LLMOverloadedError):
+            limiter.acquire()
+
+        metrics = limiter.metrics()
+        assert metrics["queue_depth"] == 0
+        assert metrics["max_queue_depth"] == 1
+        assert metrics["in_flight"] == 1
+
+    def test_release_hands_slot_to_waiter(self):
+        """Test that a queued request runs as soon as a slot is released"""
+        limiter = LLMLimiter(max_concurrent=1, max_queue=1, max_wait=2)
+        release, started = threading.Event(), threading.Event()
+        holder = threading.Thread(target=hold_slot, args=(limiter, release, started))
+        holder.start()
+        started.wait(1)
+
+        threading.Timer(0.05, release.set).start()
+        with limiter.slot():
+            assert limiter.metrics()["in_flight"] == 1
+        holder.join()
+
+        metrics = limiter.metrics()
+        assert metrics["in_flight"] == 0
+        assert metrics["max_wait_seconds"] > 0
+
+    def test_concurrency_never_exceeds_limit(self):
+        """Test that no more than max_concurrent blocks run at the same time"""
+        limiter = LLMLimiter(max_concurrent=3, max_queue=50, max_wait=5)
+        lock = threading.Lock()
+        active, peak = [0], [0]
+
+        def work():
+            with limiter.slot():
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.01)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert peak[0] == 3
+        assert limiter.metrics()["admitted"] == 20
+
+
+class TestLLMLimiterAsync:
+    """Test suite for the asyncio side of the limiter"""
+
+    @pytest.mark.asyncio
+    async def test_async_waiters_share_slots(self):
+        """Test that async callers queue for slots without blocking the event loop"""
+        limiter = LLMLimiter(max_concurrent=2, max_queue=10, max_wait=2)
+        active, peak = [0], [0]
+
+        async def work():
+            async with limiter.slot_async():
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                await asyncio.sleep(0.01)
+                active[0] -= 1
+
+        await asyncio.gather(*[work() for _ in range(8)])
+
+        assert peak[0] == 2
+        assert limiter.metrics()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_async_timeout_raises_overloaded(self):
+        """Test that an async waiter is shed after max_wait"""
+        limiter = LLMLimiter(max_concurrent=1, max_queue=1, max_wait=0.05)
+        await limiter.acquire_async()
+
+        with pytest.raises(LLMOverloadedError):
+            await limiter.acquire_async()
+        assert limiter.metrics()["queue_depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        """Test that cancelling a queued async request leaves the slot count intact"""
+        limiter = LLMLimiter(max_concurrent=1, max_queue=1, max_wait=2)
+        await limiter.acquire_async()
+
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+
+        metrics = limiter.metrics()
+        assert metrics["in_flight"] == 0
+        assert metrics["queue_depth"] == 0
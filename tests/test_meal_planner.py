@@ -0,0 +1,102 @@
+import pytest
+from backend.app.model.menu import MenuItem
+from backend.app.services.meal_planner import (
+    MEALS, daily_totals, meal_budgets, meals_for, merge_meal_plans, partition_by_meal, plan_analysis,
+)
+
+
+@pytest.fixture
+def menu_items():
+    rows = [
+        (1, "Scrambled Eggs", "Breakfast"),
+        (2, "Grilled Chicken", "Lunch"),
+        (3, "Salmon", "Dinner"),
+        (4, "Waffles", "Brunch"),
+        (5, "Fruit Cup", ""),
+    ]
+    return tuple(MenuItem.from_row({"id": i, "data": {"food_name": name, "station_name": "Grill",
+                                                       "meal_type": meal_type, "nutrition": {}}})
+                 for i, name, meal_type in rows)
+
+
+@pytest.fixture
+def user_preferences():
+    return {"calories": 2000, "protein": 120}
+
+
+class TestMealPartition:
+    """Test suite for splitting the menu by meal_type"""
+
+    def test_meals_for_known_and_unknown_types(self):
+        """Test that meal types map to meals, brunch to two and unknown types to all"""
+        assert meals_for("Breakfast") == ("breakfast",)
+        assert meals_for(" dinner ") == ("dinner",)
+        assert meals_for("Brunch") == ("breakfast", "lunch")
+        assert meals_for(None) == MEALS
+
+    def test_partition_by_meal(self, menu_items):
+        """Test that every meal gets its own items plus shared ones"""
+        partition = partition_by_meal(menu_items)
+
+        assert partition["breakfast"] == (0, 3, 4)
+        assert partition["lunch"] == (1, 3, 4)
+        assert partition["dinner"] == (2, 4)
+
+
+class TestMealBudgets:
+    """Test suite for per-meal calorie / protein targets"""
+
+    def test_budgets_add_up_to_daily_targets(self, user_preferences):
+        """Test that the meal shares cover the daily targets"""
+        budgets = meal_budgets(user_preferences)
+
+        assert sum(b["calories"] for b in budgets.values()) == 2000
+        assert sum(b["protein_g"] for b in budgets.values()) == 120
+        assert budgets["dinner"]["calories"] > budgets["breakfast"]["calories"]
+
+    def test_skipped_meal_budget_is_redistributed(self, user_preferences):
+        """Test that a missing meal's share goes to the remaining meals"""
+        budgets = meal_budgets(user_preferences, ("lunch", "dinner"))
+
+        assert set(budgets) == {"lunch", "dinner"}
+        assert sum(b["calories"] for b in budgets.values()) == 2000
+
+    def test_missing_targets(self):
+        """Test that no targets give None budgets"""
+        assert meal_budgets({})["lunch"] == {"calories": None, "protein_g": None}
+
+
+class TestMergeMealPlans:
+    """Test suite for merging per-meal results"""
+
+    def test_totals_recomputed_from_items(self, user_preferences):
+        """Test that daily totals are the sums of the items of every meal"""
+        plan = merge_meal_plans({
+            "breakfast": [{"calories": 500, "protein_g": 30, "carbs_g": "40g"}],
+            "lunch": [{"calories": 700, "protein_g": 45.5}],
+            "dinner": [{"calories": 900, "protein_g": 50, "sodium_mg": None}],
+        }, user_preferences, ["tip 1", "tip 2", "tip 3", "tip 4"])
+
+        totals = plan["daily_totals"]
+        assert list(plan) == ["breakfast", "lunch", "dinner", "daily_totals", "meal_plan_analysis"]
+        assert totals["total_calories"] == 2100
+        assert totals["total_protein_g"] == 125.5
+        assert totals["total_carbs_g"] == 40
+        assert totals["calorie_difference"] == 100
+        assert plan["meal_plan_analysis"]["target_achievement"] == "SUCCESS - All targets met"
+        assert plan["meal_plan_analysis"]["suggestions"] == ["tip 1", "tip 2", "tip 3"]
+
+    def test_missed_targets_are_reported(self, user_preferences):
+        """Test that analysis flags missed calorie and protein targets"""
+        totals = daily_totals({"lunch": [{"calories": 800, "protein_g": 40}]}, user_preferences)
+        analysis = plan_analysis(totals)
+
+        assert totals["protein_difference"] == -80
+        assert analysis["target_achievement"] == "FAILED - Missing: calories, protein"
+        assert analysis["calorie_goal_status"].startswith("Missed: 800 vs target 2000")
+
+    def test_protein_overshoot_warning(self, user_preferences):
+        """Test that protein far above the target is flagged"""
+        totals = daily_totals({"dinner": [{"calories": 2000, "protein_g": 250}]}, user_preferences)
+
+        assert plan_analysis(totals)["nutrition_balance_check"] == "Warning: Excessive protein overshoot"
@@ -0,0 +1,174 @@
+import threading
+import time
+import pytest
+from backend.app.services.menu_cache import MenuCache
+
+
+class CountingLoader:
+    """Loader stub that counts calls and can be made slow or failing"""
+
+    def __init__(self, data=None, delay=0):
+        self.data = data if data is not None else [{"id": 1}]
+        self.delay = delay
+        self.calls = 0
+        self.error = None
+
+    def __call__(self):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return list(self.data)
+
+
+class TestMenuCacheFreshness:
+    """Test suite for TTL handling"""
+
+    def test_first_get_loads_synchronously(self):
+        """Test that the first call waits for the loader"""
+        loader = CountingLoader()
+        cache = MenuCache(loader, ttl=60)
+
+        assert cache.get() == [{"id": 1}]
+        assert loader.calls == 1
+
+    def test_fresh_snapshot_is_served_from_memory(self):
+        """Test that calls within the TTL do not hit the loader"""
+        loader = CountingLoader()
+        cache = MenuCache(loader, ttl=60)
+
+        first = cache.get()
+        second = cache.get()
+
+        assert second is first
+        assert loader.calls == 1
+        assert not cache.is_stale()
+
+    def test_expired_snapshot_is_served_while_refreshing(self):
+        """Test stale-while-revalidate: old data is returned and a refresh runs in the background"""
+        loader = CountingLoader(data=[{"id": 1}])
+        cache = MenuCache(loader, ttl=60)
+        stale = cache.get()
+
+        loader.data = [{"id": 2}]
+        cache.invalidate()
+        assert cache.get() is stale
+
+        cache.wait_for_refresh(timeout=2)
+        assert cache.get() == [{"id": 2}]
+        assert loader.calls == 2
+
+    def test_clear_forces_synchronous_reload(self):
+        """Test that clear() drops the snapshot"""
+        loader = CountingLoader()
+        cache = MenuCache(loader, ttl=60)
+        cache.get()
+        cache.clear()
+
+        assert cache.data is None
+        cache.get()
+        assert loader.calls == 2
+
+
+class TestMenuCacheConcurrency:
+    """Test suite for single-refresh behaviour under concurrent callers"""
+
+    def test_concurrent_initial_load_runs_once(self):
+        """Test that many threads waiting on an empty cache share one load"""
+        loader = CountingLoader(delay=0.05)
+        cache = MenuCache(loader, ttl=60)
+        results = []
+
+        threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert loader.calls == 1
+        assert all(r == [{"id": 1}] for r in results)
+
+    def test_concurrent_stale_reads_start_one_refresh(self):
+        """Test that expired reads trigger only a single background refresh"""
+        loader = CountingLoader(delay=0.05)
+        cache = MenuCache(loader, ttl=60)
+        cache.get()
+        cache.invalidate()
+
+        for _ in range(20):
+            cache.get()
+        cache.wait_for_refresh(timeout=2)
+
+        assert loader.calls == 2
+
+
+class TestMenuCacheErrors:
+    """Test suite for loader failures"""
+
+    def test_error_without_snapshot_returns_empty_list(self):
+        """Test that a failing first load returns an empty list instead of raising"""
+        loader = CountingLoader()
+        loader.error = Exception("Database error")
+        cache = MenuCache(loader, ttl=60)
+
+        assert cache.get() == []
+        assert cache.data is None
+        assert isinstance(cache.last_error, Exception)
+
+    def test_concurrent_cold_failure_is_shared(self):
+        """Test that callers waiting on a failed first load get its result instead of retrying in turn"""
+        loader = CountingLoader(delay=0.05)
+        loader.error = Exception("Database down")
+        cache = MenuCache(loader, ttl=60)
+        results = []
+
+        threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(5)]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert loader.calls == 1
+        assert results == [[]] * 5
+        assert time.monotonic() - started < 0.2
+
+    def test_cold_failure_backs_off(self):
+        """Test that an empty cache does not hit the database again until retry_interval passes"""
+        loader = CountingLoader()
+        loader.error = Exception("Database down")
+        cache = MenuCache(loader, ttl=60, retry_interval=0.1)
+
+        assert cache.get() == [] and cache.get() == []
+        assert loader.calls == 1
+
+        loader.error = None
+        time.sleep(0.12)
+        assert cache.get() == [{"id": 1}]
+        assert loader.calls == 2
+
+    def test_error_keeps_last_good_snapshot(self):
+        """Test that a failing refresh keeps the previous snapshot"""
+        loader = CountingLoader(data=[{"id": 1}])
+        cache = MenuCache(loader, ttl=60)
+        cache.get()
+
+        loader.error = Exception("Database error")
+        assert cache.refresh() == [{"id": 1}]
+        assert cache.get() == [{"id": 1}]
+
+    def test_failed_refresh_backs_off(self):
+        """Test that a failed background refresh is not retried on every request"""
+        loader = CountingLoader()
+        cache = MenuCache(loader, ttl=60, retry_interval=60)
+        cache.get()
+
+        loader.error = Exception("Database error")
+        cache.invalidate()
+        cache.get()
+        cache.wait_for_refresh(timeout=2)
+        cache.get()
+        cache.wait_for_refresh(timeout=2)
+
+        assert loader.calls == 2
@@ -0,0 +1,105 @@
+import pytest
+from unittest.mock import MagicMock
+from backend.app.services.menu_delta import (
+    MenuDelta,
+    MissingColumnsError,
+    content_hash,
+    fetch_item_hashes,
+    format_delta,
+    item_key,
+)
+
+
+@pytest.fixture
+def item():
+    return {"food_name": "Grilled Chicken", "station_name": "Grill", "meal_type": "Lunch", "date": "2025-09-01",
+            "nutrition": {"calories": "330", "protein": "31g"}, "ingredients_url": "https://example.com/1"}
+
+
+class TestHashes:
+    """Test suite for item keys and content hashes"""
+
+    def test_stable_and_order_independent(self, item):
+        """Test that equal items hash the same whatever their key order"""
+        reordered = dict(reversed(list(item.items())))
+        reordered["nutrition"] = {"protein": "31g", "calories": "330"}
+        assert item_key(reordered) == item_key(item)
+        assert content_hash(reordered) == content_hash(item)
+
+    def test_key_ignores_nutrition(self, item):
+        """Test that nutrition changes the content hash but not the item key"""
+        changed = dict(item, nutrition={"calories": "350"})
+        assert item_key(changed) == item_key(item)
+        assert content_hash(changed) != content_hash(item)
+
+    @pytest.mark.parametrize("field", ["food_name", "station_name", "meal_type", "date"])
+    def test_identity_fields(self, item, field):
+        """Test that each identity field makes a different item"""
+        assert item_key(dict(item, **{field: "Other"})) != item_key(item)
+
+    def test_unused_fields_ignored(self, item):
+        """Test that fields outside name / station / meal / date / nutrition do not matter"""
+        assert content_hash(dict(item, ingredients_url="https://example.com/2")) == content_hash(item)
+
+
+class TestMenuDelta:
+    """Test suite for classifying incoming items"""
+
+    def test_classifies_items(self, item):
+        """Test new, changed, unchanged and duplicate items"""
+        unchanged = dict(item, food_name="Rice")
+        changed = dict(item, food_name="Soup")
+        existing = {
+            item_key(unchanged): (1, content_hash(unchanged)),
+            item_key(changed): (2, "old"),
+            item_key(dict(item, food_name="Gone")): (3, "x"),
+        }
+        delta = MenuDelta(existing, unkeyed=[9])
+        rows = list(delta.rows([item, unchanged, changed, item]))
+
+        assert [row["data"] for row in rows] == [item, changed]
+        assert rows[0] == {"item_key": item_key(item), "content_hash": content_hash(item), "data": item}
+        assert (delta.new, delta.changed, delta.unchanged, delta.duplicates) == (1, 1, 1, 1)
+        assert delta.stale_ids() == [3, 9]
+        assert format_delta(delta.report(None, 2)) == \
+            "1 new, 1 changed, 1 unchanged, 1 duplicates skipped, 2 deleted"
+
+
+class TestFetchItemHashes:
+    """Test suite for loading stored hashes"""
+
+    def test_keyset_pages(self):
+        """Test that hashes are read page by page on id with only the small columns selected"""
+        pages = [
+            [{"id": 1, "item_key": "a", "content_hash": "h1"}, {"id": 2, "item_key": None, "content_hash": None}],
+            [{"id": 5, "item_key": "b", "content_hash": "h2"}],
+        ]
+        client = MagicMock()
+        query = client.table.return_value.select.return_value.order.return_value.limit.return_value
+        query.execute.return_value.data = pages[0]
+        query.gt.return_value.execute.return_value.data = pages[1]
+
+        hashes, unkeyed = fetch_item_hashes(client, "cleaned_data", page_size=2)
+
+        client.table.return_value.select.assert_called_with("id, item_key, content_hash, updated_at")
+        query.gt.assert_called_once_with('id', 2)
+        assert hashes == {"a": (1, "h1"), "b": (5, "h2")}
+        assert unkeyed == [2]
+
+    def test_unmigrated_table_fails_clearly(self):
+        """Test that missing item_key / content_hash columns raise an error naming the migrations"""
+        error = Exception("column cleaned_data.item_key does not exist")
+        error.code = "42703"
+        client = MagicMock()
+        client.table.return_value.select.return_value.order.return_value.limit.return_value.execute.side_effect = error
+
+        with pytest.raises(MissingColumnsError, match="backend/migrations"):
+            fetch_item_hashes(client, "cleaned_data")
+
+    def test_other_errors_propagate(self):
+        """Test that unrelated failures are not reported as a missing migration"""
+        client = MagicMock()
+        client.table.return_value.select.return_value.order.return_value.limit.return_value.execute.side_effect = \
+            RuntimeError("connection refused")
+        with pytest.raises(RuntimeError, match="connection refused"):
+            fetch_item_hashes(client, "cleaned_data")
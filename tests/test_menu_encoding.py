@@ -0,0 +1,107 @@
+import json
+import pytest
+from backend.app.model.menu import MenuItem
+from backend.app.services.menu_encoding import (
+    encode_menu_table,
+    format_cell,
+    item_code,
+    nutrient_columns,
+    table_header,
+)
+from backend.app.services.menu_snapshot import MenuSnapshot
+
+
+@pytest.fixture
+def menu_rows():
+    """Menu rows with a realistic spread of nutrient fields"""
+    return [
+        {"id": 1, "data": {"food_name": "Scrambled Eggs", "station_name": "Main Grill", "meal_type": "Breakfast",
+                           "nutrition": {"serving_size": "1/2 cup", "calories": 210, "protein_g": 14, "carbs_g": 1,
+                                         "fat_g": 16.0, "sodium_mg": 150, "vitamin_d_iu": None,
+                                         "allergens": ["Eggs"], "ingredients": "Liquid Egg, Canola Oil"}}},
+        {"id": 1234, "data": {"food_name": "Grilled Chicken", "station_name": "Main Grill", "meal_type": "Lunch",
+                              "nutrition": {"serving_size": "4 oz", "calories": 165, "protein_g": 31, "carbs_g": 0,
+                                            "fat_g": 3.6, "sodium_mg": 74, "iron_mg": 1.2,
+                                            "ingredients": "Chicken breast | olive oil.\nDisclaimer: x"}}},
+    ]
+
+
+class TestItemCode:
+    """Test suite for short stable item IDs"""
+
+    def test_base36(self):
+        """Test that database ids are shortened to base 36"""
+        assert item_code(0) == "0"
+        assert item_code(35) == "z"
+        assert item_code(1234) == "ya"
+
+    def test_non_integer_ids_pass_through(self):
+        """Test that non-integer ids are kept as text"""
+        assert item_code("abc") == "abc"
+
+
+class TestFormatCell:
+    """Test suite for cell formatting"""
+
+    def test_nulls_are_omitted(self):
+        """Test that missing values become empty cells"""
+        assert format_cell(None) == ""
+        assert format_cell("N/A") == ""
+
+    def test_numbers_are_compact(self):
+        """Test that floats drop trailing zeros"""
+        assert format_cell(16.0) == "16"
+        assert format_cell(3.6) == "3.6"
+
+    def test_delimiter_and_newlines_are_escaped(self):
+        """Test that cell text cannot break the row structure"""
+        assert format_cell("a | b\nc") == "a / b c"
+
+
+class TestEncodeMenuTable:
+    """Test suite for the compact tabular menu encoding"""
+
+    def test_columns_skip_all_null_fields(self, menu_rows):
+        """Test that nutrient columns only include fields present somewhere"""
+        items = [MenuItem.from_row(row) for row in menu_rows]
+        columns = nutrient_columns(items)
+
+        assert columns[:5] == ["calories", "protein_g", "carbs_g", "fat_g", "sodium_mg"]
+        assert "iron_mg" in columns
+        assert "vitamin_d_iu" not in columns
+
+    def test_one_row_per_item(self, menu_rows):
+        """Test the header row and item rows"""
+        items = [MenuItem.from_row(row) for row in menu_rows]
+        lines = encode_menu_table(items).splitlines()
+
+        assert lines[1] == table_header(nutrient_columns(items))
+        assert lines[2].startswith("1|Scrambled Eggs|Main Grill|Breakfast|1/2 cup|210|14|1|16|150|")
+        assert lines[2].endswith("|Eggs|Liquid Egg, Canola Oil")
+        assert lines[3].startswith("ya|Grilled Chicken|")
+        assert lines[3].endswith("|Chicken breast / olive oil.")
+        assert len(lines) == 4
+
+    def test_table_is_much_smaller_than_json(self, menu_rows):
+        """Test that the compact encoding is several times smaller than indented JSON"""
+        rows = [dict(row, id=i) for i in range(50) for row in menu_rows]
+        snapshot = MenuSnapshot(rows)
+        assert len(snapshot.menu_json) > 3 * len(snapshot.menu_table_for(range(len(rows))))
+
+
+class TestSnapshotMenuBlock:
+    """Test suite for format selection on the snapshot"""
+
+    def test_json_format(self, menu_rows):
+        """Test that 'json' keeps the existing indented JSON block"""
+        snapshot = MenuSnapshot(menu_rows)
+        assert json.loads(snapshot.menu_block_for([0, 1], "json"))[1]["name"] == "Grilled Chicken"
+
+    def test_table_format_subset(self, menu_rows):
+        """Test that 'table' encodes only the selected items"""
+        snapshot = MenuSnapshot(menu_rows)
+        block = snapshot.menu_block_for([1], "table")
+
+        assert "Grilled Chicken" in block
+        assert "Scrambled Eggs" not in block
+        assert block == encode_menu_table(snapshot.items).replace(snapshot.table_rows[0] + "\n", "")
@@ -0,0 +1,219 @@
+import pytest
+from backend.app.model.menu import MenuItem
+from backend.app.services.menu_filter import (
+    MenuIndex,
+    iter_bits,
+    to_bitset,
+    PreferenceFilter,
+    filter_menu,
+    normalize_term,
+)
+
+
+def make_item(item_id, name, ingredients="N/A", allergens=None):
+    nutrition = {"calories": 100, "ingredients": ingredients}
+    if allergens is not None:
+        nutrition["allergens"] = allergens
+    return MenuItem.from_row({"id": item_id, "data": {"food_name": name, "station_name": "Main Grill",
+                                                      "meal_type": "Lunch", "nutrition": nutrition}})
+
+
+@pytest.fixture
+def menu():
+    return (
+        make_item(1, "Scrambled Eggs", "Liquid Egg, Canola Oil", ["Eggs"]),
+        make_item(2, "Grilled Chicken", "Chicken breast, olive oil, seasonings"),
+        make_item(3, "Shrimp Fried Rice", "Rice, Shrimp, Soy Sauce, Green Onion"),
+        make_item(4, "Roasted Eggplant", "Eggplant, olive oil, garlic"),
+        make_item(5, "Mushroom Risotto", "Arborio rice, mushrooms, parmesan cheese, butter"),
+        make_item(6, "Garden Salad", "Lettuce, tomatoes, cucumber"),
+    )
+
+
+@pytest.fixture
+def no_preferences():
+    return {"allergens": [], "dislikes": [], "diet": "none", "dietary_restrictions": "none"}
+
+
+class TestNormalizeTerm:
+    """Test suite for term normalization"""
+
+    def test_plurals_and_case(self):
+        """Test that case and simple plurals are normalized"""
+        assert normalize_term("Eggs") == "egg"
+        assert normalize_term("Tomatoes") == "tomato"
+        assert normalize_term("Tree Nuts") == "tree nut"
+        assert normalize_term("Berries") == "berry"
+
+
+class TestFilterMenu:
+    """Test suite for preference-aware pre-filtering"""
+
+    def test_no_preferences_keeps_everything(self, menu, no_preferences):
+        """Test that an empty preference set filters nothing"""
+        assert filter_menu(menu, no_preferences) == [0, 1, 2, 3, 4, 5]
+
+    def test_allergen_tag_excludes_item(self, menu, no_preferences):
+        """Test that items tagged with the allergen are dropped"""
+        prefs = dict(no_preferences, allergens=["Eggs"])
+        assert 0 not in filter_menu(menu, prefs)
+
+    def test_allergen_keyword_matches_whole_words_only(self, menu, no_preferences):
+        """Test that 'egg' does not match 'eggplant'"""
+        prefs = dict(no_preferences, allergens=["eggs"])
+        kept = filter_menu(menu, prefs)
+        assert 3 in kept
+
+    def test_shellfish_allergen_uses_ingredient_keywords(self, menu, no_preferences):
+        """Test that shellfish is detected from ingredients without a tag"""
+        prefs = dict(no_preferences, allergens=["shellfish"])
+        assert 2 not in filter_menu(menu, prefs)
+
+    def test_dislikes_match_ingredients(self, menu, no_preferences):
+        """Test that dislikes are matched against ingredients and plurals"""
+        prefs = dict(no_preferences, dislikes=["mushroom", "garlic"])
+        kept = filter_menu(menu, prefs)
+        assert 3 not in kept
+        assert 4 not in kept
+
+    def test_vegetarian_diet_drops_meat_and_seafood(self, menu, no_preferences):
+        """Test that a vegetarian diet excludes meat and seafood"""
+        prefs = dict(no_preferences, diet="Vegetarian")
+        assert filter_menu(menu, prefs) == [0, 3, 4, 5]
+
+    def test_vegan_diet_drops_animal_products(self, menu, no_preferences):
+        """Test that a vegan diet also excludes eggs and dairy"""
+        prefs = dict(no_preferences, diet="vegan")
+        assert filter_menu(menu, prefs) == [3, 5]
+
+    def test_unknown_diet_is_left_to_the_ai(self, menu, no_preferences):
+        """Test that diets without local rules (keto) do not filter"""
+        prefs = dict(no_preferences, diet="keto")
+        assert len(filter_menu(menu, prefs)) == len(menu)
+
+    def test_free_text_restrictions(self, menu, no_preferences):
+        """Test that known restrictions in free text are applied"""
+        prefs = dict(no_preferences, dietary_restrictions="dairy-free, vegetarian")
+        assert filter_menu(menu, prefs) == [0, 3, 5]
+
+    def test_filter_is_empty(self, no_preferences):
+        """Test is_empty for preferences without local rules"""
+        assert PreferenceFilter.from_preferences(no_preferences).is_empty()
+
+
+@pytest.fixture
+def dining_hall():
+    """Realistic dining-hall item names that trip naive keyword matching"""
+    names = [
+        "Gluten-Free Rice Flour Pancake", "Peanut Butter Toast", "Grilled Flank Steak", "Cheeseburger",
+        "Spaghetti and Meatballs", "Hot Dog", "Buffalo Wings", "BBQ Ribs", "Meatloaf", "Carnitas Taco",
+        "Black Bean Burger", "Impossible Burger", "Buffalo Cauliflower Wings", "Dairy-Free Veggie Pizza",
+        "Pasta Salad (no egg)", "Buttered Noodles", "Coconut Milk Curry", "Beef Brisket Sandwich",
+    ]
+    return tuple(make_item(i, name) for i, name in enumerate(names, start=1))
+
+
+def kept_names(items, prefs):
+    return [items[i].name for i in filter_menu(items, prefs)]
+
+
+class TestRealisticNames:
+    """Test suite for negated labels, compound names and the meat vocabulary"""
+
+    def test_gluten_free_label_is_not_gluten(self, dining_hall, no_preferences):
+        """Test that "X-free" items stay available to users allergic to X"""
+        kept = kept_names(dining_hall, dict(no_preferences, allergens=["Gluten"]))
+        assert "Gluten-Free Rice Flour Pancake" in kept
+        assert "Buttered Noodles" in kept  # no gluten keyword, left to the model
+
+    def test_negated_allergen_items_kept(self, dining_hall, no_preferences):
+        """Test that "no X" and "dairy-free" labels are honoured"""
+        assert "Pasta Salad (no egg)" in kept_names(dining_hall, dict(no_preferences, allergens=["eggs"]))
+        assert "Dairy-Free Veggie Pizza" in kept_names(dining_hall, dict(no_preferences, allergens=["dairy"]))
+
+    def test_negation_only_drops_the_negated_word(self, no_preferences):
+        """Test that a "lactose-free" or "dairy-free" part does not clear the rest of the item"""
+        items = (
+            make_item(1, "Mac and Cheese", "Pasta, Cheddar Cheese, Butter, Lactose-Free Milk"),
+            make_item(2, "Lactose Free Milk"),
+            make_item(3, "Dairy-Free Cheese Pizza", "Crust, Tomato Sauce, Mozzarella Cheese"),
+            make_item(4, "Pasta Primavera", "Pasta, Vegetables, Olive Oil (no butter)"),
+        )
+        for prefs in (dict(no_preferences, allergens=["Milk"]), dict(no_preferences, allergens=["Dairy"]),
+                      dict(no_preferences, allergens=["lactose"]), dict(no_preferences, diet="vegan")):
+            assert kept_names(items, prefs) == ["Pasta Primavera"]
+            assert MenuIndex(items).filter(prefs) == filter_menu(items, prefs)
+
+    def test_compound_names_are_not_dairy(self, dining_hall, no_preferences):
+        """Test that peanut butter and coconut milk do not count as milk, butter itself does"""
+        kept = kept_names(dining_hall, dict(no_preferences, allergens=["milk"]))
+        assert "Peanut Butter Toast" in kept and "Coconut Milk Curry" in kept
+        assert "Buttered Noodles" not in kept and "Cheeseburger" not in kept
+
+    def test_compound_names_still_match_their_own_allergen(self, dining_hall, no_preferences):
+        """Test that peanut butter is still excluded for a peanut allergy, and as a dislike"""
+        assert "Peanut Butter Toast" not in kept_names(dining_hall, dict(no_preferences, allergens=["peanuts"]))
+        assert "Peanut Butter Toast" not in kept_names(dining_hall, dict(no_preferences, dislikes=["peanut butter"]))
+
+    def test_vegetarian_drops_every_meat_dish(self, dining_hall, no_preferences):
+        """Test that steak, burgers, meatballs, hot dogs, wings, ribs, meatloaf and carnitas are excluded"""
+        kept = kept_names(dining_hall, dict(no_preferences, diet="Vegetarian"))
+        for meat in ("Grilled Flank Steak", "Cheeseburger", "Spaghetti and Meatballs", "Hot Dog", "Buffalo Wings",
+                     "BBQ Ribs", "Meatloaf", "Carnitas Taco", "Beef Brisket Sandwich"):
+            assert meat not in kept
+        for veggie in ("Black Bean Burger", "Impossible Burger", "Buffalo Cauliflower Wings",
+                       "Gluten-Free Rice Flour Pancake", "Coconut Milk Curry"):
+            assert veggie in kept
+
+    def test_index_agrees_on_realistic_names(self, dining_hall, no_preferences):
+        """Test that the bitset index applies the same negation and compound rules"""
+        index = MenuIndex(dining_hall)
+        for prefs in (dict(no_preferences, allergens=["gluten", "milk", "egg"]),
+                      dict(no_preferences, diet="vegetarian"),
+                      dict(no_preferences, dislikes=["peanut butter"])):
+            assert index.filter(prefs) == filter_menu(dining_hall, prefs)
+
+
+class TestMenuIndex:
+    """Test suite for the bitset inverted index"""
+
+    def test_index_matches_linear_filter(self, menu, no_preferences):
+        """Test that the index gives exactly the same result as the per-item scan"""
+        index = MenuIndex(menu)
+        cases = [
+            no_preferences,
+            dict(no_preferences, allergens=["Eggs"]),
+            dict(no_preferences, allergens=["shellfish", "dairy"]),
+            dict(no_preferences, dislikes=["mushrooms", "green onion"]),
+            dict(no_preferences, diet="vegan"),
+            dict(no_preferences, dietary_restrictions="gluten free, vegetarian"),
+        ]
+        for prefs in cases:
+            assert index.filter(prefs) == filter_menu(menu, prefs)
+
+    def test_allergen_bitsets(self, menu):
+        """Test that allergen tags map to the right item bits"""
+        index = MenuIndex(menu)
+        assert index.allergens["egg"] == 0b1
+
+    def test_token_bitsets(self, menu):
+        """Test that ingredient tokens map to every item containing them"""
+        index = MenuIndex(menu)
+        assert list(iter_bits(index.tokens["olive"])) == [1, 3]
+        assert list(iter_bits(index.tokens["soy sauce"])) == [2]
+
+    def test_long_phrase_keyword(self, menu):
+        """Test that phrases longer than two words are confirmed on candidates"""
+        index = MenuIndex(menu)
+        assert list(iter_bits(index.keyword_mask("rice shrimp soy"))) == [2]
+        assert index.keyword_mask("shrimp rice soy") == 0
+
+    def test_iter_bits(self):
+        """Test bitset iteration"""
+        assert list(iter_bits(0b101001)) == [0, 3, 5]
+        assert list(iter_bits(0)) == []
+
+    def test_to_bitset(self):
+        """Test packing indices into a bitset"""
+        assert to_bitset([0, 3, 5], 6) == 0b101001
+        assert to_bitset([9], 10) == 1 << 9
@@ -0,0 +1,338 @@
+import pytest
+from unittest.mock import patch
+from backend.app.services.menu_repository import (
+    MENU_FIELDS,
+    MenuSync,
+    iter_menu_rows,
+    menu_select_clause,
+    to_menu_row,
+)
+
+
+class FakeQuery:
+    """Minimal stand-in for the PostgREST query builder used by the fetch layer"""
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = None
+        self.filters = []
+        self.order_by = None
+        self.row_limit = None
+
+    def select(self, columns):
+        self.columns = columns
+        return self
+
+    def order(self, column):
+        self.order_by = column
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(("gt", column, value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(("gte", column, value))
+        return self
+
+    def _matches(self, row):
+        for op, column, value in self.filters:
+            if op == "gt" and not row[column] > value:
+                return False
+            if op == "gte" and not row[column] >= value:
+                return False
+        return True
+
+    def execute(self):
+        self.table.queries.append(self)
+        rows = [r for r in self.table.rows if self._matches(r)]
+        rows.sort(key=lambda r: r[self.order_by])
+        if self.row_limit is not None:
+            rows = rows[:self.row_limit]
+
+        if self.columns == "*":
+            return type("Result", (), {"data": [dict(row) for row in rows]})()
+        projected = []
+        for row in rows:
+            out = {}
+            for part in self.columns.split(","):
+                alias, _, path = part.strip().partition(":")
+                if path.startswith("data->"):
+                    out[alias] = row["data"].get(path[len("data->"):])
+                else:
+                    out[alias] = row[alias]
+            projected.append(out)
+        return type("Result", (), {"data": projected})()
+
+
+class FakeTable:
+    """Fake Supabase client holding a single table of rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def make_rows(n):
+    return [
+        {
+            "id": i,
+            "updated_at": f"2025-09-09T08:00:{i:02d}+00:00",
+            "data": {
+                "food_name": f"Item {i}",
+                "station_name": "Main Grill",
+                "meal_type": "Lunch",
+                "nutrition": {"calories": 100 + i},
+                "nutrition_normalized": {"calories": 100 + i},
+                "date": "2025-09-09",
+                "raw_html": "<div>unused</div>",
+            },
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+class TestSelectClause:
+    """Test suite for column projection"""
+
+    def test_select_clause_projects_only_used_fields(self):
+        """Test that only the fields format_menu_data reads are selected"""
+        clause = menu_select_clause()
+        assert clause.startswith("id, ")
+        for field in MENU_FIELDS:
+            assert f"{field}:data->{field}" in clause
+        assert "*" not in clause
+
+    def test_to_menu_row_rebuilds_data_shape(self):
+        """Test that projected rows are reshaped to {'id', 'data'}"""
+        row = to_menu_row({"id": 7, "food_name": "Rice", "station_name": "Wok",
+                           "meal_type": "Dinner", "nutrition": {"calories": 200}})
+        assert row == {
+            "id": 7,
+            "data": {"food_name": "Rice", "station_name": "Wok",
+                     "meal_type": "Dinner", "nutrition": {"calories": 200}},
+        }
+
+    def test_to_menu_row_keeps_normalized_nutrition(self):
+        """Test that normalized nutrition is passed through when the row has it"""
+        row = to_menu_row({"id": 7, "food_name": "Rice", "nutrition": {"calories": "200 kcal"},
+                           "nutrition_normalized": {"calories": 200}})
+        assert row["data"]["nutrition_normalized"] == {"calories": 200}
+
+
+class TestIterMenuRows:
+    """Test suite for keyset-paginated streaming fetch"""
+
+    def test_returns_generator(self):
+        """Test that rows are yielded lazily"""
+        client = FakeTable(make_rows(3))
+        rows = iter_menu_rows(client, page_size=2)
+
+        assert client.queries == []
+        first = next(rows)
+        assert first["id"] == 1
+        assert len(client.queries) == 1
+
+    def test_pages_through_whole_table(self):
+        """Test that all rows are fetched in id order across pages"""
+        client = FakeTable(make_rows(5))
+        rows = list(iter_menu_rows(client, page_size=2))
+
+        assert [r["id"] for r in rows] == [1, 2, 3, 4, 5]
+        assert len(client.queries) == 3
+
+    def test_uses_keyset_cursor(self):
+        """Test that each page filters on id > last seen id"""
+        client = FakeTable(make_rows(5))
+        list(iter_menu_rows(client, page_size=2))
+
+        assert client.queries[0].filters == []
+        assert client.queries[1].filters == [("gt", "id", 2)]
+        assert client.queries[2].filters == [("gt", "id", 4)]
+        assert all(q.order_by == "id" and q.row_limit == 2 for q in client.queries)
+
+    def test_exact_multiple_of_page_size_ends_on_empty_page(self):
+        """Test termination when the last page is exactly full"""
+        client = FakeTable(make_rows(4))
+        rows = list(iter_menu_rows(client, page_size=2))
+
+        assert len(rows) == 4
+        assert len(client.queries) == 3
+
+    def test_unused_fields_are_not_returned(self):
+        """Test that unused JSON fields never leave the database"""
+        client = FakeTable(make_rows(1))
+        row = next(iter_menu_rows(client))
+
+        assert set(row["data"]) == set(MENU_FIELDS)
+        assert "raw_html" not in row["data"]
+
+    def test_unprojected_rows(self):
+        """Test that fields=None selects every column and returns rows as stored"""
+        client = FakeTable(make_rows(3))
+        rows = list(iter_menu_rows(client, page_size=2, fields=None))
+
+        assert rows == make_rows(3)
+        assert client.queries[0].columns == "*"
+
+    def test_empty_table(self):
+        """Test that an empty table yields nothing"""
+        client = FakeTable([])
+        assert list(iter_menu_rows(client)) == []
+
+
+class MissingColumnError(Exception):
+    """Stand-in for postgrest's APIError on an undefined column"""
+    code = "42703"
+
+
+class NoUpdatedAtTable(FakeTable):
+    """Table created before the updated_at migration"""
+
+    def table(self, name):
+        query = FakeQuery(self)
+        execute = query.execute
+
+        def checked_execute():
+            if "updated_at" in query.columns:
+                raise MissingColumnError("column cleaned_data.updated_at does not exist")
+            return execute()
+        query.execute = checked_execute
+        return query
+
+
+class TestMenuSync:
+    """Test suite for incremental (delta) menu sync"""
+
+    def test_missing_cursor_column_falls_back_to_id(self):
+        """Test that a table without updated_at still loads, using the id cursor"""
+        rows = make_rows(3)
+        for row in rows:
+            del row["updated_at"]
+        client = NoUpdatedAtTable(rows)
+        sync = MenuSync(client, page_size=10)
+
+        assert [r["id"] for r in sync.load()] == [1, 2, 3]
+        assert sync.cursor_column == "id"
+        assert sync.high_water_mark == 3
+
+        client.rows.append(dict(make_rows(4)[3]))
+        del client.rows[-1]["updated_at"]
+        assert [r["id"] for r in sync.load()] == [1, 2, 3, 4]
+        assert ("gte", "id", 3) in client.queries[-1].filters
+
+    def test_other_errors_are_not_swallowed(self):
+        """Test that unrelated database errors still propagate"""
+        client = FakeTable(make_rows(1))
+        client.table = lambda name: (_ for _ in ()).throw(RuntimeError("connection refused"))
+        with pytest.raises(RuntimeError):
+            MenuSync(client).load()
+
+    def test_first_load_is_full_sync(self):
+        """Test that the first load pulls the whole table and sets the high-water mark"""
+        client = FakeTable(make_rows(3))
+        sync = MenuSync(client, page_size=10)
+
+        rows = sync.load()
+
+        assert [r["id"] for r in rows] == [1, 2, 3]
+        assert sync.high_water_mark == "2025-09-09T08:00:03+00:00"
+        assert client.queries[0].filters == []
+
+    def test_delta_sync_fetches_only_changed_rows(self):
+        """Test that later loads filter on the high-water mark"""
+        client = FakeTable(make_rows(3))
+        sync = MenuSync(client, page_size=10)
+        sync.load()
+
+        client.rows.append({
+            "id": 4,
+            "updated_at": "2025-09-09T09:00:00+00:00",
+            "data": {"food_name": "Pancakes", "station_name": "Griddle",
+                     "meal_type": "Breakfast", "nutrition": {"calories": 250}},
+        })
+        rows = sync.load()
+
+        delta_query = client.queries[-1]
+        assert ("gte", "updated_at", "2025-09-09T08:00:03+00:00") in delta_query.filters
+        assert [r["id"] for r in rows] == [1, 2, 3, 4]
+        assert sync.high_water_mark == "2025-09-09T09:00:00+00:00"
+
+    def test_delta_sync_merges_updates_by_id(self):
+        """Test that an updated row replaces the cached one"""
+        client = FakeTable(make_rows(2))
+        sync = MenuSync(client, page_size=10)
+        sync.load()
+
+        client.rows[0]["updated_at"] = "2025-09-09T10:00:00+00:00"
+        client.rows[0]["data"]["food_name"] = "Renamed"
+        rows = sync.load()
+
+        assert len(rows) == 2
+        assert rows[0]["data"]["food_name"] == "Renamed"
+
+    def test_unchanged_delta_returns_same_snapshot(self):
+        """Test that a delta with no changes does not rebuild the snapshot"""
+        client = FakeTable(make_rows(2))
+        sync = MenuSync(client, page_size=10)
+        first = sync.load()
+        second = sync.load()
+
+        assert second is first
+
+    def test_failed_delta_page_is_not_half_merged(self):
+        """Test that rows from a delta whose later page failed are still served after the retry"""
+        client = FakeTable(make_rows(2))
+        sync = MenuSync(client, page_size=2)
+        snapshot = sync.load()
+
+        client.rows[1]["updated_at"] = "2025-09-09T10:00:00+00:00"
+        client.rows[1]["data"]["food_name"] = "Renamed"
+        client.rows.append(dict(make_rows(3)[2], updated_at="2025-09-09T10:00:00+00:00"))
+        execute = FakeQuery.execute
+
+        def fail_second_page(query):
+            if any(op == "gt" for op, _, _ in query.filters):
+                raise RuntimeError("connection reset")
+            return execute(query)
+
+        with patch.object(FakeQuery, "execute", fail_second_page):
+            with pytest.raises(RuntimeError):
+                sync.load()
+
+        rows = sync.load()
+        assert rows is not snapshot
+        assert [r["id"] for r in rows] == [1, 2, 3]
+        assert rows[1]["data"]["food_name"] == "Renamed"
+
+    def test_periodic_full_sync_drops_deleted_rows(self):
+        """Test that the full reconcile picks up deletes"""
+        client = FakeTable(make_rows(3))
+        sync = MenuSync(client, page_size=10, full_sync_interval=60)
+        sync.load()
+
+        del client.rows[1]
+        assert len(sync.load()) == 3  # delta cannot see deletes
+
+        with patch("backend.app.services.menu_repository.time.monotonic", return_value=10**9):
+            rows = sync.load()
+        assert [r["id"] for r in rows] == [1, 3]
+
+    def test_id_cursor_for_insert_only_tables(self):
+        """Test that an id cursor works when the table has no updated_at column"""
+        rows = make_rows(2)
+        for row in rows:
+            del row["updated_at"]
+        client = FakeTable(rows)
+        sync = MenuSync(client, cursor_column="id", page_size=10)
+        sync.load()
+
+        assert sync.high_water_mark == 2
+        assert "updated_at" not in client.queries[0].columns
@@ -0,0 +1,161 @@
+import copy
+import json
+import pytest
+from unittest.mock import patch
+from backend.app.model.menu import MenuItem
+from backend.app.services.menu_snapshot import MenuSnapshot, MenuSnapshotStore, menu_version
+
+
+@pytest.fixture
+def menu_items():
+    """Menu rows in the shape returned by get_all_menu_data"""
+    return [
+        {"id": 1, "data": {"food_name": "Scrambled Eggs", "station_name": "Main Grill",
+                           "meal_type": "Breakfast", "nutrition": {"calories": 70}}},
+        {"id": 2, "data": {"food_name": "Grilled Chicken", "station_name": "Main Grill",
+                           "meal_type": "Lunch", "nutrition": {"calories": 165}}},
+    ]
+
+
+class TestMenuItem:
+    """Test suite for the immutable menu record"""
+
+    def test_from_row_cleans_ingredients(self):
+        """Test that the disclaimer is stripped from the record's ingredients"""
+        row = {"id": 1, "data": {"food_name": "Chicken", "station_name": "Grill", "meal_type": "Lunch",
+                                 "nutrition": {"ingredients": "Chicken. Disclaimer: may contain"}}}
+        item = MenuItem.from_row(row)
+
+        assert item.ingredients == "Chicken."
+        assert row["data"]["nutrition"]["ingredients"] == "Chicken. Disclaimer: may contain"
+
+    def test_from_row_uses_normalized_amounts(self):
+        """Test that amounts parsed at ingest replace the raw strings, text fields and extra keys untouched"""
+        row = {"id": 1, "data": {"food_name": "Soup", "station_name": "Kettle", "meal_type": "Lunch",
+                                 "nutrition": {"serving_size": "1 cup", "calories": "120 kcal", "sodium_mg": "0.4 g"},
+                                 "nutrition_normalized": {"calories": 120, "sodium_mg": 400,
+                                                          "serving_quantity": 1, "serving_unit": "cup"}}}
+        item = MenuItem.from_row(row)
+
+        assert item.nutrition["calories"] == 120 and item.nutrition["sodium_mg"] == 400
+        assert item.nutrition["serving_size"] == "1 cup"
+        assert "serving_unit" not in item.nutrition
+
+    def test_nutrition_is_read_only(self, menu_items):
+        """Test that nested nutrition data cannot be modified"""
+        item = MenuItem.from_row(menu_items[0])
+        with pytest.raises(TypeError):
+            item.nutrition["calories"] = 0
+
+    def test_to_dict_returns_plain_copy(self, menu_items):
+        """Test that to_dict output is a mutable copy in the formatted shape"""
+        item = MenuItem.from_row(menu_items[0])
+        formatted = item.to_dict()
+        formatted["nutrition"]["calories"] = 0
+
+        assert set(formatted) == {"name", "station", "meal_type", "nutrition"}
+        assert item.nutrition["calories"] == 70
+
+
+class TestMenuVersion:
+    """Test suite for the menu content hash"""
+
+    def test_version_is_stable_for_equal_content(self, menu_items):
+        """Test that equal menus hash to the same version"""
+        assert menu_version(menu_items) == menu_version(copy.deepcopy(menu_items))
+
+    def test_version_ignores_key_order(self, menu_items):
+        """Test that dict key order does not change the version"""
+        reordered = [{"data": item["data"], "id": item["id"]} for item in menu_items]
+        assert menu_version(reordered) == menu_version(menu_items)
+
+    def test_version_changes_with_content(self, menu_items):
+        """Test that any content change produces a new version"""
+        changed = copy.deepcopy(menu_items)
+        changed[0]["data"]["nutrition"]["calories"] = 80
+        assert menu_version(changed) != menu_version(menu_items)
+
+
+class TestMenuSnapshot:
+    """Test suite for memoized derived values"""
+
+    def test_menu_json_matches_formatted_menu(self, menu_items):
+        """Test that the prompt fragment is the indented JSON of the formatted menu"""
+        snapshot = MenuSnapshot(menu_items)
+        assert snapshot.menu_json == json.dumps(snapshot.formatted_menu(), indent=2)
+        assert json.loads(snapshot.menu_json)[0]["name"] == "Scrambled Eggs"
+
+    def test_menu_json_is_computed_once(self, menu_items):
+        """Test that serialization is computed once per snapshot"""
+        snapshot = MenuSnapshot(menu_items)
+        with patch("backend.app.services.menu_snapshot.json.dumps", wraps=json.dumps) as spy:
+            snapshot.menu_json
+            snapshot.menu_json
+            snapshot.menu_json_for([1])
+        assert spy.call_count == len(menu_items)  # one serialization per item, ever
+
+    def test_menu_json_for_subset_matches_json_dumps(self, menu_items):
+        """Test that subset serialization is identical to dumping the subset directly"""
+        snapshot = MenuSnapshot(menu_items)
+        formatted = snapshot.formatted_menu()
+
+        assert snapshot.menu_json_for([1]) == json.dumps([formatted[1]], indent=2)
+        assert snapshot.menu_json_for([0, 1]) == json.dumps(formatted, indent=2)
+        assert snapshot.menu_json_for([]) == json.dumps([], indent=2)
+
+    def test_items_are_immutable_records(self, menu_items):
+        """Test that rows are converted to frozen MenuItem records"""
+        snapshot = MenuSnapshot(menu_items)
+        assert all(isinstance(item, MenuItem) for item in snapshot.items)
+        with pytest.raises(Exception):
+            snapshot.items[0].name = "Changed"
+
+
+class TestMenuSnapshotStore:
+    """Test suite for version-keyed snapshot reuse"""
+
+    def test_same_menu_list_reuses_snapshot(self, menu_items):
+        """Test that repeated requests on the same cached list share one snapshot"""
+        store = MenuSnapshotStore()
+
+        first = store.get(menu_items)
+        with patch("backend.app.services.menu_snapshot.menu_version") as version_spy:
+            second = store.get(menu_items)
+
+        assert second is first
+        assert not version_spy.called
+
+    def test_reloaded_identical_menu_keeps_snapshot(self, menu_items):
+        """Test that a reload with unchanged content does not reformat"""
+        store = MenuSnapshotStore()
+
+        first = store.get(menu_items)
+        second = store.get(copy.deepcopy(menu_items))
+
+        assert second is first
+
+    def test_changed_menu_builds_new_version(self, menu_items):
+        """Test that a changed menu gets a new snapshot and version"""
+        store = MenuSnapshotStore()
+        first = store.get(menu_items)
+
+        changed = copy.deepcopy(menu_items)
+        changed.append({"id": 3, "data": {"food_name": "Rice", "station_name": "Wok",
+                                          "meal_type": "Dinner", "nutrition": {}}})
+        second = store.get(changed)
+
+        assert second is not first
+        assert second.version != first.version
+        assert store.current is second
+
+    def test_listeners_run_on_new_version_only(self, menu_items):
+        """Test that listeners fire when a new version is built, not on reuse"""
+        store = MenuSnapshotStore()
+        seen = []
+        store.add_listener(lambda snapshot: seen.append(snapshot.version))
+
+        store.get(menu_items)
+        store.get(menu_items)
+        store.get(copy.deepcopy(menu_items))
+
+        assert len(seen) == 1
@@ -0,0 +1,72 @@
+import time
+import pytest
+from backend.app.model.menu import MenuItem
+from backend.app.services.name_matcher import MIN_SCORE, NameMatcher, normalize_name, trigrams
+
+
+def make_items(rows):
+    return tuple(MenuItem.from_row({"id": i, "data": {"food_name": name, "station_name": station, "nutrition": {}}})
+                 for i, (name, station) in enumerate(rows))
+
+
+@pytest.fixture
+def matcher():
+    return NameMatcher(make_items([
+        ("Scrambled Eggs", "Main Grill"),
+        ("Grilled Chicken Breast", "Main Grill"),
+        ("Grilled Chicken Breast", "Deli"),
+        ("Jalapeño Mac & Cheese", "Comfort"),
+        ("Brown Rice", "Sides"),
+    ]))
+
+
+class TestNormalize:
+    """Test suite for name normalization"""
+
+    def test_normalize_name(self):
+        """Test that case, accents, punctuation and spacing are ignored"""
+        assert normalize_name("  Jalapeño Mac & Cheese ") == "jalapeno mac cheese"
+        assert normalize_name(None) == ""
+
+    def test_trigrams_cover_short_names(self):
+        """Test that padded trigrams exist even for very short names"""
+        assert trigrams("ox") == {"  o", " ox", "ox "}
+
+
+class TestNameMatcher:
+    """Test suite for matching model-written names to menu items"""
+
+    def test_exact_and_station_scoped(self, matcher):
+        """Test that exact names match with full confidence, preferring the named station"""
+        assert matcher.match("scrambled eggs") == (0, 1.0)
+        assert matcher.match("Grilled Chicken Breast", "Deli") == (2, 1.0)
+        assert matcher.match("Grilled Chicken Breast", "Somewhere") == (1, 1.0)
+
+    def test_reordered_words(self, matcher):
+        """Test that the same words in another order still match"""
+        match = matcher.match("Eggs, Scrambled")
+        assert match.index == 0 and match.score < 1
+
+    def test_fuzzy_names(self, matcher):
+        """Test that small changes to a name resolve to the right item"""
+        assert matcher.match("Jalapeno Mac and Cheese").index == 3
+        assert matcher.match("Grilled Chicken", "Deli").index == 2
+        match = matcher.match("Brown Rice (1 cup)")
+        assert match.index == 4 and MIN_SCORE <= match.score < 1
+
+    def test_unknown_names(self, matcher):
+        """Test that unrelated or empty names do not match"""
+        assert matcher.match("Beef Stroganoff") is None
+        assert matcher.match("") is None
+
+    def test_lookup_is_fast_on_large_menu(self):
+        """Test that lookups stay well under a millisecond on a few thousand items"""
+        words = ["grilled", "baked", "roasted", "spicy", "chicken", "tofu", "salmon", "rice", "pasta", "salad"]
+        rows = [(f"{words[i % 4]} {words[4 + i % 6]} {i}", f"Station {i % 12}") for i in range(3000)]
+        matcher = NameMatcher(make_items(rows))
+
+        start = time.perf_counter()
+        for i in range(0, 3000, 30):
+            assert matcher.match(rows[i][0].title() + "s", rows[i][1]).index == i
+        elapsed = (time.perf_counter() - start) / 100
+        assert elapsed < 0.001
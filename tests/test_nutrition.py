@@ -0,0 +1,107 @@
+import pytest
+from backend.app.services.nutrition import (
+    canonical_amount,
+    normalize_item,
+    normalize_nutrition,
+    parse_serving_size,
+    round_amount,
+    to_number,
+)
+
+
+class TestToNumber:
+    """Test suite for numeric nutrient parsing"""
+
+    @pytest.mark.parametrize("value, expected", [
+        (12, 12),
+        (3.5, 3.5),
+        ("12g", 12),
+        ("1,200 mg", 1200),
+        ("0.5 cup", 0.5),
+        ("<1 g", 1),
+    ])
+    def test_numbers_and_unit_strings(self, value, expected):
+        """Test that numbers are extracted from raw values and unit strings"""
+        assert to_number(value) == expected
+
+    @pytest.mark.parametrize("value", [None, "N/A", "", True, ["1"]])
+    def test_non_numeric_values(self, value):
+        """Test that values without a number give None"""
+        assert to_number(value) is None
+
+
+class TestRoundAmount:
+    """Test suite for rounding totals"""
+
+    def test_whole_numbers_become_ints(self):
+        """Test that whole values are ints and others keep one decimal"""
+        assert round_amount(12.0) == 12 and isinstance(round_amount(12.0), int)
+        assert round_amount(3.14159) == 3.1
+
+
+class TestCanonicalAmount:
+    """Test suite for converting nutrients to the unit in their field name"""
+
+    @pytest.mark.parametrize("field, value, expected", [
+        ("protein_g", "31g", 31),
+        ("protein_g", "500 mg", 0.5),
+        ("sodium_mg", "1,200 mg", 1200),
+        ("sodium_mg", "0.4 g", 400),
+        ("calories", "165 kcal", 165),
+        ("calories", "1000 kJ", 239.006),
+        ("vitamin_d_iu", "40 IU", 40),
+        ("fat_g", "<1 g", 1),
+        ("fat_g", 3.5, 3.5),
+        ("potassium", "350mg", 350),
+    ])
+    def test_conversions(self, field, value, expected):
+        """Test that values are parsed and converted to the field's unit"""
+        assert canonical_amount(field, value) == expected
+
+    @pytest.mark.parametrize("field, value", [("iron_mg", "10%"), ("fiber_g", "N/A"), ("calories", None)])
+    def test_unusable_values(self, field, value):
+        """Test that unknown units and missing values give None"""
+        assert canonical_amount(field, value) is None
+
+
+class TestParseServingSize:
+    """Test suite for serving size parsing"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ("1/2 cup", {"serving_quantity": 0.5, "serving_unit": "cup"}),
+        ("1 1/2 Cups", {"serving_quantity": 1.5, "serving_unit": "cup"}),
+        ("4 oz", {"serving_quantity": 4, "serving_unit": "oz", "serving_grams": 113.398}),
+        ("8 fl oz", {"serving_quantity": 8, "serving_unit": "fl_oz"}),
+        ("2 slices", {"serving_quantity": 2, "serving_unit": "slice"}),
+        ("1 egg", {"serving_quantity": 1, "serving_unit": "egg"}),
+        ("1", {"serving_quantity": 1, "serving_unit": "each"}),
+    ])
+    def test_quantity_and_unit(self, text, expected):
+        """Test that quantity and canonical unit are split out of menu text"""
+        assert parse_serving_size(text) == expected
+
+    @pytest.mark.parametrize("text", [None, "", "each", "1/0 cup"])
+    def test_no_quantity(self, text):
+        """Test that text without a usable quantity gives nothing"""
+        assert parse_serving_size(text) == {}
+
+
+class TestNormalizeNutrition:
+    """Test suite for ingest-time normalization"""
+
+    def test_normalize_nutrition(self):
+        """Test that numeric nutrients and the serving are kept, text fields and junk dropped"""
+        nutrition = {"serving_size": "3 oz", "calories": "165", "protein_g": "31g", "fiber_g": "N/A",
+                     "allergens": ["soy"], "ingredients": "Chicken, salt"}
+        assert normalize_nutrition(nutrition) == {
+            "calories": 165, "protein_g": 31, "serving_quantity": 3, "serving_unit": "oz", "serving_grams": 85.048,
+        }
+        assert normalize_nutrition(None) == {}
+
+    def test_normalize_item_keeps_raw_data(self):
+        """Test that the raw item is left as is and the normalized values are added next to it"""
+        item = {"food_name": "Soup", "nutrition": {"calories": "120 kcal"}}
+        normalized = normalize_item(item)
+        assert normalized["nutrition"] == {"calories": "120 kcal"}
+        assert normalized["nutrition_normalized"] == {"calories": 120}
+        assert "nutrition_normalized" not in item
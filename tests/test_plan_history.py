@@ -0,0 +1,80 @@
+import json
+import os
+from unittest.mock import patch
+import pytest
+from backend.app.services.plan_history import PlanHistory, read_history
+
+
+@pytest.fixture
+def history_dir(tmp_path):
+    return str(tmp_path / "history")
+
+
+class TestPlanHistory:
+    """Test suite for the append-only plan history log"""
+
+    def test_records_are_appended_as_json_lines(self, history_dir):
+        """Test that plans are written as compact JSON Lines with request ID and menu version"""
+        history = PlanHistory(history_dir)
+        first = history.record({"breakfast": []}, {"calories": 2000}, menu_version="v1")
+        second = history.record({"lunch": ["Grilled Chicken"]}, {"calories": 2500}, menu_version="v1", request_id="abc")
+        history.close()
+
+        assert first and second == "abc"
+        [segment] = os.listdir(history_dir)
+        with open(os.path.join(history_dir, segment), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert len(lines) == 2
+        assert ", " not in lines[0] and "\n" not in lines[0]
+        record = json.loads(lines[1])
+        assert record["request_id"] == "abc"
+        assert record["menu_version"] == "v1"
+        assert record["meal_schedule"] == {"lunch": ["Grilled Chicken"]}
+        assert [r["request_id"] for r in read_history(history_dir)] == [first, "abc"]
+
+    def test_segments_rotate_by_size(self, history_dir):
+        """Test that a new segment file is started once the current one is full"""
+        history = PlanHistory(history_dir, segment_bytes=400)
+        for i in range(6):
+            history.record({"breakfast": ["x" * 100]}, {"calories": i})
+        history.close()
+
+        assert len(os.listdir(history_dir)) > 1
+        assert all(os.path.getsize(os.path.join(history_dir, name)) <= 400 for name in os.listdir(history_dir))
+        assert [r["user_preferences"]["calories"] for r in read_history(history_dir)] == list(range(6))
+
+    def test_flush_waits_for_queued_records(self, history_dir):
+        """Test that flush returns once everything queued before it is written"""
+        history = PlanHistory(history_dir)
+        history.record({}, {})
+        assert history.flush(timeout=5)
+        assert len(read_history(history_dir)) == 1
+        assert history.metrics()["written"] == 1
+        history.close()
+
+    def test_full_queue_drops_instead_of_blocking(self, history_dir):
+        """Test that a full queue drops the record and counts it"""
+        history = PlanHistory(history_dir, max_queue=1)
+        with patch.object(PlanHistory, "_ensure_started"):  # no writer draining the queue
+            assert history.record({}, {}) is not None
+            assert history.record({}, {}) is None
+        assert history.metrics()["dropped"] == 1
+
+    def test_record_after_close_is_dropped(self, history_dir):
+        """Test that nothing is queued once the writer has stopped"""
+        history = PlanHistory(history_dir)
+        history.close()
+        assert history.record({}, {}) is None
+        assert read_history(history_dir) == []
+
+    def test_unserializable_plan_is_skipped(self, history_dir):
+        """Test that one bad record does not stop the writer"""
+        circular = {}
+        circular["self"] = circular
+        history = PlanHistory(history_dir)
+        history.record(circular, {})
+        history.record({"ok": True}, {})
+        history.close()
+
+        assert [r["meal_schedule"] for r in read_history(history_dir)] == [{"ok": True}]
+        assert history.metrics()["errors"] == 1
@@ -0,0 +1,24 @@
+import json
+from backend.app.services.plan_stream import MEAL_SECTIONS, sse_event
+
+
+class TestSseEvent:
+    """Test suite for SSE frame formatting"""
+
+    def test_frame_format(self):
+        """Test that frames carry the event name and a JSON data line"""
+        frame = sse_event("section", {"name": "breakfast", "data": []})
+
+        assert frame.startswith("event: section\ndata: ")
+        assert frame.endswith("\n\n")
+        assert json.loads(frame.split("data: ", 1)[1]) == {"name": "breakfast", "data": []}
+
+    def test_payload_is_single_line(self):
+        """Test that newlines in the data cannot break the frame"""
+        frame = sse_event("item", {"data": {"reason_selected": "line one\nline two"}})
+
+        assert frame.count("\n") == 3
+
+    def test_meal_sections_order(self):
+        """Test that sections are listed in the order the prompt requests"""
+        assert MEAL_SECTIONS == ('breakfast', 'lunch', 'dinner', 'daily_totals', 'meal_plan_analysis')
@@ -0,0 +1,115 @@
+import pytest
+from backend.app.services.menu_snapshot import MenuSnapshot
+from backend.app.services.plan_validator import parse_portion, validate_plan
+
+
+@pytest.fixture
+def snapshot():
+    return MenuSnapshot([
+        {"id": 1, "data": {"food_name": "Scrambled Eggs", "station_name": "Main Grill", "meal_type": "Breakfast",
+                           "nutrition": {"calories": 70, "protein_g": 6, "fat_g": 5, "sodium_mg": "60mg"}}},
+        {"id": 2, "data": {"food_name": "Grilled Chicken", "station_name": "Main Grill", "meal_type": "Lunch",
+                           "nutrition": {"calories": 165, "protein_g": 31}}},
+        {"id": 3, "data": {"food_name": "Grilled Chicken", "station_name": "Deli", "meal_type": "Lunch",
+                           "nutrition": {"calories": 120, "protein_g": 22}}},
+    ])
+
+
+@pytest.fixture
+def user_preferences():
+    return {"calories": 2000, "protein": 150}
+
+
+def make_plan():
+    return {
+        "breakfast": [{"name": "Scrambled Eggs", "station": "Main Grill", "recommended_portion": "3 eggs",
+                       "portion_math": "3 servings x 70 cal = 210 cal", "calories": 250, "protein_g": 18}],
+        "lunch": [{"name": "grilled  chicken", "station": "Deli", "recommended_portion": "2 x 4 oz",
+                   "calories": 240, "protein_g": 44},
+                  {"name": "Mystery Stew", "station": "Soup", "calories": 300, "protein_g": 10}],
+        "dinner": [],
+        "daily_totals": {"total_calories": 1000, "total_protein_g": 72, "calorie_target": 2000},
+        "meal_plan_analysis": {"target_achievement": "SUCCESS - All targets met", "suggestions": ["eat greens"]},
+    }
+
+
+class TestParsePortion:
+    """Test suite for reading the portion multiplier from model text"""
+
+    def test_portion_forms(self):
+        """Test servings, 'x' and fraction forms, with portion_math taking precedence"""
+        assert parse_portion({"portion_math": "3 servings x 70 cal = 210 cal"}) == 3
+        assert parse_portion({"recommended_portion": "1.5 x 3 oz"}) == 1.5
+        assert parse_portion({"recommended_portion": "1/2 serving"}) == 0.5
+        assert parse_portion({"recommended_portion": "3 eggs"}) is None
+
+
+class TestValidatePlan:
+    """Test suite for recomputing and checking model-written nutrition"""
+
+    def test_correct_mode_fixes_items_and_totals(self, snapshot, user_preferences):
+        """Test that wrong item values and totals are replaced by recomputed ones"""
+        plan = validate_plan(make_plan(), snapshot, user_preferences)
+
+        eggs = plan["breakfast"][0]
+        assert eggs["calories"] == 210 and eggs["fat_g"] == 15 and eggs["sodium_mg"] == 180
+        assert eggs["full_nutrition"]["calories"] == 210
+        assert eggs["per_menu_serving_nutrition"]["calories"] == 70
+        chicken = plan["lunch"][0]
+        assert chicken["calories"] == 240  # matched to the Deli record by station
+        assert plan["daily_totals"]["total_calories"] == 210 + 240 + 300
+        assert plan["daily_totals"]["calorie_difference"] == 750 - 2000
+        assert plan["meal_plan_analysis"]["target_achievement"].startswith("FAILED")
+        assert plan["meal_plan_analysis"]["suggestions"] == ["eat greens"]
+
+        report = plan["validation"]
+        assert report["corrected"] is True
+        assert report["items_checked"] == 2
+        assert report["unmatched_items"] == [{"meal": "lunch", "name": "Mystery Stew"}]
+        assert report["item_mismatches"] == [
+            {"meal": "breakfast", "name": "Scrambled Eggs", "field": "calories", "reported": 250, "actual": 210},
+        ]
+        fields = {m["field"] for m in report["total_mismatches"]}
+        assert "total_calories" in fields and "total_protein_g" not in fields
+
+    def test_flag_mode_reports_without_changing(self, snapshot, user_preferences):
+        """Test that flag mode leaves the model's numbers untouched"""
+        plan = validate_plan(make_plan(), snapshot, user_preferences, mode='flag')
+
+        assert plan["breakfast"][0]["calories"] == 250
+        assert plan["daily_totals"]["total_calories"] == 1000
+        assert plan["validation"]["corrected"] is False
+        assert plan["validation"]["item_mismatches"][0]["actual"] == 210
+
+    def test_calorie_ratio_fallback_and_invented_values(self, snapshot, user_preferences):
+        """Test that the portion falls back to the calorie ratio and invented nutrients are flagged"""
+        plan = {"lunch": [{"name": "Grilled Chicken", "station": "Main Grill", "recommended_portion": "a plate",
+                           "calories": 330, "protein_g": 62, "fiber_g": 4}]}
+        plan = validate_plan(plan, snapshot, user_preferences)
+
+        item = plan["lunch"][0]
+        assert item["protein_g"] == 62 and item["fiber_g"] is None
+        assert [m["field"] for m in plan["validation"]["item_mismatches"]] == ["fiber_g"]
+        assert plan["daily_totals"]["total_calories"] == 330
+
+    def test_empty_plan(self, snapshot, user_preferences):
+        """Test that a plan without items validates to zero totals"""
+        plan = validate_plan({"breakfast": [], "lunch": [], "dinner": []}, snapshot, user_preferences)
+        assert plan["daily_totals"]["total_calories"] == 0
+        assert plan["validation"]["items_checked"] == 0
+
+
+class TestFuzzyMatching:
+    """Test suite for validating items whose names the model changed slightly"""
+
+    def test_fuzzy_match_is_reported_and_canonicalized(self, snapshot, user_preferences):
+        """Test that a reworded name is matched, reported with its confidence and corrected"""
+        plan = {"breakfast": [{"name": "Scrambled Egg", "station": "Grill", "recommended_portion": "2 servings",
+                               "calories": 140, "protein_g": 12}]}
+        plan = validate_plan(plan, snapshot, user_preferences)
+
+        assert plan["breakfast"][0]["name"] == "Scrambled Eggs"
+        assert plan["breakfast"][0]["station"] == "Main Grill"
+        fuzzy = plan["validation"]["fuzzy_matches"]
+        assert fuzzy[0]["matched_name"] == "Scrambled Eggs" and 0.6 <= fuzzy[0]["confidence"] < 1
+        assert plan["validation"]["unmatched_items"] == []
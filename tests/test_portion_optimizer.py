@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from backend.app.model.menu import MenuItem
+from backend.app.services.portion_optimizer import (
+    MAX_ITEMS, MIN_ITEMS, MealShortlist, PortionOptimizer, build_shortlists, nutrient_matrix,
+    plan_cost, portion_grid, resolve_picks,
+)
+
+
+def make_items(rows):
+    return tuple(MenuItem.from_row({"id": i, "data": {"food_name": name, "station_name": station,
+                                                       "nutrition": nutrition}})
+                 for i, (name, station, nutrition) in enumerate(rows, start=1))
+
+
+@pytest.fixture
+def menu_items():
+    return make_items([
+        ("Grilled Chicken", "Grill", {"calories": 165, "protein_g": "31g"}),
+        ("Brown Rice", "Sides", {"calories": 215, "protein_g": 5}),
+        ("Broccoli", "Salad Bar", {"calories": 55, "protein_g": 4}),
+        ("Salmon", "Grill", {"calories": 208, "protein_g": 20}),
+        ("Cookie", "Bakery", {"calories": 220, "protein_g": 2}),
+        ("Mystery Soup", "Soup", {}),
+    ])
+
+
+@pytest.fixture
+def optimizer(menu_items):
+    return PortionOptimizer(nutrient_matrix(menu_items), [item.station for item in menu_items])
+
+
+class TestNutrientMatrix:
+    """Test suite for the items x nutrients matrix"""
+
+    def test_parses_values_and_marks_unknown(self, menu_items):
+        """Test that unit strings are parsed and missing values become NaN"""
+        matrix = nutrient_matrix(menu_items)
+        assert matrix.shape == (6, 6)
+        assert matrix[0, 0] == 165 and matrix[0, 1] == 31
+        assert np.isnan(matrix[5]).all()
+
+    def test_portion_grid_enumerates_all_combinations(self):
+        """Test that the grid holds every portion combination exactly once"""
+        grid = portion_grid(2)
+        assert grid.shape == (36, 2)
+        assert len({tuple(row) for row in grid}) == 36
+
+
+class TestPortionOptimizer:
+    """Test suite for item selection and portion solving"""
+
+    def test_plan_cost_prefers_hitting_targets(self):
+        """Test that an exact plan costs nothing and shortfalls cost more than overshoots"""
+        budget = {"calories": 800, "protein_g": 50}
+        assert plan_cost(800, 50, budget) == 0
+        assert plan_cost(700, 50, budget) > plan_cost(900, 50, budget)
+
+    def test_protein_cap_is_penalized(self):
+        """Test that protein more than 20% over target is heavily penalized"""
+        budget = {"calories": 800, "protein_g": 50}
+        assert plan_cost(800, 61, budget) > plan_cost(700, 55, budget)
+
+    def test_solve_portions_is_exact_over_grid(self, optimizer):
+        """Test that solved portions are the best combination on the grid"""
+        budget = {"calories": 600, "protein_g": 60}
+        portions, cost = optimizer.solve_portions([0, 1, 2], budget)
+        grid = portion_grid(3)
+        costs = plan_cost(grid @ optimizer.calories[[0, 1, 2]], grid @ optimizer.protein[[0, 1, 2]], budget)
+        assert cost <= costs.min() + 0.05 * 3
+        calories, protein = optimizer.totals([0, 1, 2], portions)
+        assert abs(calories - 600) / 600 < 0.1 and protein <= 60 * 1.2
+
+    def test_select_hits_budget_and_skips_unknown(self, optimizer):
+        """Test that the greedy selection picks 3-5 known items close to the budget"""
+        budget = {"calories": 700, "protein_g": 50}
+        chosen, portions = optimizer.select(range(6), budget)
+        assert MIN_ITEMS <= len(chosen) <= MAX_ITEMS
+        assert 5 not in chosen
+        calories, protein = optimizer.totals(chosen, portions)
+        assert abs(calories - 700) / 700 < 0.1
+        assert 40 <= protein <= 60
+
+    def test_select_is_deterministic(self, optimizer):
+        """Test that the same input always gives the same plan"""
+        budget = {"calories": 700, "protein_g": 50}
+        first = optimizer.select(range(6), budget)
+        second = optimizer.select(range(6), budget)
+        assert first[0] == second[0] and (first[1] == second[1]).all()
+
+    def test_shortlist_starts_with_suggestion(self, optimizer):
+        """Test that the shortlist holds the suggested items first, then alternatives"""
+        shortlist = optimizer.shortlist("lunch", range(6), {"calories": 700, "protein_g": 50}, size=5)
+        assert shortlist.items[:len(shortlist.suggested)] == shortlist.suggested
+        assert len(shortlist.items) == 5
+        assert 5 not in shortlist.items
+
+
+class TestShortlists:
+    """Test suite for per-meal shortlists and pick validation"""
+
+    def test_suggestions_are_not_repeated_across_meals(self, optimizer):
+        """Test that an item suggested for breakfast is not suggested again for lunch"""
+        budgets = {"breakfast": {"calories": 400, "protein_g": 30}, "lunch": {"calories": 500, "protein_g": 40}}
+        shortlists = build_shortlists(optimizer, {"breakfast": list(range(6)), "lunch": list(range(6))}, budgets)
+        assert list(shortlists) == ["breakfast", "lunch"]
+        assert not set(shortlists["breakfast"].suggested) & set(shortlists["lunch"].suggested)
+
+    def test_resolve_picks_drops_invalid_and_tops_up(self):
+        """Test that unknown and repeated picks are dropped and short picks are topped up"""
+        shortlist = MealShortlist("lunch", (4, 2, 7, 9), (4, 2, 7))
+        assert resolve_picks(shortlist, [9, 9, 100]) == [9, 4, 2]
+        assert resolve_picks(shortlist, [9, 7, 2, 4]) == [9, 7, 2, 4]
@@ -0,0 +1,162 @@
+import copy
+import json
+import pytest
+from backend.app.services.menu_snapshot import MenuSnapshot
+from backend.app.services.menu_encoding import item_code
+from backend.app.services.portion_optimizer import MealShortlist
+from backend.app.services.prompt_builder import CLOSING, COMPACT_INSTRUCTIONS, INSTRUCTIONS, PromptBuilder
+
+
+@pytest.fixture
+def menu_rows():
+    return [
+        {"id": 1, "data": {"food_name": "Scrambled Eggs", "station_name": "Main Grill",
+                           "meal_type": "Breakfast", "nutrition": {"calories": 70, "protein_g": 6}}},
+        {"id": 2, "data": {"food_name": "Grilled Chicken", "station_name": "Main Grill",
+                           "meal_type": "Lunch", "nutrition": {"calories": 165, "protein_g": 31}}},
+    ]
+
+
+@pytest.fixture
+def user_preferences():
+    return {"goal": "build_muscle", "calories": 2500, "protein": 150, "allergens": [], "dislikes": []}
+
+
+class TestPromptLayout:
+    """Test suite for prompt segment ordering"""
+
+    def test_instructions_then_menu_then_user(self, menu_rows, user_preferences):
+        """Test that user data is placed after the static instructions and the menu"""
+        snapshot = MenuSnapshot(menu_rows)
+        prompt = PromptBuilder().build(snapshot, [0, 1], user_preferences)
+        text = prompt.text
+
+        assert text.startswith(INSTRUCTIONS)
+        assert text.index("Scrambled Eggs") < text.index("USER PREFERENCES AND GOALS")
+        assert json.dumps(user_preferences, indent=2) in prompt.suffix
+        assert text.endswith(CLOSING)
+
+    def test_instructions_are_not_an_fstring(self):
+        """Test that JSON braces in the output format are single braces"""
+        assert '"breakfast": [' in INSTRUCTIONS
+        assert "{{" not in INSTRUCTIONS
+
+    def test_table_format(self, menu_rows, user_preferences):
+        """Test that the builder uses the configured menu encoding"""
+        snapshot = MenuSnapshot(menu_rows)
+        prompt = PromptBuilder("table").build(snapshot, [0, 1], user_preferences)
+        assert "1|Scrambled Eggs|Main Grill|Breakfast|" in prompt.prefix
+
+
+class TestStablePrefix:
+    """Test suite for prefix reuse"""
+
+    def test_prefix_is_reused_per_menu_version(self, menu_rows, user_preferences):
+        """Test that the same prefix object is returned for every request on a version"""
+        snapshot = MenuSnapshot(menu_rows)
+        builder = PromptBuilder()
+
+        first = builder.build(snapshot, [0, 1], user_preferences)
+        second = builder.build(snapshot, [0, 1], dict(user_preferences, calories=3000))
+
+        assert first.prefix is second.prefix
+        assert first.suffix != second.suffix
+
+    def test_new_menu_version_gets_new_prefix(self, menu_rows):
+        """Test that a changed menu produces a different prefix"""
+        builder = PromptBuilder()
+        old = builder.stable_prefix(MenuSnapshot(menu_rows))
+
+        changed = copy.deepcopy(menu_rows)
+        changed[0]["data"]["food_name"] = "Omelette"
+        new = builder.stable_prefix(MenuSnapshot(changed))
+
+        assert "Omelette" in new
+        assert new != old
+
+    def test_filtered_menu_embeds_only_allowed_items(self, menu_rows, user_preferences):
+        """Test that by default only the allowed items are in the prompt"""
+        snapshot = MenuSnapshot(menu_rows)
+        prompt = PromptBuilder().build(snapshot, [1], user_preferences)
+
+        assert prompt.prefix.startswith(INSTRUCTIONS)
+        assert "Scrambled Eggs" not in prompt.text
+        assert "Grilled Chicken" in prompt.prefix
+
+    def test_filtered_menu_with_stable_prefix_lists_exclusions(self, menu_rows, user_preferences):
+        """Test that the cacheable mode keeps the full prefix and excludes items in the suffix"""
+        snapshot = MenuSnapshot(menu_rows)
+        builder = PromptBuilder()
+        prompt = builder.build(snapshot, [1], user_preferences, use_stable_prefix=True)
+
+        assert prompt.prefix is builder.stable_prefix(snapshot)
+        assert "- Scrambled Eggs (Main Grill)" in prompt.suffix
+        assert "Grilled Chicken" not in prompt.suffix
+
+
+class TestMealPrompt:
+    """Test suite for per-meal prompts"""
+
+    def test_meal_prompt_carries_only_meal_items_and_budget(self, menu_rows, user_preferences):
+        """Test that a meal prompt has that meal's menu, output key and targets"""
+        snapshot = MenuSnapshot(menu_rows)
+        prompt = PromptBuilder().build_meal(snapshot, [0], "breakfast", {"calories": 625, "protein_g": 38},
+                                            user_preferences)
+
+        assert '"breakfast": [' in prompt.prefix
+        assert "Scrambled Eggs" in prompt.prefix
+        assert "Grilled Chicken" not in prompt.prefix
+        assert "about 625" in prompt.suffix and "about 38g" in prompt.suffix
+        assert prompt.text.endswith(CLOSING)
+
+    def test_meal_prompt_is_shorter_than_full_prompt(self, menu_rows, user_preferences):
+        """Test that per-meal instructions are smaller than the full-day instructions"""
+        snapshot = MenuSnapshot(menu_rows)
+        builder = PromptBuilder()
+        meal = builder.build_meal(snapshot, [0], "breakfast", {"calories": None, "protein_g": None}, user_preferences)
+
+        assert len(meal.text) < len(builder.build(snapshot, [0, 1], user_preferences).text)
+        assert "no numeric targets" in meal.suffix
+
+
+class TestShortlistPrompt:
+    """Test suite for the optimizer shortlist prompt"""
+
+    def test_shortlist_prompt_lists_candidates_with_ids(self, menu_rows, user_preferences):
+        """Test that the shortlist prompt stars suggested items and omits the full menu"""
+        snapshot = MenuSnapshot(menu_rows)
+        shortlists = {"lunch": MealShortlist("lunch", (1, 0), (1,))}
+        prompt = PromptBuilder().build_shortlist(snapshot, shortlists, user_preferences)
+
+        assert "LUNCH SHORTLIST" in prompt.suffix
+        assert "*" + item_code(2) + "|Grilled Chicken" in prompt.suffix
+        assert "\n" + item_code(1) + "|Scrambled Eggs" in prompt.suffix
+        assert "BREAKFAST SHORTLIST" not in prompt.suffix
+        assert '"suggestions"' in prompt.prefix
+        assert len(prompt.text) < len(PromptBuilder().build(snapshot, [0, 1], user_preferences).text)
+
+
+class TestCompactOutput:
+    """Test suite for the compact (id / portion / reason) output format"""
+
+    def test_compact_prompt_asks_for_ids_only(self, menu_rows, user_preferences):
+        """Test that compact prompts embed item ids and drop the per-item nutrition template"""
+        snapshot = MenuSnapshot(menu_rows)
+        compact = PromptBuilder(output_format='compact').build(snapshot, [0, 1], user_preferences)
+        full = PromptBuilder().build(snapshot, [0, 1], user_preferences)
+
+        assert compact.prefix.startswith(COMPACT_INSTRUCTIONS)
+        assert '"portion"' in compact.prefix
+        assert "per_menu_serving_nutrition" not in compact.prefix
+        assert f'"id": "{item_code(2)}"' in compact.prefix
+        assert '"id"' not in full.prefix
+        assert len(compact.text) < len(full.text)
+
+    def test_compact_table_and_meal_prompts(self, menu_rows, user_preferences):
+        """Test that compact mode works with the table menu and per-meal prompts"""
+        snapshot = MenuSnapshot(menu_rows)
+        builder = PromptBuilder('table', 'compact')
+        assert "\n" + item_code(1) + "|Scrambled Eggs" in builder.build(snapshot, [0, 1], user_preferences).prefix
+
+        meal = builder.build_meal(snapshot, [0], "breakfast", {"calories": 500, "protein_g": 30}, user_preferences)
+        assert '"portion"' in meal.prefix and "full_nutrition" not in meal.prefix
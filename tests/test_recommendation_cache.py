@@ -0,0 +1,245 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from backend.app.services.recommendation_cache import (
+    AsyncSingleFlight,
+    RecommendationCache,
+    SingleFlight,
+    preference_key,
+)
+
+
+@pytest.fixture
+def preferences():
+    return {
+        "goal": "build_muscle",
+        "diet": "Keto",
+        "calories": 2500,
+        "protein": 150,
+        "comments": "",
+        "allergens": ["peanuts", "Shellfish"],
+        "dislikes": [],
+    }
+
+
+class TestPreferenceKey:
+    """Test suite for canonical preference hashing"""
+
+    def test_list_order_and_case_do_not_matter(self, preferences):
+        """Test that equivalent preferences share a key"""
+        variant = dict(preferences, diet="  keto ", allergens=["shellfish", "PEANUTS"])
+        assert preference_key(variant, "v1") == preference_key(preferences, "v1")
+
+    def test_lists_of_objects_are_accepted(self, preferences):
+        """Test that lists holding dicts or lists are normalized instead of raising"""
+        variant = dict(preferences, allergens=[{"Name": "Milk "}, ["b", "a"], {"name": "milk"}])
+        reordered = dict(preferences, allergens=[["A", "B"], {"name": "milk"}])
+        assert preference_key(variant, "v1") == preference_key(reordered, "v1")
+
+    def test_menu_version_is_part_of_the_key(self, preferences):
+        """Test that a new menu version never reuses an old plan"""
+        assert preference_key(preferences, "v1") != preference_key(preferences, "v2")
+
+    def test_different_targets_get_different_keys(self, preferences):
+        """Test that real differences change the key"""
+        assert preference_key(dict(preferences, calories=2600), "v1") != preference_key(preferences, "v1")
+
+
+class TestRecommendationCache:
+    """Test suite for the LRU + TTL result cache"""
+
+    def test_put_and_get(self):
+        """Test a basic round trip"""
+        cache = RecommendationCache(max_entries=10, ttl=60)
+        cache.put("k", {"breakfast": []}, "v1")
+
+        assert cache.get("k") == {"breakfast": []}
+        assert cache.hits == 1
+
+    def test_get_returns_private_copy(self):
+        """Test that callers cannot modify the cached plan"""
+        cache = RecommendationCache(max_entries=10, ttl=60)
+        cache.put("k", {"breakfast": []}, "v1")
+        cache.get("k")["breakfast"].append("x")
+
+        assert cache.get("k") == {"breakfast": []}
+
+    def test_ttl_expiry(self):
+        """Test that expired entries are not served"""
+        cache = RecommendationCache(max_entries=10, ttl=60)
+        cache.put("k", {"a": 1}, "v1")
+
+        with patch("backend.app.services.recommendation_cache.time.monotonic", return_value=10**9):
+            assert cache.get("k") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = RecommendationCache(max_entries=2, ttl=60)
+        cache.put("a", 1, "v1")
+        cache.put("b", 2, "v1")
+        cache.get("a")
+        cache.put("c", 3, "v1")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_invalidate_menu(self):
+        """Test that entries for old menu versions are dropped"""
+        cache = RecommendationCache(max_entries=10, ttl=60)
+        cache.put("old", 1, "v1")
+        cache.put("new", 2, "v2")
+
+        assert cache.invalidate_menu("v2") == 1
+        assert cache.get("old") is None
+        assert cache.get("new") == 2
+
+    def test_disabled_cache_stores_nothing(self):
+        """Test that size 0 disables caching"""
+        cache = RecommendationCache(max_entries=0, ttl=60)
+        cache.put("k", 1, "v1")
+        assert cache.get("k") is None
+
+
+def run_concurrently(n, target):
+    """Start n threads on target, return the list of (result, error) pairs"""
+    outcomes = []
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            result = target()
+            error = None
+        except Exception as e:
+            result, error = None, e
+        with lock:
+            outcomes.append((result, error))
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes
+
+
+class TestSingleFlight:
+    """Test suite for in-flight request coalescing"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test that concurrent callers with the same key run the function once"""
+        flight = SingleFlight()
+        calls = []
+
+        def generate():
+            calls.append(1)
+            time.sleep(0.05)
+            return {"plan": 1}
+
+        outcomes = run_concurrently(8, lambda: flight.do("k", generate))
+
+        assert len(calls) == 1
+        assert all(result == {"plan": 1} and error is None for result, error in outcomes)
+
+    def test_different_keys_run_separately(self):
+        """Test that distinct keys are not coalesced"""
+        flight = SingleFlight()
+        assert flight.do("a", lambda: 1) == 1
+        assert flight.do("b", lambda: 2) == 2
+
+    def test_errors_propagate_to_all_waiters(self):
+        """Test that the leader's exception is raised for every caller"""
+        flight = SingleFlight()
+
+        def fail():
+            time.sleep(0.05)
+            raise RuntimeError("Gemini down")
+
+        outcomes = run_concurrently(5, lambda: flight.do("k", fail))
+
+        assert len(outcomes) == 5
+        assert all(isinstance(error, RuntimeError) for _, error in outcomes)
+
+    def test_entry_is_cleaned_up(self):
+        """Test that finished calls are removed and later calls run again"""
+        flight = SingleFlight()
+        calls = []
+        flight.do("k", lambda: calls.append(1))
+        with pytest.raises(ValueError):
+            flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+        flight.do("k", lambda: calls.append(1))
+
+        assert flight.in_flight() == 0
+        assert len(calls) == 2
+
+    def test_waiters_get_private_copies(self):
+        """Test that followers cannot modify each other's result"""
+        flight = SingleFlight()
+
+        def generate():
+            time.sleep(0.05)
+            return {"breakfast": []}
+
+        outcomes = run_concurrently(3, lambda: flight.do("k", generate))
+        results = [result for result, _ in outcomes]
+        results[0]["breakfast"].append("x")
+
+        assert sum(1 for r in results if r == {"breakfast": []}) >= 2
+
+
+class TestAsyncSingleFlight:
+    """Test suite for asyncio request coalescing"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_execution(self):
+        """Test that concurrent coroutines with the same key run once"""
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def generate():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"plan": 1}
+
+        results = await asyncio.gather(*[flight.do("k", generate) for _ in range(10)])
+
+        assert len(calls) == 1
+        assert all(r == {"plan": 1} for r in results)
+        assert flight.in_flight() == 0
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate_to_all_waiters(self):
+        """Test that every waiter sees the leader's exception"""
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.02)
+            raise RuntimeError("Gemini down")
+
+        results = await asyncio.gather(*[flight.do("k", fail) for _ in range(4)], return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flight.in_flight() == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_hands_over_to_waiter(self):
+        """Test that a waiter takes over when the leading request is cancelled"""
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def generate():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "plan"
+
+        leader = asyncio.create_task(flight.do("k", generate))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("k", generate))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        assert await waiter == "plan"
+        assert len(calls) == 2